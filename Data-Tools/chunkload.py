@@ -0,0 +1,69 @@
+"""
+Background file loading in chunks, shared by the Tk editors.
+
+Parsing a large file and filling a Treeview on the Tk main loop freezes the
+window until both are finished. Instead the editors parse with a generator
+that yields after every chunk of rows, and a ChunkLoader runs it on a worker
+thread and passes what it yields through a queue. The GUI polls the queue
+from root.after, inserts the new rows a batch at a time and updates a
+progress bar, so the first rows show up right away and the window keeps
+responding (including to a Cancel button).
+"""
+import queue
+import threading
+from typing import Any, Iterator, List, Tuple
+
+# How often the GUI polls a running load, in milliseconds
+POLL_INTERVAL_MS = 30
+# Rows inserted into a Treeview per poll, so one poll never blocks the window for long
+TREE_INSERT_BATCH = 1000
+
+
+class ChunkLoader(threading.Thread):
+    """
+    Runs a chunk generator on a background thread. The GUI calls `poll`
+    (e.g. from root.after) to collect the chunks produced so far, and reads
+    `error` once the load has finished.
+    """
+
+    def __init__(self, chunks: Iterator[Any]):
+        super().__init__(daemon=True)
+        self.chunks = chunks
+        self.queue: queue.Queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            for chunk in self.chunks:
+                if self.cancel_event.is_set():
+                    break
+                self.queue.put(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            close = getattr(self.chunks, 'close', None)
+            if close is not None:
+                close()  # Closes the file of a generator stopped early
+            self.done.set()
+
+    def poll(self) -> Tuple[List[Any], bool]:
+        """
+        Returns the chunks produced since the last call, and whether the load
+        has finished (in which case no chunk will follow the returned ones).
+        """
+        finished = self.done.is_set()  # Checked first, so nothing queued before finishing is missed
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.queue.get_nowait())
+            except queue.Empty:
+                return chunks, finished
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
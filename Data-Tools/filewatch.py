@@ -0,0 +1,345 @@
+"""
+Watching an open file for changes made by other programs, shared by the editors.
+
+Build scripts regenerate STB/STL/LTB files while they are open in an editor.
+A FileWatcher notices that: it uses watchdog (inotify and friends) when it
+is installed, and otherwise a background thread that checks the file's size
+and modification time every second. Either way the editor polls it from its
+GUI timer, and is told about a change only once the file has stopped
+changing for a moment, so a file still being written isn't read half done.
+
+The changed file is then parsed and lined up with the loaded one on a
+worker thread (see start_reload), and merged into the open table row by row:
+
+    base    the rows of the file as the editor last loaded or saved it
+    ours    the rows in the editor, with its unsaved edits
+    theirs  the rows of the file now on disk
+
+Rows are matched by hash: rows left alone on disk are skipped, and when
+rows were added or removed the rest are lined up around them. A changed row
+the user didn't edit takes the new contents; one the user did edit is
+merged cell by cell, and a cell changed on both sides is a conflict, for
+the user to resolve. Editors only update the rows that changed, so scroll
+position, selection and unsaved edits are kept.
+"""
+import difflib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from chunkload import ChunkLoader
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# How often the editors poll their watcher, in milliseconds
+WATCH_POLL_MS = 500
+# Interval of the polling fallback, in seconds
+POLL_SECONDS = 1.0
+# A change is reported once the file has stayed the same for this long, in seconds
+SETTLE_SECONDS = 0.5
+# Above this many rows between the first and last difference, rows are lined up by position only
+MAX_ALIGN_ROWS = 20000
+# Conflicts listed in the editors' prompt
+MAX_LISTED_CONFLICTS = 15
+
+Signature = Optional[Tuple[int, int]]  # (size, modification time in ns), None if the file is missing
+
+
+def file_signature(file_path: str) -> Signature:
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, watcher: 'FileWatcher'):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        # Scripts often write a temporary file and rename it over the original
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path and os.path.normcase(os.path.abspath(path)) == self.watcher.normalized_path:
+                self.watcher.pending.set()
+
+
+class FileWatcher:
+    """
+    Watches one file. The GUI calls `poll` from a timer to learn about
+    changes, and `mark_synced` once the editor matches the file again (after
+    loading, saving or merging it).
+    """
+
+    def __init__(self, file_path: str, use_watchdog: bool = True):
+        self.file_path = file_path
+        self.normalized_path = os.path.normcase(os.path.abspath(file_path))
+        self.use_watchdog = use_watchdog
+        self.backend = None  # 'watchdog' or 'polling' while started
+        self.synced = file_signature(file_path)  # Version of the file the editor holds
+        self.seen = self.synced  # Latest version reported by poll
+        self.pending = threading.Event()  # Set when the file may have changed
+        self.candidate: Signature = None
+        self.candidate_since = 0.0
+        self.observer = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.backend is not None:
+            return
+        if self.use_watchdog and Observer is not None:
+            try:
+                self.observer = Observer()
+                self.observer.schedule(_ChangeHandler(self), os.path.dirname(os.path.abspath(self.file_path)),
+                                       recursive=False)
+                self.observer.start()
+                self.backend = 'watchdog'
+            except OSError:
+                self.observer = None  # E.g. out of inotify watches, poll instead
+        if self.backend is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._poll_file, daemon=True)
+            self.thread.start()
+            self.backend = 'polling'
+        self.pending.set()  # Catch up with changes made while not watching
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread = None
+        self.backend = None
+
+    def _poll_file(self):
+        while not self.stop_event.wait(POLL_SECONDS):
+            if file_signature(self.file_path) != self.seen:
+                self.pending.set()
+
+    def poll(self) -> bool:
+        """
+        Returns True once per change of the file, when it has stopped changing
+        for SETTLE_SECONDS. A missing file (e.g. deleted before being written
+        again) is not reported until it is back.
+        """
+        if not self.pending.is_set():
+            return False
+        signature = file_signature(self.file_path)
+        if signature is None or signature == self.seen:
+            self.pending.clear()
+            return False
+        now = time.monotonic()
+        if signature != self.candidate:
+            self.candidate = signature
+            self.candidate_since = now
+            return False
+        if now - self.candidate_since < SETTLE_SECONDS:
+            return False
+        self.pending.clear()
+        self.seen = signature
+        return True
+
+    def recheck(self):
+        """Makes the next poll report the file if it differs from the synced version (e.g. after a dropped reload)."""
+        self.seen = self.synced
+        self.pending.set()
+
+    def mark_synced(self, signature: Signature = None):
+        """Records that the editor holds the given version of the file (by default, the current one)."""
+        if signature is None:
+            signature = file_signature(self.file_path)
+        self.synced = self.seen = signature
+
+    def watches(self, file_path: str) -> bool:
+        return os.path.normcase(os.path.abspath(file_path)) == self.normalized_path
+
+    def changed_on_disk(self) -> bool:
+        """True if the file on disk is not the version the editor holds (e.g. before saving over it)."""
+        signature = file_signature(self.file_path)
+        return signature is not None and signature != self.synced
+
+
+def start_reload(file_path: str, load: Callable[[str], Tuple[Any, list]], base: Sequence[Sequence[Any]]) -> ChunkLoader:
+    """
+    Parses the changed file on a worker thread, with `load` returning the
+    parsed file and its rows, and lines the rows up with `base` (see
+    align_rows). The returned loader's poll yields a single
+    (parsed file, rows, pairs, signature) chunk, the signature being that of
+    the version parsed.
+    """
+    def reload():
+        signature = file_signature(file_path)
+        parsed, rows = load(file_path)
+        yield parsed, rows, align_rows(base, rows), signature
+    loader = ChunkLoader(reload())
+    loader.start()
+    return loader
+
+
+def snapshot_rows(rows: Sequence[Sequence[Any]]) -> List[tuple]:
+    """Copy of a table's rows, kept as the base of the next merge."""
+    return [tuple(row) for row in rows]
+
+
+def _row_hashes(rows: Sequence[Sequence[Any]]) -> List[int]:
+    return [hash(tuple(row)) for row in rows]
+
+
+def align_rows(old_rows: Sequence[Sequence[Any]], new_rows: Sequence[Sequence[Any]]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Lines up two versions of a table by row hash. Returns (old row, new row)
+    pairs in the order of the new version; old row is None for an added row,
+    new row is None for a removed one. Paired rows may differ in content.
+    """
+    old_hashes = _row_hashes(old_rows)
+    new_hashes = _row_hashes(new_rows)
+    old_end, new_end = len(old_hashes), len(new_hashes)
+    start = 0
+    while start < old_end and start < new_end and old_hashes[start] == new_hashes[start]:
+        start += 1
+    while old_end > start and new_end > start and old_hashes[old_end - 1] == new_hashes[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    pairs = [(row, row) for row in range(start)]
+    old_middle = old_end - start
+    new_middle = new_end - start
+    if max(old_middle, new_middle) > MAX_ALIGN_ROWS:
+        blocks = [('replace', start, old_end, start, new_end)]  # Too many rows to diff, pair them by position
+    else:
+        matcher = difflib.SequenceMatcher(None, old_hashes[start:old_end], new_hashes[start:new_end])
+        blocks = [(tag, i1 + start, i2 + start, j1 + start, j2 + start)
+                  for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+    for _, i1, i2, j1, j2 in blocks:
+        common = min(i2 - i1, j2 - j1)
+        pairs.extend((i1 + offset, j1 + offset) for offset in range(common))
+        pairs.extend((old_row, None) for old_row in range(i1 + common, i2))
+        pairs.extend((None, new_row) for new_row in range(j1 + common, j2))
+    shift = new_end - old_end
+    pairs.extend((row, row + shift) for row in range(old_end, len(old_hashes)))
+    return pairs
+
+
+class Conflict:
+    """A cell edited in the editor and changed differently on disk, or an edited row removed on disk."""
+
+    def __init__(self, row: int, column: Optional[int], ours, theirs):
+        self.row = row  # Row in the editor
+        self.column = column  # None if the whole row was removed on disk
+        self.ours = ours
+        self.theirs = theirs
+
+
+class RowMerge:
+    def __init__(self, ours_count: int):
+        self.ours_count = ours_count
+        self.rows: List[list] = []  # The merged table
+        self.sources: List[Optional[int]] = []  # Editor row of each merged row, None for rows added on disk
+        self.changed_rows: List[int] = []  # Merged rows whose contents differ from the editor's
+        self.removed_rows: List[int] = []  # Editor rows removed on disk
+        self.conflicts: List[Conflict] = []
+        # Unsaved edits left in the merged table: (merged row, column, value on disk, value kept).
+        # A column of None is a row added in the editor, as in undo deltas.
+        self.kept_edits: List[Tuple[int, Optional[int], Any, Any]] = []
+
+    @property
+    def rows_moved(self) -> bool:
+        """True if rows were added or removed, so editor rows are not merged rows any more."""
+        return len(self.sources) != self.ours_count or self.sources != list(range(self.ours_count))
+
+    def row_map(self) -> Dict[int, int]:
+        """Editor row -> merged row, for the rows still there."""
+        return {source: row for row, source in enumerate(self.sources) if source is not None}
+
+
+def merge_rows(base: Sequence[Sequence[Any]], ours: Sequence[Sequence[Any]], theirs: Sequence[Sequence[Any]],
+               keep_ours: bool = True, pairs: Optional[List[Tuple[Optional[int], Optional[int]]]] = None) -> RowMerge:
+    """
+    Three-way merge of the rows changed on disk (base -> theirs) into the
+    editor's rows (ours, which holds base plus the unsaved edits, and may end
+    with rows added in the editor). Cells changed on both sides take our
+    value if keep_ours is set, the value on disk otherwise; rows removed on
+    disk are removed either way. Both are reported as conflicts. `pairs` is
+    align_rows(base, theirs), if it was worked out already.
+    """
+    if pairs is None:
+        pairs = align_rows(base, theirs)
+    merge = RowMerge(len(ours))
+    for base_row, their_row in pairs:
+        if their_row is None:
+            merge.removed_rows.append(base_row)
+            if tuple(ours[base_row]) != tuple(base[base_row]):
+                merge.conflicts.append(Conflict(base_row, None, ours[base_row], None))
+            continue
+        new_row = theirs[their_row]
+        row = len(merge.rows)
+        if base_row is None:
+            merge.rows.append(list(new_row))
+            merge.sources.append(None)
+            merge.changed_rows.append(row)
+            continue
+
+        our_row, old_row = ours[base_row], base[base_row]
+        if tuple(our_row) == tuple(old_row):
+            merged = list(new_row)  # Not edited here, take the file's row
+        elif tuple(new_row) == tuple(old_row):
+            merged = list(our_row)  # Not changed on disk, keep the edits
+        else:
+            merged = []
+            for column in range(max(len(our_row), len(old_row), len(new_row))):
+                our_value = our_row[column] if column < len(our_row) else ''
+                old_value = old_row[column] if column < len(old_row) else ''
+                new_value = new_row[column] if column < len(new_row) else ''
+                if our_value == old_value or new_value == our_value:
+                    merged.append(new_value)
+                elif new_value == old_value:
+                    merged.append(our_value)
+                else:
+                    merge.conflicts.append(Conflict(base_row, column, our_value, new_value))
+                    merged.append(our_value if keep_ours else new_value)
+        merge.rows.append(merged)
+        merge.sources.append(base_row)
+        if tuple(merged) != tuple(our_row):
+            merge.changed_rows.append(row)
+        merge.kept_edits.extend((row, column, new_row[column] if column < len(new_row) else '', value)
+                                for column, value in enumerate(merged)
+                                if value != (new_row[column] if column < len(new_row) else ''))
+
+    for our_row in range(len(base), len(ours)):  # Rows added in the editor stay at the end
+        row = len(merge.rows)
+        merge.rows.append(list(ours[our_row]))
+        merge.sources.append(our_row)
+        merge.kept_edits.append((row, None, None, list(ours[our_row])))
+    return merge
+
+
+def describe_conflicts(conflicts: List[Conflict], column_names: Sequence[str]) -> str:
+    """Lines listing conflicts for a prompt, cut short after MAX_LISTED_CONFLICTS."""
+    lines = []
+    for conflict in conflicts[:MAX_LISTED_CONFLICTS]:
+        if conflict.column is None:
+            lines.append(f"Row {conflict.row + 1}: removed on disk")
+            continue
+        name = column_names[conflict.column] if conflict.column < len(column_names) else f"Column {conflict.column}"
+        lines.append(f"Row {conflict.row + 1}, {name}: yours {str(conflict.ours)!r}, on disk {str(conflict.theirs)!r}")
+    if len(conflicts) > MAX_LISTED_CONFLICTS:
+        lines.append(f"...and {len(conflicts) - MAX_LISTED_CONFLICTS} more")
+    return '\n'.join(lines)
+
+
+def conflict_prompt(file_name: str, merge: RowMerge, column_names: Sequence[str]) -> str:
+    """Text of the editors' Yes/No/Cancel prompt about conflicting edits."""
+    return (f"{file_name} was changed on disk, and {len(merge.conflicts)} of your unsaved edits conflict "
+            f"with the new version:\n\n{describe_conflicts(merge.conflicts, column_names)}\n\n"
+            "Yes: reload, keeping your edits\n"
+            "No: reload, taking the values on disk\n"
+            "Cancel: don't reload (saving will ask before overwriting the file)")
@@ -0,0 +1,282 @@
+"""
+Bulk find and replace over table cells, shared by the three editors.
+
+The editors hand over their rows (lists of strings) and the column indexes
+to search. `scan` walks them in chunks so it can run on a worker thread,
+report progress and be cancelled. It either counts matches (preview) or
+builds the list of `(row, column, old, new)` deltas to apply, which the
+editor then applies as a single undo step. `show_find_replace_dialog` is the
+Tk window of the STB and STL editors.
+"""
+import re
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import profiling
+
+Delta = Tuple[int, int, str, str]
+
+DEFAULT_CHUNK_SIZE = 20000
+# Above this many replaced cells the editors rebuild their Treeview instead of updating it cell by cell
+TREE_REBUILD_THRESHOLD = 2000
+
+
+class Finder:
+    def __init__(self, pattern: str, regex: bool = False, case_sensitive: bool = False):
+        """
+        Args:
+            pattern: Literal text, or a regular expression if `regex` is True.
+            regex: Treat the pattern as a regular expression (replacement may use \\1 groups).
+            case_sensitive: Match case exactly.
+
+        Raises:
+            ValueError: If the pattern is empty or not a valid regular expression.
+        """
+        if not pattern:
+            raise ValueError("The search pattern is empty.")
+        try:
+            self.compiled = re.compile(pattern if regex else re.escape(pattern),
+                                       0 if case_sensitive else re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        self.pattern = pattern
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        # Plain str methods are much faster than the regex engine for literal, case-sensitive text
+        self._literal = pattern if not regex and case_sensitive else None
+
+    def count(self, text: str) -> int:
+        if self._literal is not None:
+            return text.count(self._literal)
+        return len(self.compiled.findall(text))
+
+    def replace(self, text: str, replacement: str) -> Tuple[str, int]:
+        """Returns the new text and the number of replacements made."""
+        if self._literal is not None:
+            count = text.count(self._literal)
+            return (text.replace(self._literal, replacement), count) if count else (text, 0)
+        if not self.regex:
+            replacement = replacement.replace('\\', '\\\\')  # Literal mode: no group references
+        return self.compiled.subn(replacement, text)
+
+
+class ScanResult:
+    def __init__(self):
+        self.cells = 0  # Cells containing at least one match
+        self.matches = 0  # Total number of matches
+        self.deltas: List[Delta] = []  # Only filled when a replacement was given
+        self.cancelled = False
+
+
+@profiling.profiled('search.scan')
+def scan(rows: Sequence[Sequence[str]], columns: Sequence[int], finder: Finder,
+         replacement: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+         progress: Optional[Callable[[int, int], None]] = None,
+         cancel: Optional[threading.Event] = None) -> ScanResult:
+    """
+    Counts matches in the given columns, and plans replacements when
+    `replacement` is not None. Rows are not modified.
+
+    Args:
+        rows: Table rows; cells that are not strings are skipped.
+        columns: Indexes of the columns to search.
+        finder: The compiled pattern.
+        replacement: Replacement text, or None to only count.
+        chunk_size: Rows processed between progress reports / cancellation checks.
+        progress: Called as progress(rows_done, total_rows) after each chunk.
+        cancel: Scanning stops early when this event is set.
+    """
+    result = ScanResult()
+    total = len(rows)
+    for chunk_start in range(0, total, chunk_size):
+        if cancel is not None and cancel.is_set():
+            result.cancelled = True
+            break
+        chunk_end = min(chunk_start + chunk_size, total)
+        for row_index in range(chunk_start, chunk_end):
+            row = rows[row_index]
+            for column in columns:
+                if column >= len(row):
+                    continue
+                text = row[column]
+                if not isinstance(text, str) or not text:
+                    continue
+                if replacement is None:
+                    count = finder.count(text)
+                else:
+                    new_text, count = finder.replace(text, replacement)
+                    if count and new_text != text:
+                        result.deltas.append((row_index, column, text, new_text))
+                if count:
+                    result.cells += 1
+                    result.matches += count
+        if progress is not None:
+            progress(chunk_end, total)
+    return result
+
+
+class ScanThread(threading.Thread):
+    """
+    Runs `scan` on a background thread. The GUI polls `done` (e.g. from
+    root.after or a QTimer) and reads `result` or `error` once it is set.
+    """
+
+    def __init__(self, rows, columns, finder: Finder, replacement: Optional[str] = None):
+        super().__init__(daemon=True)
+        self.rows = rows
+        self.columns = columns
+        self.finder = finder
+        self.replacement = replacement
+        self.cancel_event = threading.Event()
+        self.rows_done = 0
+        self.total_rows = len(rows)
+        self.result: Optional[ScanResult] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+    def _progress(self, rows_done: int, total_rows: int):
+        self.rows_done = rows_done
+
+    def run(self):
+        try:
+            self.result = scan(self.rows, self.columns, self.finder, self.replacement,
+                               progress=self._progress, cancel=self.cancel_event)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+def show_find_replace_dialog(parent, column_labels: List[str], selected: Sequence[int],
+                             get_rows: Callable[[List[int]], Tuple[Sequence[Sequence[str]], List[int]]],
+                             apply: Callable[[List[Delta], str], int]):
+    """
+    Opens the Tk find/replace window. Matches are counted and replacements
+    planned on a ScanThread, then handed to the editor to apply.
+
+    Args:
+        parent: Window the dialog belongs to.
+        column_labels: Columns offered in the list, in order.
+        selected: Indexes of the columns selected when the window opens.
+        get_rows: Called as get_rows(columns) with the chosen column indexes when
+            a search starts. Returns the rows to scan and, for each chosen
+            column, the index of its cell in those rows.
+        apply: Called as apply(deltas, label) with (row, column, old, new) deltas,
+            column being an index into column_labels. Returns the number of
+            cells changed.
+    """
+    import tkinter as tk  # Only the Tk editors open the window
+    from tkinter import messagebox, ttk
+
+    window = tk.Toplevel(parent)
+    window.title("Find and Replace")
+    window.transient(parent)
+
+    tk.Label(window, text="Find:").grid(row=0, column=0, sticky='w', padx=5, pady=2)
+    find_entry = tk.Entry(window, width=50)
+    find_entry.grid(row=0, column=1, columnspan=2, sticky='ew', padx=5, pady=2)
+    find_entry.focus_set()
+    tk.Label(window, text="Replace with:").grid(row=1, column=0, sticky='w', padx=5, pady=2)
+    replace_entry = tk.Entry(window, width=50)
+    replace_entry.grid(row=1, column=1, columnspan=2, sticky='ew', padx=5, pady=2)
+
+    regex_var = tk.BooleanVar(value=False)
+    case_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(window, text="Regular expression", variable=regex_var).grid(row=2, column=1, sticky='w')
+    tk.Checkbutton(window, text="Match case", variable=case_var).grid(row=2, column=2, sticky='w')
+
+    tk.Label(window, text="Columns:").grid(row=3, column=0, sticky='nw', padx=5, pady=2)
+    column_list = tk.Listbox(window, selectmode=tk.MULTIPLE, height=10, exportselection=False)
+    for label in column_labels:
+        column_list.insert(tk.END, label)
+    for idx in selected:
+        column_list.select_set(idx)
+    column_list.grid(row=3, column=1, columnspan=2, sticky='nsew', padx=5, pady=2)
+
+    progress = ttk.Progressbar(window, mode='determinate')
+    progress.grid(row=4, column=0, columnspan=3, sticky='ew', padx=5, pady=2)
+    result_label = tk.Label(window, text="", anchor='w')
+    result_label.grid(row=5, column=0, columnspan=3, sticky='ew', padx=5)
+
+    scan = {'thread': None, 'columns': {}}
+
+    def set_running(running: bool):
+        state = tk.DISABLED if running else tk.NORMAL
+        count_button.config(state=state)
+        replace_button.config(state=state)
+        cancel_button.config(state=tk.NORMAL if running else tk.DISABLED)
+
+    def start_scan(replace: bool):
+        if scan['thread'] is not None:
+            return
+        try:
+            finder = Finder(find_entry.get(), regex=regex_var.get(), case_sensitive=case_var.get())
+        except ValueError as e:
+            messagebox.showwarning("Find and Replace", str(e), parent=window)
+            return
+        columns = list(column_list.curselection())
+        if not columns:
+            messagebox.showwarning("Find and Replace", "Select at least one column.", parent=window)
+            return
+        rows, row_columns = get_rows(columns)
+        scan['columns'] = dict(zip(row_columns, columns))
+        scan['thread'] = ScanThread(rows, row_columns, finder, replace_entry.get() if replace else None)
+        progress.config(maximum=max(len(rows), 1), value=0)
+        result_label.config(text="Searching...")
+        set_running(True)
+        scan['thread'].start()
+        window.after(50, poll_scan)
+
+    def poll_scan():
+        scan_thread = scan['thread']
+        if not window.winfo_exists():
+            return
+        progress['value'] = scan_thread.rows_done
+        if not scan_thread.done.is_set():
+            window.after(50, poll_scan)
+            return
+        scan['thread'] = None
+        set_running(False)
+
+        if scan_thread.error is not None:
+            result_label.config(text="")
+            messagebox.showerror("Find and Replace", f"Search failed:\n{scan_thread.error}", parent=window)
+            return
+        result = scan_thread.result
+        if result.cancelled:
+            result_label.config(text="Cancelled.")
+            return
+        result_label.config(text=f"{result.matches} match(es) in {result.cells} cell(s).")
+        if scan_thread.replacement is None or not result.deltas:
+            return
+        if messagebox.askyesno("Replace All",
+                               f"Replace {result.matches} match(es) in {len(result.deltas)} cell(s)?",
+                               parent=window):
+            deltas = [(row, scan['columns'][column], old, new) for row, column, old, new in result.deltas]
+            changed = apply(deltas, f"Replace '{find_entry.get()}'")
+            result_label.config(text=f"Replaced text in {changed} cell(s).")
+
+    def cancel_scan():
+        if scan['thread'] is not None:
+            scan['thread'].cancel()
+
+    def close():
+        cancel_scan()
+        window.destroy()
+
+    button_frame = tk.Frame(window)
+    button_frame.grid(row=6, column=0, columnspan=3, pady=5)
+    count_button = tk.Button(button_frame, text="Count", command=lambda: start_scan(False))
+    count_button.pack(side=tk.LEFT, padx=5)
+    replace_button = tk.Button(button_frame, text="Replace All", command=lambda: start_scan(True))
+    replace_button.pack(side=tk.LEFT, padx=5)
+    cancel_button = tk.Button(button_frame, text="Cancel", state=tk.DISABLED, command=cancel_scan)
+    cancel_button.pack(side=tk.LEFT, padx=5)
+    tk.Button(button_frame, text="Close", command=close).pack(side=tk.LEFT, padx=5)
+
+    window.grid_columnconfigure(1, weight=1)
+    window.grid_rowconfigure(3, weight=1)
+    window.protocol("WM_DELETE_WINDOW", close)
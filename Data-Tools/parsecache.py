@@ -0,0 +1,154 @@
+"""
+Optional on-disk cache of parsed data files.
+
+Parsed structures are pickled into a cache directory, keyed by the file's
+absolute path, size and modification time (or its content hash), so opening
+a large file that didn't change skips the parser entirely. The directory is
+trimmed least-recently-used first once it grows past its size limit.
+
+The cache is off unless enabled: set ROSE_PARSE_CACHE=1 to use the default
+directory (~/.cache/airose), or set it to a directory path.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from typing import Any, Callable, Optional
+
+import profiling
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENV_VAR = 'ROSE_PARSE_CACHE'
+CACHE_FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'airose')
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 use_content_hash: bool = False):
+        """
+        Args:
+            cache_dir: Directory holding the cached entries.
+            max_bytes: Total size the directory is trimmed back to after each store.
+            use_content_hash: Key entries by a hash of the file contents instead of
+                its size and modification time (slower, but survives touch/copy).
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_content_hash = use_content_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def from_environment() -> Optional['ParseCache']:
+        """Returns the cache configured through ROSE_PARSE_CACHE, or None if it's disabled."""
+        setting = os.environ.get(CACHE_ENV_VAR, '').strip()
+        if not setting or setting == '0':
+            return None
+        try:
+            return ParseCache(DEFAULT_CACHE_DIR if setting == '1' else setting)
+        except OSError as e:
+            logger.warning(f"Parse cache disabled, cannot use {setting}: {e}")
+            return None
+
+    def _key(self, file_path: str, kind: str) -> str:
+        file_path = os.path.abspath(file_path)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{CACHE_FORMAT_VERSION}|{kind}|{file_path}|".encode('utf-8'))
+        if self.use_content_hash:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            stat = os.stat(file_path)
+            digest.update(f"{stat.st_size}|{stat.st_mtime_ns}".encode('ascii'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def get(self, file_path: str, kind: str) -> Any:
+        """Returns the cached parse result for the file, or None on a miss."""
+        entry_path = self._entry_path(self._key(file_path, kind))
+        try:
+            with open(entry_path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            profiling.count('cache.misses')
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {entry_path}: {e}")
+            self._remove(entry_path)
+            profiling.count('cache.misses')
+            return None
+        profiling.count('cache.hits')
+        # Entry modification time doubles as its last-used time for LRU trimming
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, file_path: str, kind: str, value: Any):
+        """Stores a parse result. `value` must only contain plain picklable data."""
+        entry_path = self._entry_path(self._key(file_path, kind))
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                profiling.count('cache.bytes_written', f.tell())
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry for {file_path}: {e}")
+            self._remove(temp_path)
+            return
+        self.trim()
+
+    def get_or_parse(self, file_path: str, kind: str, parse: Callable[[], Any]) -> Any:
+        """
+        Returns the cached parse result, calling `parse()` and storing its
+        result on a miss.
+
+        Args:
+            file_path: The data file being opened.
+            kind: Name of the parser (part of the key, e.g. 'stb').
+            parse: Function parsing the file into plain picklable data.
+        """
+        value = self.get(file_path, kind)
+        if value is None:
+            value = parse()
+            self.put(file_path, kind, value)
+        return value
+
+    def trim(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as scan:
+            for item in scan:
+                if item.is_file() and item.name.endswith('.pkl'):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        with os.scandir(self.cache_dir) as scan:
+            for item in scan:
+                if item.name.endswith('.pkl') or item.name.endswith('.tmp'):
+                    self._remove(item.path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
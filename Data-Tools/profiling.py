@@ -0,0 +1,289 @@
+"""
+Timing spans and counters shared by the editors and the command line tools.
+
+Code marks the work worth measuring with spans and counters:
+
+    with profiling.span('stb.load', file=file_path) as span:
+        ...
+        span.set('rows', row_count)
+    profiling.count('ltb.cells_decoded', rows)
+
+Profiling is off unless enabled, and then a span is a shared no-op object
+and a counter returns right away, so instrumented code pays one flag check.
+Set the environment variable ROSE_PROFILE to turn it on:
+
+    ROSE_PROFILE=1                  record, export from the editors' menus
+    ROSE_PROFILE=run.json           also write a JSON report on exit
+    ROSE_PROFILE=run.trace.json     ...or a Chrome trace (chrome://tracing, Perfetto)
+
+The JSON report holds every span, the counters and a per-name summary
+(calls, total, mean and max time). `python profiling.py FILE` prints the
+summary of a report or trace.
+
+Span names are 'area.step' (e.g. 'ltb.decode_column'); the area becomes the
+category of the span in the trace.
+"""
+import argparse
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV_VAR = 'ROSE_PROFILE'
+# Spans kept at most, so a long session can't grow without bound
+MAX_SPANS = 1000000
+CHROME_TRACE_SUFFIXES = ('.trace.json', '.trace')
+
+_enabled = False
+_spans: List[tuple] = []  # (name, start, end, thread id, args)
+_counters: Dict[str, float] = {}
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def set(self, key: str, value):
+        """Attaches a value to the span (e.g. how many rows it handled)."""
+        self.args[key] = value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        if len(_spans) < MAX_SPANS:
+            _spans.append((self.name, self.start, end, threading.get_ident(), self.args))
+        else:
+            count('profiling.dropped_spans')
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Forgets the spans and counters recorded so far."""
+    global _origin
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _origin = time.perf_counter()
+
+
+def span(name: str, **args):
+    """Context manager timing a block (a no-op when profiling is off)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, amount: float = 1):
+    """Adds to a counter (a no-op when profiling is off)."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def profiled(name: str):
+    """Decorator timing every call of a function as a span."""
+    def decorate(function):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name, {}):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorate
+
+
+def summary() -> Dict[str, dict]:
+    """Per span name: calls, total, mean and max duration in milliseconds."""
+    totals: Dict[str, dict] = {}
+    for name, start, end, _, _ in list(_spans):
+        duration = (end - start) * 1000.0
+        entry = totals.get(name)
+        if entry is None:
+            totals[name] = {'calls': 1, 'total_ms': duration, 'max_ms': duration}
+        else:
+            entry['calls'] += 1
+            entry['total_ms'] += duration
+            entry['max_ms'] = max(entry['max_ms'], duration)
+    for entry in totals.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+    return totals
+
+
+def to_json() -> dict:
+    """The spans (times in milliseconds since profiling started), counters and summary."""
+    with _lock:
+        counters = dict(_counters)
+    return {
+        'spans': [{'name': name, 'start_ms': (start - _origin) * 1000.0, 'duration_ms': (end - start) * 1000.0,
+                   'thread': thread, 'args': args}
+                  for name, start, end, thread, args in list(_spans)],
+        'counters': counters,
+        'summary': summary(),
+    }
+
+
+def to_chrome_trace() -> dict:
+    """The spans as complete ('X') events and the counters as counter ('C') events, in microseconds."""
+    pid = os.getpid()
+    events = [{'name': name, 'cat': name.split('.', 1)[0], 'ph': 'X', 'pid': pid, 'tid': thread,
+               'ts': (start - _origin) * 1e6, 'dur': (end - start) * 1e6, 'args': _plain(args)}
+              for name, start, end, thread, args in list(_spans)]
+    now = (time.perf_counter() - _origin) * 1e6
+    with _lock:
+        counters = dict(_counters)
+    events.extend({'name': name, 'cat': name.split('.', 1)[0], 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': now,
+                   'args': {'value': value}}
+                  for name, value in counters.items())
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _plain(args: dict) -> dict:
+    return {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+            for key, value in args.items()}
+
+
+def is_chrome_trace_path(path: str) -> bool:
+    return path.lower().endswith(CHROME_TRACE_SUFFIXES)
+
+
+def export(path: str, chrome_trace: Optional[bool] = None):
+    """
+    Writes what was recorded to a file: a Chrome trace if `chrome_trace` is
+    True (or, when it is None, if the name ends with .trace.json), otherwise
+    the JSON report.
+    """
+    if chrome_trace is None:
+        chrome_trace = is_chrome_trace_path(path)
+    data = to_chrome_trace() if chrome_trace else to_json()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str)
+
+
+def format_summary(totals: Optional[Dict[str, dict]] = None, counters: Optional[Dict[str, float]] = None) -> str:
+    """Summary table, slowest span names first, followed by the counters."""
+    if totals is None:
+        totals = summary()
+    if counters is None:
+        with _lock:
+            counters = dict(_counters)
+    lines = [f"{'span':<32} {'calls':>7} {'total ms':>11} {'mean ms':>10} {'max ms':>10}"]
+    for name, entry in sorted(totals.items(), key=lambda item: -item[1]['total_ms']):
+        lines.append(f"{name:<32} {entry['calls']:>7} {entry['total_ms']:>11.1f} "
+                     f"{entry['mean_ms']:>10.2f} {entry['max_ms']:>10.2f}")
+    if counters:
+        lines.append('')
+        lines.extend(f"{name:<32} {value:>12g}" for name, value in sorted(counters.items()))
+    return '\n'.join(lines)
+
+
+def _export_on_exit(path: str):
+    if multiprocessing.parent_process() is not None:
+        return  # A worker process (e.g. of a parallel index build), the main process writes the profile
+    try:
+        export(path)
+    except OSError as e:
+        logger.warning(f"Failed to write the profile to {path}: {e}")
+
+
+def _setup_from_environment():
+    setting = os.environ.get(PROFILE_ENV_VAR, '').strip()
+    if not setting or setting == '0':
+        return
+    enable()
+    if setting != '1':
+        atexit.register(_export_on_exit, setting)
+
+
+def load_summary(path: str):
+    """Summary and counters of an exported JSON report or Chrome trace."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'traceEvents' not in data:
+        return data.get('summary', {}), data.get('counters', {})
+    totals: Dict[str, dict] = {}
+    counters = {}
+    for event in data['traceEvents']:
+        if event.get('ph') == 'C':
+            counters[event['name']] = event.get('args', {}).get('value', 0)
+            continue
+        if event.get('ph') != 'X':
+            continue
+        duration = event.get('dur', 0) / 1000.0
+        entry = totals.setdefault(event['name'], {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['calls'] += 1
+        entry['total_ms'] += duration
+        entry['max_ms'] = max(entry['max_ms'], duration)
+    for entry in totals.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+    return totals, counters
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Print the summary of a profile written with ROSE_PROFILE=FILE.")
+    parser.add_argument('profile', help="JSON report or Chrome trace")
+    args = parser.parse_args(argv)
+    try:
+        totals, counters = load_summary(args.profile)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cannot read {args.profile}: {e}", file=sys.stderr)
+        return 1
+    print(format_summary(totals, counters))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+else:
+    _setup_from_environment()
@@ -0,0 +1,224 @@
+"""
+Cross-file reference index for a data directory.
+
+STB rows point at strings by key: STL string_ids (LFAC001 -> "Flu Mask")
+and LTB Dialog IDs. This module parses every file of a directory once and
+keeps two hash maps:
+
+    targets:   key -> files defining it (STL string_id, LTB Dialog ID)
+    referrers: key -> STB cells (file, row, column) holding it
+
+so resolving a cell or listing who uses a string is a dictionary lookup.
+Parsed files are stored in DATA_DIR/.roserefs.idx keyed by size and mtime;
+a refresh only re-parses the files that changed and patches both maps with
+the difference.
+
+A column of an STB is considered a reference column when at least half of
+its key-like cells resolve. Its cells that don't resolve are reported as
+dangling references.
+
+Usage:
+    python refindex.py DATA_DIR [--dangling] [--lookup KEY] [--referrers KEY] [--json] [--reindex]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import profiling
+from rosedata import FileIndex, file_kind, load_table
+
+INDEX_FILE_NAME = '.roserefs.idx'
+INDEX_VERSION = 1
+
+# Cells that look like keys: letters followed by digits, e.g. LFAC001 or QST_0001
+KEY_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_]*[0-9]\Z')
+# Text shown for a key, in order of preference (the first non-empty text column otherwise)
+PREFERRED_TEXT_COLUMNS = ['text_English', 'Col 2']
+# LTB column holding the Dialog ID
+LTB_KEY_COLUMN = 0
+
+
+def _entry_text(columns: List[str], row: List[str], key_column: int) -> str:
+    for name in PREFERRED_TEXT_COLUMNS:
+        if name in columns and row[columns.index(name)]:
+            return row[columns.index(name)]
+    for idx, value in enumerate(row):
+        if idx != key_column and value and columns[idx] != 'id' and not columns[idx].startswith('comment_'):
+            return value
+    return ''
+
+
+def build_entry(file_path: str) -> dict:
+    """
+    Parses a file and returns its index entry. Runs in worker processes.
+
+    STL and LTB entries hold the keys they define ({key: (row, text)}); STB
+    entries hold their key-like cells as (row, column, value).
+    """
+    stat = os.stat(file_path)
+    kind = file_kind(file_path)
+    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'kind': kind, 'error': None,
+             'columns': [], 'keys': {}, 'cells': []}
+    try:
+        table = load_table(file_path)
+    except Exception as e:
+        entry['error'] = str(e)
+        return entry
+
+    entry['columns'] = table.columns
+    if kind == 'stb':
+        match = KEY_PATTERN.match
+        entry['cells'] = [(row_index, col, value)
+                          for row_index, row in enumerate(table.rows)
+                          for col, value in enumerate(row) if value and match(value)]
+        return entry
+
+    key_column = table.columns.index('string_id') if kind == 'stl' else LTB_KEY_COLUMN
+    keys = {}
+    for row_index, row in enumerate(table.rows):
+        if key_column < len(row):
+            key = row[key_column].strip()
+            if key and key not in keys:
+                keys[key] = (row_index, _entry_text(table.columns, row, key_column))
+    entry['keys'] = keys
+    return entry
+
+
+class ReferenceIndex(FileIndex):
+    """Reference index for one data directory."""
+    INDEX_FILE_NAME = INDEX_FILE_NAME
+    INDEX_VERSION = INDEX_VERSION
+    PROFILE_NAME = 'refindex'
+    build_entry = staticmethod(build_entry)
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self.targets: Dict[str, List[str]] = {}
+        self.referrers: Dict[str, List[Tuple[str, int, int]]] = {}
+        super().__init__(root, index_path)
+
+    def entries_loaded(self):
+        self.targets = {}
+        self.referrers = {}
+        for rel_path, entry in self.files.items():
+            self.entry_added(rel_path, entry)
+
+    def entry_added(self, rel_path: str, entry: dict):
+        for key in entry['keys']:
+            self.targets.setdefault(key, []).append(rel_path)
+        for row, col, value in entry['cells']:
+            self.referrers.setdefault(value, []).append((rel_path, row, col))
+
+    def entry_removed(self, rel_path: str, entry: dict):
+        for key in entry['keys']:
+            files = self.targets.get(key)
+            if files and rel_path in files:
+                files.remove(rel_path)
+                if not files:
+                    del self.targets[key]
+        for value in {value for _, _, value in entry['cells']}:
+            cells = [cell for cell in self.referrers.get(value, []) if cell[0] != rel_path]
+            if cells:
+                self.referrers[value] = cells
+            else:
+                self.referrers.pop(value, None)
+
+    def lookup(self, key: str) -> List[dict]:
+        """Where a key is defined: [{'file', 'row', 'text'}]."""
+        results = []
+        for rel_path in self.targets.get(key.strip(), []):
+            row, text = self.files[rel_path]['keys'][key.strip()]
+            results.append({'file': rel_path, 'row': row, 'text': text})
+        return results
+
+    def resolve(self, key: str) -> Optional[str]:
+        """Text of the first definition of a key, or None if it is not defined anywhere."""
+        files = self.targets.get(key.strip())
+        if not files:
+            return None
+        return self.files[files[0]]['keys'][key.strip()][1]
+
+    def referrers_of(self, key: str) -> List[dict]:
+        """STB cells referencing a key: [{'file', 'row', 'column', 'column_name'}]."""
+        results = []
+        for rel_path, row, col in self.referrers.get(key.strip(), []):
+            columns = self.files[rel_path]['columns']
+            results.append({'file': rel_path, 'row': row, 'column': col,
+                            'column_name': columns[col] if col < len(columns) else f'Col {col}'})
+        return results
+
+    @profiling.profiled('refindex.dangling')
+    def dangling(self) -> List[dict]:
+        """
+        Unresolved cells of the reference columns of every STB:
+        [{'file', 'row', 'column', 'column_name', 'value'}].
+        """
+        results = []
+        targets = self.targets
+        for rel_path in sorted(self.files):
+            entry = self.files[rel_path]
+            if entry['kind'] != 'stb' or not entry['cells']:
+                continue
+            by_column: Dict[int, List[Tuple[int, str]]] = {}
+            for row, col, value in entry['cells']:
+                by_column.setdefault(col, []).append((row, value))
+            for col in sorted(by_column):
+                cells = by_column[col]
+                unresolved = [(row, value) for row, value in cells if value not in targets]
+                if len(unresolved) * 2 > len(cells):
+                    continue  # Mostly unresolved: not a reference column
+                columns = entry['columns']
+                for row, value in unresolved:
+                    results.append({'file': rel_path, 'row': row, 'column': col,
+                                    'column_name': columns[col] if col < len(columns) else f'Col {col}',
+                                    'value': value})
+        return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Index STB -> STL/LTB references in a data directory.")
+    parser.add_argument('directory', help="Data directory, e.g. the client's 3DDATA folder.")
+    parser.add_argument('--dangling', action='store_true', help="List references to strings that don't exist.")
+    parser.add_argument('--lookup', metavar='KEY', help="Show where a string_id or Dialog ID is defined.")
+    parser.add_argument('--referrers', metavar='KEY', help="Show the STB cells referencing a key.")
+    parser.add_argument('--workers', type=int, help="Number of parser processes (default: CPU count).")
+    parser.add_argument('--index', help=f"Index file (default: DATA_DIR/{INDEX_FILE_NAME}).")
+    parser.add_argument('--reindex', action='store_true', help="Discard the index and re-parse every file.")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+    args = parser.parse_args(argv)
+
+    index = ReferenceIndex(args.directory, args.index)
+    if args.reindex:
+        index.clear()
+    parsed = index.refresh(workers=args.workers)
+    if parsed:
+        print(f"Indexed {parsed} changed file(s).", file=sys.stderr)
+    for rel_path, error in index.errors().items():
+        print(f"Skipped {rel_path}: {error}", file=sys.stderr)
+    print(f"{len(index.targets)} key(s) defined, {len(index.referrers)} distinct key(s) referenced.", file=sys.stderr)
+
+    results = {}
+    if args.lookup:
+        results['lookup'] = index.lookup(args.lookup)
+    if args.referrers:
+        results['referrers'] = index.referrers_of(args.referrers)
+    if args.dangling:
+        results['dangling'] = index.dangling()
+
+    if args.json:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        for hit in results.get('lookup', []):
+            print(f"{hit['file']}:{hit['row']}: {hit['text']}")
+        for hit in results.get('referrers', []):
+            print(f"{hit['file']}:{hit['row']}:{hit['column_name']}")
+        for hit in results.get('dangling', []):
+            print(f"{hit['file']}:{hit['row']}:{hit['column_name']}: {hit['value']} not found")
+    return 1 if results.get('dangling') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
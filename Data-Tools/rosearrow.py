@@ -0,0 +1,361 @@
+"""
+Arrow / Parquet export and import of STB, STL and LTB files.
+
+A data file becomes an Arrow table with one column per file column, typed
+so analytics tools can use it directly:
+
+    STB  columns whose cells are all whole numbers (or all decimals) become
+         int32/int64 (or float64) columns, with empty cells as nulls; the
+         others are strings. Column 0 holds the row names.
+    STL  string_id, id (uint32), then text_/comment_/quest1_/quest2_ columns
+         per language. Text that is valid UTF-8 is a string column; columns
+         holding other bytes (e.g. a string cut in the middle of a
+         character) are binary so the bytes survive as they are.
+    LTB  every cell column as a dictionary-encoded string column (LTB
+         columns repeat the same strings a lot).
+
+What is needed to write the file back (STB column names and sizes, STL type
+and languages, LTB encoding) is kept in the schema metadata under 'rose', so
+export followed by import gives the same file (for STL, the same file as
+saving it from the editor). Tables made elsewhere can be imported too, as
+long as the kind is given (or implied by the output name).
+
+Parquet files are written with zstd compression. Arrow IPC files (.arrow,
+.feather) are written uncompressed and read back memory-mapped, without
+copying the column data.
+
+Needs pyarrow (pip install pyarrow).
+
+Usage:
+    python rosearrow.py export LIST_ITEM.STB -o list_item.parquet
+    python rosearrow.py export DATA_DIR -o OUT_DIR [--format arrow]
+    python rosearrow.py import list_item.parquet -o LIST_ITEM.STB
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+import profiling
+from rosedata import detect_ltb_encoding, file_kind, iter_data_files
+from rosesql import INTEGER_PATTERN, REAL_PATTERN
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+METADATA_KEY = b'rose'
+FORMAT_SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow'}
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+PARQUET_COMPRESSION = 'zstd'
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Arrow/Parquet support needs pyarrow (pip install pyarrow)")
+
+
+def unique_names(names: List[str]) -> List[str]:
+    """Column names made unique (STB files repeat names like "Null"), as name, name_2, name_3..."""
+    seen = {}
+    result = []
+    for name in names:
+        name = name or 'column'
+        count = seen.get(name, 0) + 1
+        seen[name] = count
+        result.append(name if count == 1 else f'{name}_{count}')
+    return result
+
+
+def typed_array(values: List[str]):
+    """
+    An integer (int32, or int64 if needed) or float64 array if every
+    non-empty cell is a number that converts back to exactly the same text,
+    otherwise a string array. Empty cells of numeric columns are nulls.
+    """
+    present = [value for value in values if value]
+    if present and all(INTEGER_PATTERN.match(value) for value in present):
+        numbers = [int(value) if value else None for value in values]
+        if all(str(number) == value for number, value in zip(numbers, values) if value):
+            smallest = min(number for number in numbers if number is not None)
+            largest = max(number for number in numbers if number is not None)
+            if INT32_MIN <= smallest and largest <= INT32_MAX:
+                return pyarrow.array(numbers, type=pyarrow.int32())
+            if INT64_MIN <= smallest and largest <= INT64_MAX:
+                return pyarrow.array(numbers, type=pyarrow.int64())
+    elif present and all(REAL_PATTERN.match(value) for value in present):
+        numbers = [float(value) if value else None for value in values]
+        if all(repr(number) == value for number, value in zip(numbers, values) if value):
+            return pyarrow.array(numbers, type=pyarrow.float64())
+    return pyarrow.array(values, type=pyarrow.string())
+
+
+def column_strings(column) -> List[str]:
+    """Cells of an Arrow column as the strings the file stores (nulls as "")."""
+    column_type = column.type
+    if pyarrow.types.is_dictionary(column_type):
+        column_type = column_type.value_type
+    values = column.to_pylist()
+    if pyarrow.types.is_floating(column_type):
+        return ['' if value is None else repr(value) for value in values]
+    if pyarrow.types.is_binary(column_type) or pyarrow.types.is_large_binary(column_type):
+        return ['' if value is None else value.decode('latin-1') for value in values]
+    if pyarrow.types.is_string(column_type) or pyarrow.types.is_large_string(column_type):
+        return ['' if value is None else value for value in values]
+    return ['' if value is None else str(value) for value in values]
+
+
+def _table(names: List[str], arrays: list, metadata: dict):
+    return pyarrow.Table.from_arrays(arrays, names=names,
+                                     metadata={METADATA_KEY: json.dumps(metadata, ensure_ascii=False)})
+
+
+def stb_to_arrow(file_path: str):
+    from stb_file import load_stb
+
+    stb = load_stb(file_path)
+    width = max(map(len, stb.cells), default=0)
+    rows = [row if len(row) == width else row + [''] * (width - len(row)) for row in stb.cells]
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+    names = list(stb.column_names[:width]) + [f'Col {idx}' for idx in range(len(stb.column_names), width)]
+    metadata = {'kind': 'stb', 'column_names': stb.column_names, 'column_sizes': stb.column_sizes,
+                'row_size': stb.row_size}
+    return _table(unique_names(names), [typed_array(column) for column in columns], metadata)
+
+
+def stl_to_arrow(file_path: str):
+    from stldiff import read_stl_all_languages
+
+    entries, stl_type, language_names = read_stl_all_languages(file_path)
+    names = list(entries[0].keys()) if entries else ['string_id', 'id']
+    arrays = []
+    for name in names:
+        values = [entry.get(name, '') for entry in entries]
+        if name == 'id':
+            arrays.append(pyarrow.array(values, type=pyarrow.uint32()))
+            continue
+        # The parser keeps the raw bytes as latin-1 text; most files hold UTF-8
+        raw = [value.encode('latin-1') for value in values]
+        try:
+            arrays.append(pyarrow.array([value.decode('utf-8') for value in raw], type=pyarrow.string()))
+        except UnicodeDecodeError:
+            arrays.append(pyarrow.array(raw, type=pyarrow.binary()))
+    metadata = {'kind': 'stl', 'stl_type': stl_type, 'language_names': language_names}
+    return _table(names, arrays, metadata)
+
+
+def ltb_to_arrow(file_path: str, encoding: Optional[str] = None):
+    from ltb_file import LTBFile
+
+    ltb = LTBFile.read_cached(file_path)
+    ltb.encoding = encoding or detect_ltb_encoding(ltb)
+    arrays = [pyarrow.array(ltb.decode_column(column), type=pyarrow.string()).dictionary_encode()
+              for column in range(ltb.columns)]
+    metadata = {'kind': 'ltb', 'encoding': ltb.encoding}
+    return _table([f'Col {idx}' for idx in range(ltb.columns)], arrays, metadata)
+
+
+def to_arrow(file_path: str):
+    """
+    Parses an STB, STL or LTB file into an Arrow table.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+        ValueError: If the file type is not supported or the file is invalid.
+    """
+    require_pyarrow()
+    kind = file_kind(file_path)
+    with profiling.span('arrow.export', file=file_path, kind=kind) as span:
+        if kind == 'stb':
+            table = stb_to_arrow(file_path)
+        elif kind == 'stl':
+            table = stl_to_arrow(file_path)
+        elif kind == 'ltb':
+            table = ltb_to_arrow(file_path)
+        else:
+            raise ValueError(f"Unsupported file type: {file_path}")
+        span.set('rows', table.num_rows)
+    return table
+
+
+def table_metadata(table) -> dict:
+    """The 'rose' schema metadata of an exported table, {} for tables made elsewhere."""
+    raw = (table.schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else {}
+
+
+def write_stb_table(table, file_path: str, metadata: dict):
+    from stb_file import STB
+
+    stb = STB()
+    columns = [column_strings(column) for column in table.columns]
+    stb.cells = [list(row) for row in zip(*columns)]
+    stb.column_names = metadata.get('column_names') or list(table.column_names) + ['']
+    stb.column_sizes = metadata.get('column_sizes') or []
+    stb.row_size = metadata.get('row_size', 0)
+    stb.save(file_path)
+
+
+def write_stl_table(table, file_path: str, metadata: dict):
+    from stldiff import DEFAULT_LANGUAGES
+    from stleditor import write_stl
+
+    names = table.column_names
+    if 'string_id' not in names or 'id' not in names:
+        raise ValueError("An STL table needs string_id and id columns")
+    columns = {}
+    for name, column in zip(names, table.columns):
+        if name == 'id':
+            columns[name] = [0 if value is None else int(value) for value in column.to_pylist()]
+        elif pyarrow.types.is_string(column.type) or pyarrow.types.is_large_string(column.type):
+            # Back to the parser's latin-1 view of the UTF-8 bytes
+            columns[name] = [value.encode('utf-8').decode('latin-1') for value in column_strings(column)]
+        else:
+            columns[name] = column_strings(column)
+    entries = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    language_names = metadata.get('language_names')
+    if not language_names:
+        # Languages are identified by their position in the file, so the usual five are
+        # always written to keep them in place; the ones without columns are written empty
+        present = [name[len('text_'):] for name in names if name.startswith('text_')]
+        language_names = DEFAULT_LANGUAGES + [name for name in present if name not in DEFAULT_LANGUAGES]
+    stl_type = metadata.get('stl_type') or ('ITST01' if any(name.startswith('comment_') for name in names)
+                                            else 'NRST01')
+    write_stl(file_path, entries, stl_type, language_names, language_names)
+
+
+def write_ltb_table(table, file_path: str, metadata: dict, encoding: Optional[str] = None):
+    from ltb_file import LTBFile
+
+    encoding = encoding or metadata.get('encoding') or 'utf-16le'
+    ltb = LTBFile.from_columns([column_strings(column) for column in table.columns], encoding)
+    ltb.write(file_path)
+
+
+def from_arrow(table, file_path: str, kind: Optional[str] = None, encoding: Optional[str] = None):
+    """
+    Writes an Arrow table as an STB, STL or LTB file.
+
+    Args:
+        table: Table exported by to_arrow, or any table with the file's columns.
+        file_path: File to write.
+        kind: 'stb', 'stl' or 'ltb'; defaults to the kind stored in the table,
+            then to the extension of file_path.
+        encoding: LTB text encoding, defaults to the one the table was exported from.
+
+    Raises:
+        ValueError: If the kind can't be determined or the table doesn't fit it.
+    """
+    require_pyarrow()
+    metadata = table_metadata(table)
+    kind = kind or metadata.get('kind') or file_kind(file_path)
+    with profiling.span('arrow.import', file=file_path, kind=kind, rows=table.num_rows):
+        if kind == 'stb':
+            write_stb_table(table, file_path, metadata)
+        elif kind == 'stl':
+            write_stl_table(table, file_path, metadata)
+        elif kind == 'ltb':
+            write_ltb_table(table, file_path, metadata, encoding)
+        else:
+            raise ValueError(f"Can't tell which kind of file to write for {file_path}, give the kind")
+
+
+def write_table(table, path: str, format_name: Optional[str] = None):
+    """Writes a table as Parquet, or as an Arrow IPC file for .arrow/.feather names (or format 'arrow')."""
+    require_pyarrow()
+    if format_name is None:
+        format_name = 'arrow' if path.lower().endswith(ARROW_SUFFIXES) else 'parquet'
+    with profiling.span('arrow.write', file=path, format=format_name):
+        if format_name == 'arrow':
+            with pyarrow.OSFile(path, 'wb') as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pyarrow.parquet.write_table(table, path, compression=PARQUET_COMPRESSION)
+
+
+def read_table(path: str):
+    """
+    Reads a Parquet or Arrow IPC file. Arrow files are memory-mapped, so the
+    columns point into the mapped file instead of being copied.
+    """
+    require_pyarrow()
+    with profiling.span('arrow.read', file=path):
+        if path.lower().endswith(ARROW_SUFFIXES):
+            source = pyarrow.memory_map(path, 'r')
+            try:
+                return pyarrow.ipc.open_file(source).read_all()
+            except pyarrow.ArrowInvalid:
+                source.seek(0)
+                return pyarrow.ipc.open_stream(source).read_all()
+        return pyarrow.parquet.read_table(path, memory_map=True)
+
+
+def _export(args) -> int:
+    single = len(args.paths) == 1 and not os.path.isdir(args.paths[0])
+    if single and not os.path.isdir(args.output):
+        jobs = [(args.paths[0], args.output)]
+    else:
+        suffix = FORMAT_SUFFIXES[args.format or 'parquet']
+        jobs = []
+        for path in args.paths:
+            if os.path.isdir(path):
+                jobs.extend((file_path, os.path.join(args.output, os.path.relpath(file_path, path) + suffix))
+                            for file_path in iter_data_files(path, args.kind))
+            else:
+                jobs.append((path, os.path.join(args.output, os.path.basename(path) + suffix)))
+    failed = 0
+    for file_path, output in jobs:
+        try:
+            table = to_arrow(file_path)
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            write_table(table, output, args.format)
+        except Exception as e:
+            print(f"Skipped {file_path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"{file_path} -> {output} ({table.num_rows} rows)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _import(args) -> int:
+    try:
+        table = read_table(args.paths[0])
+        from_arrow(table, args.output, args.kind[0] if args.kind else None, args.encoding)
+    except (OSError, ValueError, UnicodeError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.paths[0]} -> {args.output} ({table.num_rows} rows)", file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert STB/STL/LTB files to and from Arrow/Parquet.")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('paths', nargs='+', help="export: data files or directories; import: a Parquet/Arrow file.")
+    parser.add_argument('-o', '--output', required=True,
+                        help="export: output file (one input) or directory; import: the data file to write.")
+    parser.add_argument('--format', choices=sorted(FORMAT_SUFFIXES),
+                        help="Export format (default: from the output name, else parquet).")
+    parser.add_argument('--kind', action='append', choices=['stb', 'stl', 'ltb'],
+                        help="export: only this file type; import: the type to write (default: stored in the table).")
+    parser.add_argument('--encoding', choices=['utf-16le', 'euc-kr'], help="LTB text encoding when importing.")
+    args = parser.parse_args(argv)
+
+    if pyarrow is None:
+        print("pyarrow is not installed (pip install pyarrow).", file=sys.stderr)
+        return 2
+    if args.command == 'import':
+        if len(args.paths) != 1:
+            parser.error("import takes one Parquet/Arrow file")
+        return _import(args)
+    return _export(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
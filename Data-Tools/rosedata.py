@@ -0,0 +1,242 @@
+"""
+Shared loading helpers for the command line data tools.
+
+The parsers live next to their editors (STB-Editor/stb_file.py,
+STL-Editor/stleditor.py and LTB-Editor/ltb_file.py). This module puts those
+folders on the import path and turns any of the three formats into a
+`Table`: a plain grid of strings with column names. `FileIndex` is the base
+of the on-disk directory indexes built from those tables.
+"""
+import os
+import pickle
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import profiling
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EDITOR_DIRS = [os.path.join(ROOT_DIR, name) for name in ('STB-Editor', 'STL-Editor', 'LTB-Editor')]
+
+for _editor_dir in EDITOR_DIRS:
+    if _editor_dir not in sys.path:
+        sys.path.append(_editor_dir)
+
+FILE_KINDS = {'.stb': 'stb', '.stl': 'stl', '.ltb': 'ltb'}
+
+
+def file_kind(file_path: str) -> Optional[str]:
+    """Returns 'stb', 'stl' or 'ltb' based on the file extension, or None."""
+    return FILE_KINDS.get(os.path.splitext(file_path)[1].lower())
+
+
+def iter_data_files(root: str, kinds: Optional[List[str]] = None):
+    """Yields every STB/STL/LTB file below `root`, in a stable order."""
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            kind = file_kind(file_name)
+            if kind and (not kinds or kind in kinds):
+                yield os.path.join(dir_path, file_name)
+
+
+class Table:
+    """A parsed STB, STL or LTB file as a grid of strings."""
+
+    def __init__(self, path: str, kind: str, columns: List[str], rows: List[List[str]]):
+        self.path = path
+        self.kind = kind
+        self.columns = columns
+        self.rows = rows
+
+
+def detect_ltb_encoding(ltb) -> str:
+    """
+    Guesses whether an LTB file stores UTF-16LE or EUC-KR strings.
+
+    Cell sizes are code units for UTF-16LE and bytes for EUC-KR (see
+    LTBFile.get_string), so a UTF-16LE reading of an EUC-KR file runs past
+    the end of the data section.
+    """
+    end = len(ltb.data) + ltb.data_offset
+    for offset, size in ltb.cells:
+        if size and offset + size * 2 > end:
+            return 'euc-kr'
+    return 'utf-16le'
+
+
+def load_stb(file_path: str) -> Table:
+    from stb_file import load_stb as load_stb_file
+
+    stb = load_stb_file(file_path)
+    width = max(map(len, stb.cells), default=0)
+    columns = list(stb.column_names[:width])
+    columns += [f'Col {idx}' for idx in range(len(columns), width)]
+    rows = [row if len(row) == width else row + [''] * (width - len(row)) for row in stb.cells]
+    return Table(file_path, 'stb', columns, rows)
+
+
+def load_stl(file_path: str) -> Table:
+    from stldiff import read_stl_all_languages
+
+    entries, _, _ = read_stl_all_languages(file_path)
+    columns: List[str] = []
+    for entry in entries[:1]:
+        columns = list(entry.keys())
+    rows = [[str(entry.get(column, '')) for column in columns] for entry in entries]
+    return Table(file_path, 'stl', columns, rows)
+
+
+def load_ltb(file_path: str, encoding: Optional[str] = None) -> Table:
+    from ltb_file import LTBFile
+
+    ltb = LTBFile.read_cached(file_path)
+    ltb.encoding = encoding or detect_ltb_encoding(ltb)
+    columns = [f'Col {idx}' for idx in range(ltb.columns)]
+    rows = ltb.to_string_table(list(range(ltb.columns)))
+    return Table(file_path, 'ltb', columns, rows)
+
+
+def load_table(file_path: str) -> Table:
+    """
+    Parses any supported data file into a Table.
+
+    Raises:
+        ValueError: If the file type is not supported or the file is invalid.
+    """
+    kind = file_kind(file_path)
+    if kind == 'stb':
+        return load_stb(file_path)
+    if kind == 'stl':
+        return load_stl(file_path)
+    if kind == 'ltb':
+        return load_ltb(file_path)
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+
+class FileIndex:
+    """
+    Base of the on-disk indexes of a data directory (rosesearch.SearchIndex,
+    refindex.ReferenceIndex). Every data file has one entry, made by
+    `build_entry` and stored with the file's size and mtime in a pickle next
+    to the data, so a refresh only re-parses the files that changed.
+
+    Subclasses set INDEX_FILE_NAME, INDEX_VERSION, PROFILE_NAME and
+    build_entry (a module-level function, as it runs in worker processes),
+    and override the entry_* hooks to keep their own lookup tables current.
+    """
+    INDEX_FILE_NAME = '.rose.idx'
+    INDEX_VERSION = 1
+    PROFILE_NAME = 'index'
+    build_entry: Callable[[str], dict]
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or os.path.join(self.root, self.INDEX_FILE_NAME)
+        self.files: Dict[str, dict] = {}
+        self._refresh_lock = threading.Lock()  # The editors refresh on a worker thread
+        self.load()
+
+    # Hooks
+
+    def entries_loaded(self):
+        """Called after `files` was replaced (load, clear)."""
+
+    def entry_added(self, rel_path: str, entry: dict):
+        """Called after an entry was added to `files`."""
+
+    def entry_removed(self, rel_path: str, entry: dict):
+        """Called after an entry was removed from `files` (or is about to be replaced)."""
+
+    # Storage
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+            self.files = data['files'] if data.get('version') == self.INDEX_VERSION else {}
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+            self.files = {}
+        self.entries_loaded()
+
+    def save(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'version': self.INDEX_VERSION, 'files': self.files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.index_path)
+
+    def clear(self):
+        """Forgets every entry, so the next refresh re-parses every file."""
+        self.files = {}
+        self.entries_loaded()
+
+    # Refresh
+
+    def relative_path(self, file_path: str) -> Optional[str]:
+        """Path of a file relative to the indexed directory, or None if it is outside it."""
+        try:
+            rel_path = os.path.relpath(os.path.abspath(file_path), self.root)
+        except ValueError:  # Another drive
+            return None
+        return None if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep) else rel_path
+
+    def _changes(self, paths: Optional[Iterable[str]]) -> Tuple[List[str], List[str]]:
+        """Relative paths of the files to (re-)parse and of the entries to drop."""
+        if paths is None:
+            candidates = [(os.path.relpath(file_path, self.root), file_path) for file_path in iter_data_files(self.root)]
+        else:
+            candidates = [(self.relative_path(path), path) for path in paths if file_kind(path)]
+            candidates = [(rel_path, path) for rel_path, path in candidates if rel_path is not None]
+
+        stale = []
+        present = set()
+        for rel_path, file_path in candidates:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            present.add(rel_path)
+            entry = self.files.get(rel_path)
+            if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                stale.append(rel_path)
+
+        checked = self.files if paths is None else [rel_path for rel_path, _ in candidates]
+        removed = [rel_path for rel_path in checked if rel_path in self.files and rel_path not in present]
+        return stale, removed
+
+    def refresh(self, workers: Optional[int] = None, paths: Optional[Iterable[str]] = None) -> int:
+        """
+        Re-parses files that were added or changed since the last run, drops
+        files that no longer exist, and returns the number of files parsed.
+
+        Args:
+            workers: Number of parser processes (default: CPU count).
+            paths: Only check these files (e.g. one that was just saved) instead of
+                walking the whole directory. Files outside it are ignored.
+        """
+        with self._refresh_lock, profiling.span(f'{self.PROFILE_NAME}.refresh'):
+            stale, removed = self._changes(paths)
+            for rel_path in removed:
+                self.entry_removed(rel_path, self.files.pop(rel_path))
+
+            file_paths = [os.path.join(self.root, rel_path) for rel_path in stale]
+            if len(file_paths) > 1 and workers != 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    entries = list(pool.map(self.build_entry, file_paths, chunksize=4))
+            else:
+                entries = [self.build_entry(file_path) for file_path in file_paths]
+            for rel_path, entry in zip(stale, entries):
+                old_entry = self.files.get(rel_path)
+                if old_entry is not None:
+                    self.entry_removed(rel_path, old_entry)
+                self.files[rel_path] = entry
+                self.entry_added(rel_path, entry)
+
+            if stale or removed:
+                self.save()
+            return len(stale)
+
+    def errors(self) -> Dict[str, str]:
+        """Files that failed to parse, with their error message."""
+        return {rel_path: entry['error'] for rel_path, entry in self.files.items() if entry['error']}
@@ -0,0 +1,179 @@
+"""
+Directory-wide text search across STB, STL and LTB files.
+
+Every file is parsed once into a search blob (all cells joined with NUL
+separators) and stored in an on-disk index keyed by path, size and mtime.
+Later searches only re-parse files that changed, spreading that work over a
+process pool, and then scan the blobs with str.find.
+
+Usage:
+    python rosesearch.py DATA_DIR "Flu Mask" [--kind stb --kind stl] [--column Name] [--json]
+    python rosesearch.py DATA_DIR --reindex
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+import profiling
+from rosedata import FileIndex, file_kind, load_table
+
+INDEX_FILE_NAME = '.rosesearch.idx'
+INDEX_VERSION = 1
+CELL_SEPARATOR = '\x00'  # Parsed strings never contain NUL, it's the string terminator
+
+
+def build_entry(file_path: str) -> dict:
+    """
+    Parses a file and returns its index entry. Runs in worker processes.
+    Parse failures are recorded in the entry instead of raised.
+    """
+    stat = os.stat(file_path)
+    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'kind': file_kind(file_path)}
+    try:
+        table = load_table(file_path)
+    except Exception as e:
+        entry.update(error=str(e), columns=[], blob='', starts=array('I'))
+        return entry
+
+    cells = [cell for row in table.rows for cell in row]
+    starts = array('I')
+    position = 0
+    for cell in cells:
+        starts.append(position)
+        position += len(cell) + 1
+    entry.update(error=None, columns=table.columns, blob=CELL_SEPARATOR.join(cells), starts=starts)
+    return entry
+
+
+class SearchIndex(FileIndex):
+    """On-disk search index for one data directory."""
+    INDEX_FILE_NAME = INDEX_FILE_NAME
+    INDEX_VERSION = INDEX_VERSION
+    PROFILE_NAME = 'rosesearch'
+    build_entry = staticmethod(build_entry)
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self._lowered: Dict[str, Optional[str]] = {}
+        super().__init__(root, index_path)
+
+    def entries_loaded(self):
+        self._lowered = {}
+
+    def entry_removed(self, rel_path: str, entry: dict):
+        self._lowered.pop(rel_path, None)
+
+    def _lowered_blob(self, rel_path: str) -> Optional[str]:
+        # Lowercasing can change string length for a few characters, in which
+        # case offsets would no longer line up and the file is matched per cell
+        if rel_path not in self._lowered:
+            blob = self.files[rel_path]['blob']
+            lowered = blob.lower()
+            self._lowered[rel_path] = lowered if len(lowered) == len(blob) else None
+        return self._lowered[rel_path]
+
+    @profiling.profiled('rosesearch.search')
+    def search(self, query: str, kinds: Optional[List[str]] = None, column: Optional[str] = None,
+               case_sensitive: bool = False, limit: Optional[int] = None) -> List[dict]:
+        """
+        Finds cells containing `query`.
+
+        Args:
+            query: Text to look for.
+            kinds: Only search these file kinds ('stb', 'stl', 'ltb').
+            column: Only report hits in columns whose name contains this text.
+            case_sensitive: Match case exactly.
+            limit: Stop after this many hits.
+
+        Returns:
+            List[dict]: Hits as {'file', 'row', 'column', 'column_name', 'text'}.
+        """
+        hits: List[dict] = []
+        needle = query if case_sensitive else query.lower()
+        if not needle or CELL_SEPARATOR in needle:
+            return hits
+
+        for rel_path in sorted(self.files):
+            entry = self.files[rel_path]
+            if entry['error'] or (kinds and entry['kind'] not in kinds):
+                continue
+            columns = entry['columns']
+            if not columns:
+                continue
+            wanted_columns = None
+            if column:
+                wanted_columns = {idx for idx, name in enumerate(columns) if column.lower() in name.lower()}
+                if not wanted_columns:
+                    continue
+
+            blob = entry['blob']
+            starts = entry['starts']
+            haystack = blob if case_sensitive else self._lowered_blob(rel_path)
+            if haystack is None:
+                cell_indexes = [idx for idx, cell in enumerate(blob.split(CELL_SEPARATOR)) if needle in cell.lower()]
+            else:
+                cell_indexes = []
+                position = haystack.find(needle)
+                while position != -1:
+                    cell_index = bisect.bisect_right(starts, position) - 1
+                    cell_indexes.append(cell_index)
+                    # Continue after this cell, a cell is reported once
+                    next_start = starts[cell_index + 1] if cell_index + 1 < len(starts) else len(haystack)
+                    position = haystack.find(needle, next_start)
+
+            for cell_index in cell_indexes:
+                row, col = divmod(cell_index, len(columns))
+                if wanted_columns is not None and col not in wanted_columns:
+                    continue
+                start = starts[cell_index]
+                end = blob.find(CELL_SEPARATOR, start)
+                hits.append({'file': rel_path, 'row': row, 'column': col, 'column_name': columns[col],
+                             'text': blob[start:end if end != -1 else len(blob)]})
+                if limit and len(hits) >= limit:
+                    return hits
+        return hits
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search text across all STB/STL/LTB files in a directory.")
+    parser.add_argument('directory', help="Data directory to search, e.g. the client's 3DDATA folder.")
+    parser.add_argument('query', nargs='?', help="Text to search for.")
+    parser.add_argument('--kind', action='append', choices=['stb', 'stl', 'ltb'], help="Only search this file type.")
+    parser.add_argument('--column', help="Only report hits in columns whose name contains this text.")
+    parser.add_argument('--case', action='store_true', help="Case-sensitive search.")
+    parser.add_argument('--limit', type=int, help="Stop after this many hits.")
+    parser.add_argument('--workers', type=int, help="Number of parser processes (default: CPU count).")
+    parser.add_argument('--index', help=f"Index file (default: DATA_DIR/{INDEX_FILE_NAME}).")
+    parser.add_argument('--reindex', action='store_true', help="Discard the index and re-parse every file.")
+    parser.add_argument('--json', action='store_true', help="Print hits as JSON.")
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(args.directory, args.index)
+    if args.reindex:
+        index.clear()
+    parsed = index.refresh(workers=args.workers)
+    if parsed:
+        print(f"Indexed {parsed} changed file(s).", file=sys.stderr)
+    for rel_path, error in index.errors().items():
+        print(f"Skipped {rel_path}: {error}", file=sys.stderr)
+
+    if not args.query:
+        return 0
+
+    hits = index.search(args.query, kinds=args.kind, column=args.column,
+                        case_sensitive=args.case, limit=args.limit)
+    if args.json:
+        json.dump(hits, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        for hit in hits:
+            text = hit['text'].replace('\n', '\\n')
+            print(f"{hit['file']}:{hit['row']}:{hit['column_name']}: {text}")
+    return 0 if hits else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+SQL queries over STB, STL and LTB tables.
+
+Tables are loaded into an in-memory SQLite database (or DuckDB when it is
+installed and asked for) so they can be filtered, joined and sorted with
+plain SQL:
+
+    SELECT col0, col3, col12 FROM list_item WHERE col12 > 500 ORDER BY col3
+
+Each file becomes one table named after the file (LIST_ITEM.STB ->
+list_item). When another loaded file already has that name, the kind and
+then the folder name are added (list_item_stl, client_list_item_stl).
+STB and LTB columns are named col0, col1... (col0 is the row name of an
+STB and the Dialog ID of an LTB); STL columns keep their names (string_id,
+id, text_English, comment_English...). Every table also has a _row column
+holding the row number in the file.
+
+Columns whose non-empty cells are all whole numbers are stored as INTEGER,
+all numbers as REAL, anything else as TEXT, so comparisons like
+`col12 > 500` compare numbers. Empty cells of numeric columns are NULL.
+
+`show_sql_query_dialog` is the Tk query window of the STB and STL editors.
+
+Usage:
+    python rosesql.py DATA_DIR_OR_FILES... -e "SELECT ..." [--csv] [--backend sqlite|duckdb]
+    python rosesql.py DATA_DIR_OR_FILES...      (interactive prompt)
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import profiling
+from rosedata import Table, file_kind, iter_data_files, load_table
+
+ROW_COLUMN = '_row'
+# Column indexed in every table of each kind
+KEY_COLUMNS = {'stb': 'col0', 'stl': 'string_id', 'ltb': 'col0'}
+FETCH_SIZE = 1000
+
+INTEGER_PATTERN = re.compile(r'-?(0|[1-9][0-9]*)\Z')
+REAL_PATTERN = re.compile(r'-?[0-9]+\.[0-9]+\Z')
+
+
+def table_name_for(file_path: str) -> str:
+    """SQL table name for a file: its lowercased name without extension."""
+    name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(file_path))[0].lower())
+    return name if name and not name[0].isdigit() else f't_{name}'
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(values: Sequence[str]) -> str:
+    """Returns 'INTEGER', 'REAL' or 'TEXT' for the cells of one column."""
+    kind = 'INTEGER'
+    seen_value = False
+    for value in values:
+        if not value:
+            continue
+        seen_value = True
+        if kind == 'INTEGER' and INTEGER_PATTERN.match(value):
+            continue
+        if REAL_PATTERN.match(value) or INTEGER_PATTERN.match(value):
+            kind = 'REAL'
+            continue
+        return 'TEXT'
+    return kind if seen_value else 'TEXT'
+
+
+def _converter(kind: str):
+    if kind == 'INTEGER':
+        return lambda value: int(value) if value else None
+    if kind == 'REAL':
+        return lambda value: float(value) if value else None
+    return None
+
+
+class RoseDatabase:
+    def __init__(self, backend: str = 'sqlite'):
+        """
+        Args:
+            backend: 'sqlite', 'duckdb', or 'auto' to use DuckDB when it is installed.
+
+        Raises:
+            ImportError: If 'duckdb' is asked for but not installed.
+        """
+        self.backend = 'sqlite'
+        if backend in ('duckdb', 'auto'):
+            try:
+                import duckdb
+                self.connection = duckdb.connect(':memory:')
+                self.backend = 'duckdb'
+            except ImportError:
+                if backend == 'duckdb':
+                    raise
+        if self.backend == 'sqlite':
+            self.connection = sqlite3.connect(':memory:')
+        self.tables: dict = {}  # table name -> file path (or None)
+
+    def add_table(self, name: str, columns: List[str], rows: Sequence[Sequence[str]],
+                  key_columns: Sequence[str] = (), source: Optional[str] = None):
+        """
+        Creates (or replaces) a table and bulk-loads the rows.
+
+        Args:
+            name: Table name.
+            columns: Column names; rows shorter than this are padded with ''.
+            rows: Cells as strings.
+            key_columns: Columns to index.
+            source: File the rows came from, for reference.
+        """
+        width = len(columns)
+        rows = [row if len(row) == width else (list(row) + [''] * width)[:width] for row in rows]
+        types = [column_type([row[idx] for row in rows]) for idx in range(width)]
+        converters = [_converter(kind) for kind in types]
+
+        # Convert column by column, then zip back into rows with the row number in front
+        data_columns = [list(range(len(rows)))]
+        for idx, converter in enumerate(converters):
+            values = [row[idx] for row in rows]
+            data_columns.append(list(map(converter, values)) if converter else values)
+
+        table = quote_identifier(name)
+        definitions = [f'{quote_identifier(ROW_COLUMN)} INTEGER'] + [
+            f'{quote_identifier(column)} {kind}' for column, kind in zip(columns, types)
+        ]
+        placeholders = ', '.join('?' * (width + 1))
+        cursor = self.connection.cursor()
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(f'CREATE TABLE {table} ({", ".join(definitions)})')
+        values = zip(*data_columns)
+        if self.backend == 'duckdb':
+            values = list(values)  # DuckDB wants a sequence, not an iterator
+        cursor.executemany(f'INSERT INTO {table} VALUES ({placeholders})', values)
+        for column in [ROW_COLUMN] + [column for column in key_columns if column in columns]:
+            index_name = quote_identifier(f'idx_{name}_{column}')
+            cursor.execute(f'CREATE INDEX {index_name} ON {table} ({quote_identifier(column)})')
+        self.connection.commit()
+        self.tables[name] = source
+
+    def unique_table_name(self, file_path: str, kind: str) -> str:
+        """
+        Table name for a file that doesn't clash with a table of another file:
+        the name from table_name_for, else with the kind added, else also the
+        folder name, else a number.
+        """
+        name = table_name_for(file_path)
+        folder = table_name_for(os.path.basename(os.path.dirname(os.path.abspath(file_path))) or 'root')
+        candidates = [name, f'{name}_{kind}', f'{folder}_{name}_{kind}']
+        candidates += (f'{folder}_{name}_{kind}_{number}' for number in range(2, len(self.tables) + 3))
+        for candidate in candidates:
+            source = self.tables.get(candidate)
+            if candidate not in self.tables or (source and os.path.abspath(source) == os.path.abspath(file_path)):
+                return candidate
+
+    def add_file_table(self, table: Table, name: Optional[str] = None) -> str:
+        """
+        Loads a parsed file (see rosedata.Table). Without a name, the table is
+        named by unique_table_name. Returns the table name used.
+        """
+        name = name or self.unique_table_name(table.path, table.kind)
+        columns = table.columns if table.kind == 'stl' else [f'col{idx}' for idx in range(len(table.columns))]
+        key_column = KEY_COLUMNS.get(table.kind)
+        self.add_table(name, columns, table.rows, [key_column] if key_column else (), table.path)
+        return name
+
+    @profiling.profiled('rosesql.load')
+    def load_paths(self, paths: Sequence[str], kinds: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Loads files, or every data file below directories.
+
+        Returns:
+            List[Tuple[str, str]]: (path, error) for each file that could not be loaded.
+        """
+        errors = []
+        for path in paths:
+            file_paths = iter_data_files(path, kinds) if os.path.isdir(path) else [path]
+            for file_path in file_paths:
+                if file_kind(file_path) is None:
+                    errors.append((file_path, "Unsupported file type"))
+                    continue
+                try:
+                    self.add_file_table(load_table(file_path))
+                except Exception as e:
+                    errors.append((file_path, str(e)))
+        return errors
+
+    @profiling.profiled('rosesql.query')
+    def execute(self, sql: str, params: Sequence = ()) -> Tuple[List[str], Iterator[list]]:
+        """
+        Runs a query.
+
+        Returns:
+            Tuple[List[str], Iterator[list]]: The result column names, and an
+            iterator yielding the rows in batches of FETCH_SIZE so large results
+            can be shown progressively.
+
+        Raises:
+            sqlite3.Error (or the DuckDB equivalent): If the query is invalid.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        columns = [description[0] for description in cursor.description or []]
+
+        def batches():
+            if not columns:
+                return
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                yield batch
+
+        return columns, batches()
+
+    def close(self):
+        self.connection.close()
+
+
+def show_sql_query_dialog(parent, table_name: str, column_help: str, default_query: str,
+                          get_database: Callable[[], RoseDatabase], select_row: Callable[[int], None]):
+    """
+    Opens the Tk window to query the loaded table with SQL. Results are
+    streamed into the window in batches; double-clicking a result calls
+    select_row with its _row number.
+
+    Args:
+        parent: Window the dialog belongs to.
+        table_name: Name of the editor's table in the database.
+        column_help: How the columns are named, shown above the query.
+        default_query: Query the window opens with.
+        get_database: Returns the database holding the table, called for each query.
+        select_row: Called with the row number of a double-clicked result.
+    """
+    import tkinter as tk  # Only the Tk editors open the window
+    from tkinter import ttk
+
+    window = tk.Toplevel(parent)
+    window.title("SQL Query")
+    window.geometry("900x500")
+
+    tk.Label(window, anchor='w', justify=tk.LEFT,
+             text=f"Table: {table_name}. {column_help}").pack(fill=tk.X, padx=5, pady=2)
+    query_text = tk.Text(window, height=4)
+    query_text.insert('1.0', default_query)
+    query_text.pack(fill=tk.X, padx=5, pady=2)
+
+    result_frame = ttk.Frame(window)
+    result_tree = ttk.Treeview(result_frame, show='headings')
+    result_tree.grid(row=0, column=0, sticky='nsew')
+    vsb = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=result_tree.yview)
+    vsb.grid(row=0, column=1, sticky='ns')
+    hsb = ttk.Scrollbar(result_frame, orient=tk.HORIZONTAL, command=result_tree.xview)
+    hsb.grid(row=1, column=0, sticky='ew')
+    result_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+    result_frame.grid_rowconfigure(0, weight=1)
+    result_frame.grid_columnconfigure(0, weight=1)
+
+    result_label = tk.Label(window, text="", anchor='w')
+    state = {'query': 0, 'columns': []}
+
+    def run_query(event=None):
+        state['query'] += 1  # Stops streaming the results of a previous query
+        query_id = state['query']
+        result_tree.delete(*result_tree.get_children())
+        try:
+            columns, batches = get_database().execute(query_text.get('1.0', tk.END).strip())
+        except Exception as e:
+            result_label.config(text=f"Query failed: {e}")
+            return
+        state['columns'] = columns
+        result_tree['columns'] = [f'c{idx}' for idx in range(len(columns))]
+        for idx, column in enumerate(columns):
+            result_tree.heading(f'c{idx}', text=column)
+            result_tree.column(f'c{idx}', width=120, minwidth=60, stretch=False)
+
+        def insert_next_batch(count=0):
+            if state['query'] != query_id or not window.winfo_exists():
+                return
+            batch = next(batches, None)
+            if batch is None:
+                result_label.config(text=f"{count} row(s).")
+                return
+            for row in batch:
+                result_tree.insert('', 'end', values=['' if value is None else value for value in row])
+            count += len(batch)
+            result_label.config(text=f"{count} row(s) so far...")
+            window.after(1, insert_next_batch, count)
+
+        insert_next_batch()
+
+    def on_result_double_click(event):
+        item_id = result_tree.focus()
+        if not item_id or ROW_COLUMN not in state['columns']:
+            return
+        select_row(int(result_tree.item(item_id)['values'][state['columns'].index(ROW_COLUMN)]))
+
+    button_frame = tk.Frame(window)
+    button_frame.pack(fill=tk.X, padx=5)
+    tk.Button(button_frame, text="Run (Ctrl+Enter)", command=run_query).pack(side=tk.LEFT, pady=2)
+    result_label.pack(in_=button_frame, side=tk.LEFT, fill=tk.X, padx=5)
+    result_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    query_text.bind('<Control-Return>', lambda event: (run_query(), 'break')[1])
+    result_tree.bind('<Double-1>', on_result_double_click)
+
+
+def _print_results(columns: List[str], batches: Iterator[list], as_csv: bool):
+    if not columns:
+        return
+    if as_csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+        return
+    print('\t'.join(columns))
+    count = 0
+    for batch in batches:
+        for row in batch:
+            print('\t'.join('' if value is None else str(value).replace('\n', '\\n') for value in row))
+        count += len(batch)
+    print(f"({count} row(s))", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run SQL queries over STB/STL/LTB files.")
+    parser.add_argument('paths', nargs='+', help="Data files, or directories to load every data file from.")
+    parser.add_argument('-e', '--execute', help="Query to run. Without it, queries are read from a prompt.")
+    parser.add_argument('--kind', action='append', choices=['stb', 'stl', 'ltb'], help="Only load this file type.")
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb', 'auto'], default='sqlite')
+    parser.add_argument('--csv', action='store_true', help="Print results as CSV.")
+    args = parser.parse_args(argv)
+
+    try:
+        database = RoseDatabase(args.backend)
+    except ImportError:
+        print("DuckDB is not installed (pip install duckdb).", file=sys.stderr)
+        return 2
+    for file_path, error in database.load_paths(args.paths, args.kind):
+        print(f"Skipped {file_path}: {error}", file=sys.stderr)
+    print(f"Loaded {len(database.tables)} table(s): {', '.join(sorted(database.tables))}", file=sys.stderr)
+    for name, source in sorted(database.tables.items()):
+        if source and name != table_name_for(source):
+            print(f"  {name} is {source} (another file is named {table_name_for(source)})", file=sys.stderr)
+
+    if args.execute:
+        try:
+            _print_results(*database.execute(args.execute), as_csv=args.csv)
+        except Exception as e:
+            print(f"Query failed: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    # Interactive prompt, one query per line
+    while True:
+        try:
+            sql = input('sql> ').strip()
+        except EOFError:
+            print()
+            return 0
+        if sql.lower() in ('exit', 'quit'):
+            return 0
+        if not sql:
+            continue
+        try:
+            _print_results(*database.execute(sql), as_csv=args.csv)
+        except Exception as e:
+            print(f"Query failed: {e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,614 @@
+"""
+Structural validator for STB, STL and LTB files.
+
+The editors' parsers are lenient: a damaged file shows up as a ValueError, as
+cells silently left empty (LTBFile.get_string returns None for a bad offset,
+read_bstr logs and returns '' when a string is cut short) or as garbage text.
+This checks the structure of each file without building the table:
+
+    STB  magic, header counts against the file size, length prefixes of the
+         column/row names and cells, data_offset against where the names end,
+         bytes left over, EUC-KR text
+    STL  string table type, entry/language counts, length prefixes, language
+         and entry offsets in bounds, strings overlapping each other,
+         duplicate string ids, text in UTF-8 or the language's code page
+    LTB  cell table against the file size, cells pointing before the data
+         section or past the end of the file, overlapping cells, text in the
+         detected encoding (UTF-16LE or EUC-KR)
+
+Files are memory-mapped; offset tables are unpacked in one go with struct
+(iter_unpack, or a single unpack call for LTB cell tables) and checked in
+whole-table passes, and text is decoded in one call per file, falling back
+to string by string only to locate a bad one. Directories are checked on a
+process pool.
+
+Usage:
+    python rosevalidate.py DATA_DIR_OR_FILES... [--json] [--report FILE] [--strict] [--workers N]
+
+Exit code: 0 if no errors were found (no warnings either with --strict), 1
+otherwise, 2 if a path doesn't exist. Files of other types are ignored, so
+the staged files of a commit can be passed as they are.
+"""
+import argparse
+import json
+import mmap
+import operator
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import profiling
+from rosedata import file_kind, iter_data_files
+
+# Issues of one kind listed per file, the rest are only counted
+MAX_ISSUES_PER_CHECK = 20
+# Fewer files than this are checked in this process, starting a pool costs more
+POOL_MIN_FILES = 8
+
+STB_MAGICS = (b'STB0', b'STB1')
+STB_HEADER_SIZE = 20
+STB_ENCODING = 'euc-kr'
+
+STL_TYPES = ('NRST01', 'ITST01', 'QEST01')
+# Strings per entry and language, by string table type (text, comment, quest1, quest2)
+STL_STRINGS_PER_ENTRY = {'ITST01': 2, 'QEST01': 4}
+# Language order of the files, as in stleditor.iter_parse_stl
+STL_LANGUAGES = ['Korean', 'English', 'Japanese', 'Chinese_Simplified', 'Chinese_Traditional']
+# Code page tried when a language's text isn't UTF-8
+STL_LANGUAGE_ENCODINGS = {'Korean': 'cp949', 'English': 'cp1252', 'Japanese': 'cp932',
+                          'Chinese_Simplified': 'gbk', 'Chinese_Traditional': 'cp950'}
+MAX_STL_LANGUAGES = 64
+
+LTB_HEADER_SIZE = 8
+LTB_CELL_SIZE = 6  # 4 bytes offset, 2 bytes size
+LTB_ENCODINGS = ('utf-16le', 'euc-kr')
+
+
+class FileReport:
+    """Issues found in one file. Only the first MAX_ISSUES_PER_CHECK of each check are kept."""
+
+    def __init__(self, path: str, kind: Optional[str], size: int):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.issues: List[dict] = []
+        self.counts: Dict[Tuple[str, str], int] = {}  # (severity, check) -> count
+        self.details: dict = {}
+
+    def add(self, severity: str, check: str, message: str, offset: Optional[int] = None, **location):
+        key = (severity, check)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count > MAX_ISSUES_PER_CHECK:
+            return
+        issue = {'severity': severity, 'check': check, 'message': message}
+        if offset is not None:
+            issue['offset'] = offset
+        issue.update(location)
+        self.issues.append(issue)
+
+    def error(self, check: str, message: str, offset: Optional[int] = None, **location):
+        self.add('error', check, message, offset, **location)
+
+    def warning(self, check: str, message: str, offset: Optional[int] = None, **location):
+        self.add('warning', check, message, offset, **location)
+
+    def total(self, severity: str) -> int:
+        return sum(count for (kind, _), count in self.counts.items() if kind == severity)
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'kind': self.kind,
+            'size': self.size,
+            'errors': self.total('error'),
+            'warnings': self.total('warning'),
+            'counts': {f'{severity}:{check}': count for (severity, check), count in self.counts.items()},
+            'details': self.details,
+            'issues': self.issues,
+        }
+
+
+def find_overlaps(starts: Sequence[int], ends: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Pairs (i, j) of byte ranges [start, end) that partially overlap. Identical
+    ranges are a string stored once and used twice, which is fine.
+    """
+    count = len(starts)
+    if count < 2:
+        return []
+    if starts == sorted(starts):
+        order, sorted_starts, sorted_ends = range(count), starts, ends
+    else:
+        order = sorted(range(count), key=lambda idx: (starts[idx], ends[idx]))
+        sorted_starts = [starts[idx] for idx in order]
+        sorted_ends = [ends[idx] for idx in order]
+    # A range overlaps if it starts before the furthest end of the ranges sorted before it
+    reach = list(accumulate(sorted_ends, max))
+    if not any(map(operator.lt, sorted_starts[1:], reach)):
+        return []
+    overlaps = []
+    for k in [k for k in range(1, count) if sorted_starts[k] < reach[k - 1]]:
+        if sorted_starts[k] == sorted_starts[k - 1] and sorted_ends[k] == sorted_ends[k - 1]:
+            continue
+        overlaps.append((order[k - 1], order[k]))
+    return overlaps
+
+
+def find_undecodable(strings: Sequence[bytes], encodings: Sequence[str], separator: bytes = b'\x00') -> List[int]:
+    """
+    Indices of the strings that none of the encodings decode. The strings are
+    first decoded all at once, joined with NULs (one code unit wide, so a cut
+    multibyte character still fails), and one by one only if that fails.
+    """
+    joined = separator.join(strings)
+    for encoding in encodings:
+        try:
+            joined.decode(encoding)
+            return []
+        except UnicodeDecodeError:
+            continue
+    bad = []
+    for idx, data in enumerate(strings):
+        for encoding in encodings:
+            try:
+                data.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            bad.append(idx)
+    return bad
+
+
+def _decode_error(data: bytes, encoding: str) -> str:
+    try:
+        data.decode(encoding)
+    except UnicodeDecodeError as e:
+        if e.reason == 'unexpected end of data':
+            return f"cut off in the middle of a character (bytes {e.object[e.start:].hex(' ')} at {e.start})"
+        return f"bytes {e.object[e.start:e.end].hex(' ')} at {e.start}"
+    return "no error"
+
+
+def validate_stb(data, report: FileReport):
+    size = len(data)
+    if size < STB_HEADER_SIZE:
+        report.error('truncated_header', f"File is {size} bytes, the header alone takes {STB_HEADER_SIZE}")
+        return
+    magic = bytes(data[:4])
+    if magic not in STB_MAGICS:
+        report.error('bad_magic', f"Starts with {magic!r} instead of STB0/STB1", 0)
+        return
+    data_offset, row_count, column_count, row_size = struct.unpack_from('<4I', data, 4)
+    report.details.update(rows=row_count, columns=column_count, data_offset=data_offset)
+    if row_count == 0 or column_count == 0:
+        report.warning('empty_table', f"Row count {row_count}, column count {column_count} "
+                                      "(both include the header row/column)")
+    # Every string takes at least its 2 byte length, so the counts can't ask for more than the file holds
+    minimum = (STB_HEADER_SIZE + 4 * (column_count + 1) + 2 * max(row_count - 1, 0)
+               + 2 * max(row_count - 1, 0) * max(column_count - 1, 0))
+    if minimum > size:
+        report.error('counts_exceed_file', f"{row_count} rows x {column_count} columns need at least "
+                                           f"{minimum} bytes, the file has {size}", 4)
+        return
+
+    name_count = column_count + 1
+    row_names = max(row_count - 1, 0)
+    cells_per_row = max(column_count - 1, 0)
+
+    def locate(idx: int) -> Tuple[str, dict]:
+        """What the idx-th string of the file is, and its row and column."""
+        if idx < name_count:
+            return f"Column name {idx}", {'column': idx}
+        idx -= name_count
+        if idx < row_names:
+            return f"Name of row {idx}", {'row': idx, 'column': 0}
+        row, column = divmod(idx - row_names, cells_per_row)
+        return f"Cell {column + 1} of row {row}", {'row': row, 'column': column + 1}
+
+    unpack_length = struct.Struct('<h').unpack_from
+    starts: List[int] = []
+    lengths: List[int] = []
+
+    def walk(position: int, count: int) -> int:
+        """Records where `count` length-prefixed strings start and how long they are, returns the position after."""
+        # Only walks; signs and bounds are checked on the whole lists afterwards
+        add_start, add_length = starts.append, lengths.append
+        for _ in range(count):
+            if position + 2 > size:
+                break
+            length = unpack_length(data, position)[0]
+            position += 2
+            add_start(position)
+            add_length(length)
+            position += length
+        return position
+
+    def check(position: int, expected: int) -> bool:
+        """Reports the first string walked so far with a negative length or cut short by the end of the file."""
+        if lengths and min(lengths) < 0:
+            idx = next(idx for idx, length in enumerate(lengths) if length < 0)
+            what, location = locate(idx)
+            report.error('negative_length', f"{what} has length {lengths[idx]}", starts[idx] - 2, **location)
+            return False
+        if starts and starts[-1] + lengths[-1] > size:
+            what, location = locate(len(starts) - 1)
+            report.error('truncated', f"{what} runs {starts[-1] + lengths[-1] - size} byte(s) past the end of "
+                                      "the file", starts[-1] - 2, **location)
+            return False
+        if len(starts) < expected:
+            what, location = locate(len(starts))
+            report.error('truncated', f"File ends inside the length of {what[0].lower()}{what[1:]}", position,
+                         **location)
+            return False
+        return True
+
+    position = walk(STB_HEADER_SIZE + 2 * name_count, name_count + row_names)  # After the header and column sizes
+    if not check(position, name_count + row_names):
+        return
+
+    if data_offset < position:
+        report.error('data_offset', f"data_offset {data_offset} points inside the row names, which end at "
+                                    f"{position} (the editor ignores it and reads on)", 4)
+    elif data_offset > position:
+        report.warning('data_offset', f"{data_offset - position} byte(s) between the row names and "
+                                      f"data_offset {data_offset} are skipped", position)
+        position = data_offset
+    if data_offset > size:
+        report.error('data_offset', f"data_offset {data_offset} is past the end of the file ({size})", 4)
+        return
+
+    position = walk(position, row_names * cells_per_row)
+    if not check(position, name_count + row_names + row_names * cells_per_row):
+        return
+    if position < size:
+        report.warning('trailing_bytes', f"{size - position} byte(s) after the last cell", position)
+
+    texts = [data[start:start + length] for start, length in zip(starts, lengths)]
+    for idx in find_undecodable(texts, (STB_ENCODING,)):
+        what, location = locate(idx)
+        report.error('encoding', f"{what} is not valid {STB_ENCODING}: {_decode_error(texts[idx], STB_ENCODING)}",
+                     starts[idx] - 2, **location)
+    report.details['strings'] = len(starts)
+
+
+def _read_bstr(data, position: int, size: int) -> Tuple[Optional[int], int]:
+    """
+    Start and length of the length-prefixed string at `position` (see
+    stleditor.read_bstr), or (None, needed length) if the file ends first.
+    """
+    if position >= size:
+        return None, 1
+    length = data[position]
+    start = position + 1
+    if length > 127:
+        if start >= size:
+            return None, 2
+        length = (length - 128) + data[start] * 128
+        start += 1
+    if start + length > size:
+        return None, start + length - position
+    return start, length
+
+
+def validate_stl(data, report: FileReport):
+    size = len(data)
+    start, length = _read_bstr(data, 0, size)
+    if start is None:
+        report.error('truncated_header', "File ends inside the string table type", 0)
+        return
+    stl_type = bytes(data[start:start + length]).decode('latin-1')
+    report.details['type'] = stl_type
+    if stl_type not in STL_TYPES:
+        report.warning('unknown_type', f"Unknown string table type {stl_type!r} (expected {', '.join(STL_TYPES)})", 0)
+    position = start + length
+    if position + 4 > size:
+        report.error('truncated_header', "File ends inside the entry count", position)
+        return
+    entry_count = struct.unpack_from('<I', data, position)[0]
+    report.details['entries'] = entry_count
+    position += 4
+    # An entry takes at least a 1 byte string id length and a 4 byte id
+    if position + 5 * entry_count > size:
+        report.error('counts_exceed_file', f"{entry_count} entries need at least {5 * entry_count} bytes, "
+                                           f"{size - position} are left", position - 4)
+        return
+
+    string_ids = {}
+    for entry in range(entry_count):
+        start, length = _read_bstr(data, position, size)
+        if start is None or start + length + 4 > size:
+            report.error('truncated', f"File ends inside entry {entry}", position, row=entry)
+            return
+        string_id = bytes(data[start:start + length])
+        if string_id in string_ids:
+            report.warning('duplicate_string_id', f"String id {string_id.decode('latin-1')!r} of entry {entry} "
+                                                  f"is also used by entry {string_ids[string_id]}", position, row=entry)
+        else:
+            string_ids[string_id] = entry
+        position = start + length + 4  # The entry id after it can be anything
+
+    if position + 4 > size:
+        report.error('truncated_header', "File ends inside the language count", position)
+        return
+    language_count = struct.unpack_from('<I', data, position)[0]
+    report.details['languages'] = language_count
+    position += 4
+    if language_count > MAX_STL_LANGUAGES or position + 4 * language_count > size:
+        report.error('counts_exceed_file', f"Language count {language_count} doesn't fit the file", position - 4)
+        return
+    language_offsets = [offset for offset, in struct.iter_unpack('<I', data[position:position + 4 * language_count])]
+    names = STL_LANGUAGES + [f'Language_{idx}' for idx in range(len(STL_LANGUAGES), language_count)]
+
+    strings_per_entry = STL_STRINGS_PER_ENTRY.get(stl_type, 1)
+    starts: List[int] = []
+    ends: List[int] = []
+    owners: List[Tuple[int, int]] = []  # (language, entry) of each string range
+    for language, table_offset in enumerate(language_offsets):
+        name = names[language]
+        if table_offset + 4 * entry_count > size:
+            report.error('offset_out_of_bounds', f"Offsets of the {name} strings run past the end of the file",
+                         table_offset, language=name)
+            continue
+        entry_offsets = [offset for offset, in
+                         struct.iter_unpack('<I', data[table_offset:table_offset + 4 * entry_count])]
+        out_of_bounds = [entry for entry, offset in enumerate(entry_offsets) if offset >= size]
+        for entry in out_of_bounds:
+            report.error('offset_out_of_bounds', f"{name} text of entry {entry} is at {entry_offsets[entry]}, "
+                                                 f"past the end of the file ({size})",
+                         table_offset + 4 * entry, row=entry, language=name)
+        texts = []
+        text_entries = []
+        skip = set(out_of_bounds)
+        for entry, offset in enumerate(entry_offsets):
+            if entry in skip:
+                continue
+            position = offset
+            for _ in range(strings_per_entry):
+                start, length = _read_bstr(data, position, size)
+                if start is None:
+                    report.error('truncated', f"{name} text of entry {entry} runs past the end of the file",
+                                 position, row=entry, language=name)
+                    break
+                texts.append(bytes(data[start:start + length]))
+                text_entries.append((entry, position))
+                position = start + length
+            starts.append(offset)
+            ends.append(position)
+            owners.append((language, entry))
+        encodings = ('utf-8', STL_LANGUAGE_ENCODINGS[name]) if name in STL_LANGUAGE_ENCODINGS else ('utf-8',)
+        for idx in find_undecodable(texts, encodings):
+            entry, position = text_entries[idx]
+            report.warning('encoding', f"{name} text of entry {entry} is neither {' nor '.join(encodings)}: "
+                                       f"{_decode_error(texts[idx], 'utf-8')}", position, row=entry, language=name)
+
+    for first, second in find_overlaps(starts, ends):
+        (language_a, entry_a), (language_b, entry_b) = owners[first], owners[second]
+        report.error('overlap', f"{names[language_b]} text of entry {entry_b} overlaps "
+                                f"{names[language_a]} text of entry {entry_a}", starts[second], row=entry_b,
+                     language=names[language_b])
+
+
+def validate_ltb(data, report: FileReport, encoding: Optional[str] = None):
+    size = len(data)
+    if size < LTB_HEADER_SIZE:
+        report.error('truncated_header', f"File is {size} bytes, the header alone takes {LTB_HEADER_SIZE}")
+        return
+    columns, rows = struct.unpack_from('<II', data, 0)
+    cell_count = rows * columns
+    data_offset = LTB_HEADER_SIZE + LTB_CELL_SIZE * cell_count
+    report.details.update(rows=rows, columns=columns, data_offset=data_offset)
+    if data_offset > size:
+        report.error('counts_exceed_file', f"{rows} rows x {columns} columns need a {data_offset - LTB_HEADER_SIZE} "
+                                           f"byte cell table, the file has {size} bytes", 0)
+        return
+    if rows and not columns:
+        report.warning('empty_table', f"{rows} rows but no columns", 0)
+    if not cell_count:
+        return
+
+    # One unpack call for the whole cell table (as LTBFile.write packs it), then split by stride
+    cells = struct.unpack('<' + 'IH' * cell_count, data[LTB_HEADER_SIZE:data_offset])
+    offsets, sizes = list(cells[0::2]), list(cells[1::2])
+    # Empty cells have no text to check; files written by the editor have none (the terminator counts)
+    if 0 in sizes:
+        used = [idx for idx, length in enumerate(sizes) if length]
+        starts = [offsets[idx] for idx in used]
+        lengths = [sizes[idx] for idx in used]
+    else:
+        used, starts, lengths = range(cell_count), offsets, sizes
+    ends = [start + 2 * length for start, length in zip(starts, lengths)]
+    if encoding is None:
+        # As rosedata.detect_ltb_encoding: UTF-16LE unless that reads past the end of the file
+        encoding = 'utf-16le' if max(ends, default=0) <= size else 'euc-kr'
+    unit = 2 if encoding == 'utf-16le' else 1
+    if unit == 1:
+        ends = [start + length for start, length in zip(starts, lengths)]
+    report.details.update(encoding=encoding, cells=cell_count, text_cells=len(used))
+
+    def location(position: int) -> dict:
+        idx = used[position]
+        return {'row': idx // columns, 'column': idx % columns}
+
+    def cell_offset(position: int) -> int:
+        return LTB_HEADER_SIZE + LTB_CELL_SIZE * used[position]
+
+    bad = set()
+    if min(starts, default=data_offset) < data_offset:
+        for position in [position for position, start in enumerate(starts) if start < data_offset]:
+            report.error('offset_before_data', f"Cell text at {starts[position]} is before the data section "
+                                               f"({data_offset}), the editor shows it empty",
+                         cell_offset(position), **location(position))
+            bad.add(position)
+    if max(ends, default=0) > size:
+        for position in [position for position, end in enumerate(ends) if end > size]:
+            report.error('offset_out_of_bounds', f"Cell text {starts[position]}..{ends[position]} runs past the "
+                                                 f"end of the file ({size})", cell_offset(position),
+                         **location(position))
+            bad.add(position)
+    if bad:
+        valid = [position for position in range(len(starts)) if position not in bad]
+        starts = [starts[position] for position in valid]
+        ends = [ends[position] for position in valid]
+    else:
+        valid = range(len(starts))
+
+    for first, second in find_overlaps(starts, ends):
+        other = location(valid[first])
+        report.error('overlap', f"Cell text at {starts[second]} overlaps the text of row {other['row']}, "
+                                f"column {other['column']}", starts[second], **location(valid[second]))
+
+    if unit == 2 and any(map((1).__and__, starts)):  # data_offset is always even
+        for position in [position for position, start in enumerate(starts) if start & 1]:
+            report.warning('misaligned', f"UTF-16 text at odd offset {starts[position]}", starts[position],
+                           **location(valid[position]))
+
+    # Cells written one after the other (as the editor does): decode the whole section at once
+    if starts and starts[0] == data_offset and ends[:-1] == starts[1:] and not (ends[-1] - data_offset) % unit:
+        try:
+            data[data_offset:ends[-1]].decode(encoding)
+            return
+        except UnicodeDecodeError:
+            pass
+    texts = [data[start:end] for start, end in zip(starts, ends)]
+    for position in find_undecodable(texts, (encoding,), separator=b'\x00' * unit):
+        report.error('encoding', f"Not valid {encoding}: {_decode_error(texts[position], encoding)}",
+                     starts[position], **location(valid[position]))
+
+
+VALIDATORS = {'stb': validate_stb, 'stl': validate_stl, 'ltb': validate_ltb}
+
+
+def validate_file(file_path: str, ltb_encoding: Optional[str] = None) -> dict:
+    """Checks one file and returns its report as a dict (see FileReport.to_dict). Runs in worker processes."""
+    kind = file_kind(file_path)
+    try:
+        size = os.path.getsize(file_path)
+    except OSError as e:
+        report = FileReport(file_path, kind, 0)
+        report.error('unreadable', str(e))
+        return report.to_dict()
+    report = FileReport(file_path, kind, size)
+    if kind is None:
+        report.error('unsupported', "Not an STB, STL or LTB file")
+        return report.to_dict()
+    if size == 0:
+        report.error('empty_file', "File is empty")
+        return report.to_dict()
+    try:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if kind == 'ltb':
+                validate_ltb(data, report, ltb_encoding)
+            else:
+                VALIDATORS[kind](data, report)
+    except (OSError, ValueError) as e:
+        report.error('unreadable', str(e))
+    except Exception as e:
+        report.error('crash', f"Validator failed: {type(e).__name__}: {e}")
+    return report.to_dict()
+
+
+def collect_files(paths: Sequence[str], kinds: Optional[List[str]] = None) -> List[str]:
+    """Data files among `paths`, and below those that are directories. Other files are left out."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(iter_data_files(path, kinds))
+        elif file_kind(path) and (not kinds or file_kind(path) in kinds):
+            files.append(path)
+    return files
+
+
+@profiling.profiled('rosevalidate.run')
+def validate_files(file_paths: Sequence[str], workers: Optional[int] = None,
+                   ltb_encoding: Optional[str] = None) -> List[dict]:
+    """Reports of every file, in order, checked on a process pool when there are enough of them."""
+    if workers == 1 or len(file_paths) < POOL_MIN_FILES:
+        reports = [validate_file(file_path, ltb_encoding) for file_path in file_paths]
+    else:
+        workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            reports = list(executor.map(validate_file, file_paths, [ltb_encoding] * len(file_paths),
+                                        chunksize=chunk_size))
+    profiling.count('rosevalidate.files', len(reports))
+    profiling.count('rosevalidate.bytes', sum(report['size'] for report in reports))
+    return reports
+
+
+def summarize(reports: List[dict], seconds: float) -> dict:
+    return {
+        'files': len(reports),
+        'files_with_errors': sum(1 for report in reports if report['errors']),
+        'files_with_warnings': sum(1 for report in reports if report['warnings']),
+        'errors': sum(report['errors'] for report in reports),
+        'warnings': sum(report['warnings'] for report in reports),
+        'bytes': sum(report['size'] for report in reports),
+        'seconds': round(seconds, 3),
+    }
+
+
+def _format_issue(path: str, issue: dict) -> str:
+    where = [f"{key} {issue[key]}" for key in ('row', 'column', 'language') if key in issue]
+    if 'offset' in issue:
+        where.append(f"offset {issue['offset']}")
+    suffix = f" ({', '.join(where)})" if where else ''
+    return f"{path}: {issue['severity']} [{issue['check']}] {issue['message']}{suffix}"
+
+
+def _print_report(reports: List[dict], show_warnings: bool):
+    for report in reports:
+        for issue in report['issues']:
+            if issue['severity'] == 'error' or show_warnings:
+                print(_format_issue(report['path'], issue))
+        hidden = {key: count - MAX_ISSUES_PER_CHECK for key, count in report['counts'].items()
+                  if count > MAX_ISSUES_PER_CHECK and (show_warnings or key.startswith('error:'))}
+        for key, count in hidden.items():
+            print(f"{report['path']}: ... {count} more {key.replace(':', ' [', 1)}]")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the structure of STB/STL/LTB files.")
+    parser.add_argument('paths', nargs='+', help="Data files, or directories to check every data file in.")
+    parser.add_argument('--kind', action='append', choices=['stb', 'stl', 'ltb'], help="Only check this file type.")
+    parser.add_argument('--ltb-encoding', choices=LTB_ENCODINGS, help="Encoding of LTB files (default: detected).")
+    parser.add_argument('--workers', type=int, help="Number of checker processes (default: CPU count).")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+    parser.add_argument('--report', help="Also write the JSON report to this file.")
+    parser.add_argument('--strict', action='store_true', help="Fail on warnings too.")
+    parser.add_argument('--quiet', '-q', action='store_true', help="Only print errors, not warnings.")
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        for path in missing:
+            print(f"No such file or directory: {path}", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    reports = validate_files(collect_files(args.paths, args.kind), args.workers, args.ltb_encoding)
+    summary = summarize(reports, time.perf_counter() - started)
+    result = {'summary': summary, 'files': reports}
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+    if args.json:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        _print_report(reports, show_warnings=not args.quiet)
+    print(f"Checked {summary['files']} file(s) in {summary['seconds']:.2f} s: {summary['errors']} error(s) in "
+          f"{summary['files_with_errors']} file(s), {summary['warnings']} warning(s).", file=sys.stderr)
+
+    failed = summary['errors'] or (args.strict and summary['warnings'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
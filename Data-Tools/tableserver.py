@@ -0,0 +1,575 @@
+"""
+Local HTTP server exposing parsed STB, STL and LTB files as JSON (or Arrow).
+
+Tools that need the game data (wiki generators, drop calculators...) can ask
+this server for rows instead of parsing the files themselves. Parsed tables
+are kept in memory, least recently used first out once the cache is full,
+and re-parsed when a file's size or modification time changes.
+
+Every table response carries an ETag made from the file's size and
+modification time, so a client sending it back in If-None-Match gets a
+304 Not Modified without the file even being parsed.
+
+Endpoints (paths of tables are relative to the data directory):
+
+    GET /                                   server and cache statistics
+    GET /files[?kind=stb]                   data files below the directory
+    GET /tables/PATH                        columns and row count of a file
+    GET /tables/PATH/rows                   rows, paginated with ?offset=&limit=
+        [&columns=0,3,Name]                 ...only these columns (names or indices)
+    GET /tables/PATH/columns/COLUMN         values of one column, paginated
+    GET /tables/PATH/lookup?column=C&value=V
+                                            rows whose column C equals V (value may repeat)
+
+Rows, column and lookup responses are JSON unless ?format=arrow is given or
+the Accept header asks for application/vnd.apache.arrow.stream, in which case
+they are an Arrow IPC stream (needs pyarrow) with a _row column holding the
+row numbers.
+
+Usage:
+    python tableserver.py DATA_DIR [--host 127.0.0.1] [--port 8765] [--cache-mb 256]
+    curl "http://127.0.0.1:8765/tables/STB/LIST_FACEITEM.STB/rows?limit=10"
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import profiling
+from rosedata import Table, file_kind, iter_data_files, load_table
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_PAGE_ROWS = 500
+MAX_PAGE_ROWS = 10000
+KEEP_ALIVE_SECONDS = 15
+MAX_HEADER_LINES = 100
+ROW_COLUMN = '_row'
+JSON_MEDIA_TYPE = 'application/json; charset=utf-8'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+# Rough memory cost of a parsed cell besides its text: str object and list slot
+CELL_OVERHEAD = 57
+ROW_OVERHEAD = 64
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def file_signature(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def estimate_size(table: Table) -> int:
+    """Approximate memory taken by a parsed table, in bytes."""
+    cells = sum(map(len, table.rows))
+    text = sum(len(cell) for row in table.rows for cell in row)
+    return text + cells * CELL_OVERHEAD + len(table.rows) * ROW_OVERHEAD
+
+
+class CachedTable:
+    __slots__ = ('table', 'signature', 'size', 'indexes')
+
+    def __init__(self, table: Table, signature: Tuple[int, int]):
+        self.table = table
+        self.signature = signature
+        self.size = estimate_size(table)
+        self.indexes: Dict[int, Dict[str, List[int]]] = {}  # column -> value -> row numbers
+
+    def index(self, column: int) -> Dict[str, List[int]]:
+        """Value -> row numbers of one column, built on first use."""
+        index = self.indexes.get(column)
+        if index is None:
+            index = {}
+            for row_number, row in enumerate(self.table.rows):
+                index.setdefault(row[column], []).append(row_number)
+            self.indexes[column] = index
+        return index
+
+
+class TableCache:
+    """Parsed tables by relative path, trimmed least recently used first."""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[str, CachedTable]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, signature: Tuple[int, int]) -> Optional[CachedTable]:
+        entry = self.entries.get(key)
+        if entry is None or entry.signature != signature:
+            self.misses += 1
+            profiling.count('tableserver.cache_misses')
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        profiling.count('tableserver.cache_hits')
+        return entry
+
+    def put(self, key: str, entry: CachedTable):
+        self.discard(key)
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+        # Always keep the newest table, even if it alone is over the limit
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+            profiling.count('tableserver.evictions')
+
+    def discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def _body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _json_body(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _int_parameter(query: Dict[str, List[str]], name: str, default: int, maximum: Optional[int] = None) -> int:
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a number")
+    if value < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} can't be negative")
+    return min(value, maximum) if maximum is not None else value
+
+
+def resolve_column(table: Table, name: str) -> int:
+    """Column index for a column name, or for an index given as text."""
+    if name in table.columns:
+        return table.columns.index(name)
+    if name.isdigit() and int(name) < len(table.columns):
+        return int(name)
+    lowered = name.lower()
+    for idx, column in enumerate(table.columns):
+        if column.lower() == lowered:
+            return idx
+    raise HTTPError(HTTPStatus.NOT_FOUND, f"No column {name!r} in {os.path.basename(table.path)}")
+
+
+def _selected_columns(table: Table, query: Dict[str, List[str]]) -> List[int]:
+    names = [name for value in query.get('columns', []) for name in value.split(',') if name]
+    if not names:
+        return list(range(len(table.columns)))
+    return [resolve_column(table, name) for name in names]
+
+
+def _page(total: int, offset: int, limit: int) -> dict:
+    end = min(total, offset + limit)
+    return {'total': total, 'offset': offset, 'limit': limit, 'next_offset': end if end < total else None}
+
+
+def _arrow_body(names: List[str], columns: List[List[str]], row_numbers: List[int], metadata: dict) -> bytes:
+    arrays = [pyarrow.array(row_numbers, type=pyarrow.int64())]
+    arrays += [pyarrow.array(values, type=pyarrow.string()) for values in columns]
+    schema_metadata = {key: json.dumps(value) for key, value in metadata.items()}
+    table = pyarrow.Table.from_arrays(arrays, names=[ROW_COLUMN] + names, metadata=schema_metadata)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class TableServer:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            root: Data directory whose files are served.
+            max_bytes: Approximate memory the parsed tables may take.
+        """
+        self.root = os.path.realpath(root)
+        self.cache = TableCache(max_bytes)
+        self.requests = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._loading: Dict[Tuple[str, Tuple[int, int]], asyncio.Future] = {}
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> int:
+        """Starts listening. Returns the port, useful with port 0 (any free port)."""
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stops listening and drops open connections (idle keep-alive ones would otherwise linger)."""
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self._connections.values()):
+            writer.close()  # An idle connection then reads end of file and its handler returns
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    def file_path(self, rel_path: str) -> str:
+        """
+        Absolute path of a data file below the root.
+
+        Raises:
+            HTTPError: If the path leaves the root or isn't a data file.
+        """
+        file_path = os.path.realpath(os.path.join(self.root, rel_path))
+        if os.path.commonpath([self.root, file_path]) != self.root or not os.path.isfile(file_path):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No data file {rel_path}")
+        return file_path
+
+    async def get_table(self, rel_path: str, signature: Tuple[int, int]) -> CachedTable:
+        """The parsed table, from the cache or parsed on a worker thread (once for concurrent requests)."""
+        entry = self.cache.get(rel_path, signature)
+        if entry is not None:
+            return entry
+        key = (rel_path, signature)
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self._load, rel_path, signature)
+            self._loading[key] = future
+            future.add_done_callback(lambda done: self._loaded(key, done))
+        # Shielded so a client hanging up doesn't cancel the parse for the others waiting on it
+        return await asyncio.shield(future)
+
+    def _loaded(self, key: Tuple[str, Tuple[int, int]], future: asyncio.Future):
+        del self._loading[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key[0], future.result())
+
+    def _load(self, rel_path: str, signature: Tuple[int, int]) -> CachedTable:
+        file_path = os.path.join(self.root, rel_path)
+        with profiling.span('tableserver.load', file=rel_path, bytes=signature[0]) as span:
+            try:
+                table = load_table(file_path)
+            except Exception as e:
+                raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, f"Cannot parse {rel_path}: {e}")
+            span.set('rows', len(table.rows))
+        return CachedTable(table, signature)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)  # Nothing takes a body, skip it
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+                    await self._write_response(writer, 'GET', HTTPStatus.BAD_REQUEST, {},
+                                               _json_body({'error': "Malformed request line"}), False)
+                    break
+                method, target, version = parts
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                status, response_headers, body = await self._respond(method, target, headers)
+                await self._write_response(writer, method, status, response_headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, method: str, status: HTTPStatus, headers: dict,
+                              body: bytes, keep_alive: bool):
+        if status != HTTPStatus.NOT_MODIFIED:
+            headers.setdefault('Content-Type', JSON_MEDIA_TYPE)
+            headers['Content-Length'] = str(len(body))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        head = [f'HTTP/1.1 {status.value} {status.phrase}']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD' and status != HTTPStatus.NOT_MODIFIED:
+            writer.write(body)
+        await writer.drain()
+
+    async def _respond(self, method: str, target: str, headers: dict) -> Tuple[HTTPStatus, dict, bytes]:
+        self.requests += 1
+        profiling.count('tableserver.requests')
+        if method not in ('GET', 'HEAD'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'}, _json_body({'error': "Only GET is supported"})
+        try:
+            with profiling.span('tableserver.request', target=target):
+                return await self._route(target, headers)
+        except HTTPError as e:
+            return e.status, {}, _json_body({'error': e.message})
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {}, _json_body({'error': f"{type(e).__name__}: {e}"})
+
+    async def _route(self, target: str, headers: dict) -> Tuple[HTTPStatus, dict, bytes]:
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        segments = [unquote(segment) for segment in url.path.split('/') if segment]
+
+        if not segments:
+            return self._conditional(headers, None, _json_body(self.statistics()), cache=False)
+        if segments == ['files']:
+            kinds = query.get('kind')
+            files = await asyncio.get_running_loop().run_in_executor(None, self.list_files, kinds)
+            return self._conditional(headers, None, _json_body({'files': files}))
+        if segments[0] != 'tables':
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path {url.path}")
+
+        # The table path ends at the first segment with a data file extension
+        for end, segment in enumerate(segments[1:], start=2):
+            if file_kind(segment):
+                break
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No data file in the path")
+        rel_path = os.path.join(*segments[1:end])
+        action = segments[end:]
+        file_path = self.file_path(rel_path)
+        rel_path = os.path.relpath(file_path, self.root)
+        signature = file_signature(file_path)
+
+        format_name = self._response_format(query, headers) if action else 'json'
+        etag = f'"{signature[0]:x}-{signature[1]:x}-{format_name}"'
+        if _etag_matches(headers.get('if-none-match'), etag):
+            profiling.count('tableserver.not_modified')
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}, b''
+
+        if action == ['rows']:
+            render = functools.partial(self.rows, query=query, format_name=format_name)
+        elif len(action) == 2 and action[0] == 'columns':
+            render = functools.partial(self.column, name=action[1], query=query, format_name=format_name)
+        elif action == ['lookup']:
+            render = functools.partial(self.lookup, query=query, format_name=format_name)
+        elif not action:
+            render = self.describe
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown table endpoint {'/'.join(action)}")
+        entry = await self.get_table(rel_path, signature)
+        # Slicing and encoding a large page takes a while, keep it off the event loop
+        body = await asyncio.get_running_loop().run_in_executor(None, render, rel_path, entry)
+        content_type = ARROW_MEDIA_TYPE if format_name == 'arrow' else JSON_MEDIA_TYPE
+        return HTTPStatus.OK, {'Content-Type': content_type, 'ETag': etag, 'Cache-Control': 'no-cache',
+                               'Vary': 'Accept'}, body
+
+    @staticmethod
+    def _response_format(query: Dict[str, List[str]], headers: dict) -> str:
+        format_name = (query.get('format') or [''])[-1].lower()
+        if not format_name:
+            format_name = 'arrow' if ARROW_MEDIA_TYPE in headers.get('accept', '') else 'json'
+        if format_name not in ('json', 'arrow'):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown format {format_name!r}")
+        if format_name == 'arrow' and pyarrow is None:
+            raise HTTPError(HTTPStatus.NOT_ACCEPTABLE, "Arrow output needs pyarrow (pip install pyarrow)")
+        return format_name
+
+    @staticmethod
+    def _conditional(headers: dict, etag: Optional[str], body: bytes, cache: bool = True):
+        if not cache:
+            return HTTPStatus.OK, {'Cache-Control': 'no-store'}, body
+        etag = etag or _body_etag(body)
+        if _etag_matches(headers.get('if-none-match'), etag):
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, b''
+        return HTTPStatus.OK, {'ETag': etag, 'Cache-Control': 'no-cache'}, body
+
+    def statistics(self) -> dict:
+        return {
+            'root': self.root,
+            'requests': self.requests,
+            'cached_tables': list(self.cache.entries),
+            'cache_bytes': self.cache.total_bytes,
+            'cache_max_bytes': self.cache.max_bytes,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'arrow': pyarrow is not None,
+        }
+
+    def list_files(self, kinds: Optional[List[str]] = None) -> List[dict]:
+        files = []
+        for file_path in iter_data_files(self.root, kinds):
+            try:
+                size, mtime_ns = file_signature(file_path)
+            except OSError:
+                continue
+            files.append({'path': os.path.relpath(file_path, self.root).replace(os.sep, '/'),
+                          'kind': file_kind(file_path), 'size': size, 'modified': mtime_ns / 1e9})
+        return files
+
+    @staticmethod
+    def describe(rel_path: str, entry: CachedTable) -> bytes:
+        return _json_body({'file': rel_path.replace(os.sep, '/'), 'kind': entry.table.kind, 'columns': entry.table.columns,
+                'row_count': len(entry.table.rows), 'size': entry.signature[0],
+                'modified': entry.signature[1] / 1e9})
+
+    @staticmethod
+    def _render(rel_path: str, table: Table, column_indices: List[int], row_numbers: List[int],
+                metadata: dict, format_name: str) -> bytes:
+        names = [table.columns[idx] for idx in column_indices]
+        rows = table.rows
+        if format_name == 'arrow':
+            columns = [[rows[row_number][idx] for row_number in row_numbers] for idx in column_indices]
+            return _arrow_body(names, columns, row_numbers, metadata)
+        data = {'file': rel_path.replace(os.sep, '/'), 'columns': names}
+        data.update(metadata)
+        data['row_numbers'] = row_numbers
+        data['rows'] = [[rows[row_number][idx] for idx in column_indices] for row_number in row_numbers]
+        return _json_body(data)
+
+    def rows(self, rel_path: str, entry: CachedTable, query: Dict[str, List[str]], format_name: str) -> bytes:
+        table = entry.table
+        offset = _int_parameter(query, 'offset', 0)
+        limit = _int_parameter(query, 'limit', DEFAULT_PAGE_ROWS, MAX_PAGE_ROWS)
+        column_indices = _selected_columns(table, query)
+        page = _page(len(table.rows), offset, limit)
+        row_numbers = list(range(min(offset, len(table.rows)), min(offset + limit, len(table.rows))))
+        return self._render(rel_path, table, column_indices, row_numbers, page, format_name)
+
+    def column(self, rel_path: str, entry: CachedTable, name: str, query: Dict[str, List[str]],
+               format_name: str) -> bytes:
+        table = entry.table
+        idx = resolve_column(table, name)
+        offset = _int_parameter(query, 'offset', 0)
+        limit = _int_parameter(query, 'limit', MAX_PAGE_ROWS, MAX_PAGE_ROWS)
+        page = _page(len(table.rows), offset, limit)
+        values = [row[idx] for row in table.rows[offset:offset + limit]]
+        if format_name == 'arrow':
+            row_numbers = list(range(offset, offset + len(values)))
+            return _arrow_body([table.columns[idx]], [values], row_numbers, page)
+        data = {'file': rel_path.replace(os.sep, '/'), 'column': table.columns[idx]}
+        data.update(page)
+        data['values'] = values
+        return _json_body(data)
+
+    def lookup(self, rel_path: str, entry: CachedTable, query: Dict[str, List[str]], format_name: str) -> bytes:
+        table = entry.table
+        if not query.get('column') or 'value' not in query:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "lookup needs column= and value=")
+        idx = resolve_column(table, query['column'][-1])
+        offset = _int_parameter(query, 'offset', 0)
+        limit = _int_parameter(query, 'limit', DEFAULT_PAGE_ROWS, MAX_PAGE_ROWS)
+        index = entry.index(idx)
+        matches = sorted(row_number for value in query['value'] for row_number in index.get(value, ()))
+        page = _page(len(matches), offset, limit)
+        page['column'] = table.columns[idx]
+        return self._render(rel_path, table, _selected_columns(table, query), matches[offset:offset + limit],
+                            page, format_name)
+
+
+def start_in_thread(root: str, host: str = DEFAULT_HOST, port: int = 0,
+                    max_bytes: int = DEFAULT_CACHE_BYTES) -> Tuple[TableServer, int, Callable[[], None]]:
+    """
+    Runs a server on a background thread, e.g. for a tool or test talking to
+    it from synchronous code.
+
+    Returns:
+        Tuple[TableServer, int, Callable[[], None]]: The server, the port it listens on
+        and a function stopping it.
+    """
+    server = TableServer(root, max_bytes)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    result = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            result['port'] = loop.run_until_complete(server.start(host, port))
+        except Exception as e:
+            result['error'] = e
+            return
+        finally:
+            started.set()
+        loop.run_forever()
+        loop.run_until_complete(server.close())
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    if 'error' in result:
+        raise result['error']
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return server, result['port'], stop
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve parsed STB/STL/LTB files over HTTP as JSON or Arrow.")
+    parser.add_argument('directory', help="Data directory to serve, e.g. the client's 3DDATA folder.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST}).")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT}).")
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="Memory for parsed tables, in MB (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"Not a directory: {args.directory}", file=sys.stderr)
+        return 2
+    server = TableServer(args.directory, args.cache_mb * 1024 * 1024)
+
+    async def serve():
+        port = await server.start(args.host, args.port)
+        print(f"Serving {server.root} on http://{args.host}:{port}/", file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except OSError as e:
+        print(f"Cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
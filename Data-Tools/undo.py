@@ -0,0 +1,242 @@
+"""
+Undo/redo with compact cell deltas and an append-only crash-recovery journal.
+
+Every edit is stored as a `(row, column, old, new)` delta. Edits made inside
+`batch()` (CSV import, find/replace, AI generation...) form a single undo
+step. A delta whose column is None adds or removes a whole row: `old` is None
+for an appended row, `new` is None for a removed one.
+
+When a journal path is given, every step, undo and redo is appended to a
+JSON Lines file as it happens. Undo and redo records carry the deltas of
+their step, since the step may have been made before the last save. If the
+editor crashes, `replay_journal` re-applies the unsaved edits on top of the
+freshly loaded file. The journal is deleted on save, and continues next to
+the file that was saved.
+"""
+import contextlib
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Delta = Tuple[Any, Any, Any, Any]  # (row, column, old, new)
+
+DEFAULT_MAX_DELTAS = 200000
+JOURNAL_VERSION = 1
+
+
+class UndoStep:
+    def __init__(self, label: str, deltas: List[Delta]):
+        self.label = label
+        self.deltas = deltas
+
+
+class UndoStack:
+    def __init__(self, apply: Callable[[Any, Any, Any], None], max_deltas: int = DEFAULT_MAX_DELTAS,
+                 journal_path: Optional[str] = None, source_path: Optional[str] = None):
+        """
+        Args:
+            apply: Called as apply(row, column, value) to write a value back
+                when undoing or redoing (value is the old or new side of a delta).
+            max_deltas: Oldest steps are forgotten once more deltas than this are kept.
+            journal_path: Append-only journal file, or None to keep history in memory only.
+            source_path: The data file being edited, recorded in the journal header
+                so a journal is never replayed onto a different version of the file.
+        """
+        self.apply = apply
+        self.max_deltas = max_deltas
+        self.journal_path = journal_path
+        self.source_path = source_path
+        self.undo_steps: Deque[UndoStep] = deque()
+        self.redo_steps: List[UndoStep] = []
+        self.delta_count = 0
+        self._batch: Optional[UndoStep] = None
+        self._batch_depth = 0
+        self._journal = None
+        self._replaying = False
+
+    # Recording
+
+    def record(self, row, column, old, new):
+        """Records one edit that has already been applied."""
+        if old == new and column is not None:
+            return
+        delta = (row, column, old, new)
+        if self._batch is not None:
+            self._batch.deltas.append(delta)
+        else:
+            self._push(UndoStep('Edit', [delta]))
+
+    @contextlib.contextmanager
+    def batch(self, label: str):
+        """Groups every edit recorded inside the block into one undo step."""
+        if self._batch_depth == 0:
+            self._batch = UndoStep(label, [])
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                step, self._batch = self._batch, None
+                if step.deltas:
+                    self._push(step)
+
+    def _push(self, step: UndoStep):
+        self.undo_steps.append(step)
+        self.delta_count += len(step.deltas)
+        self.redo_steps.clear()
+        self._write_journal({'op': 'step', 'label': step.label, 'deltas': step.deltas})
+        # Forget the oldest steps once over the memory cap, but always keep the latest one
+        while self.delta_count > self.max_deltas and len(self.undo_steps) > 1:
+            dropped = self.undo_steps.popleft()
+            self.delta_count -= len(dropped.deltas)
+
+    # Undo / redo
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_steps)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_steps)
+
+    def undo(self) -> Optional[UndoStep]:
+        """Reverts the latest step and returns it, or None if there is nothing to undo."""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.delta_count -= len(step.deltas)
+        for row, column, old, _ in reversed(step.deltas):
+            self.apply(row, column, old)
+        self.redo_steps.append(step)
+        self._write_journal({'op': 'undo', 'label': step.label, 'deltas': step.deltas})
+        return step
+
+    def redo(self) -> Optional[UndoStep]:
+        """Re-applies the latest undone step and returns it, or None."""
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        for row, column, _, new in step.deltas:
+            self.apply(row, column, new)
+        self.undo_steps.append(step)
+        self.delta_count += len(step.deltas)
+        self._write_journal({'op': 'redo', 'label': step.label, 'deltas': step.deltas})
+        return step
+
+    # Journal
+
+    def _write_journal(self, record: dict):
+        if self.journal_path is None or self._replaying:
+            return
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                if self._journal.tell() == 0:
+                    self._journal.write(json.dumps(_journal_header(self.source_path)) + '\n')
+            self._journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._journal.flush()
+        except (OSError, TypeError) as e:
+            logger.warning(f"Edit journal disabled, failed to write {self.journal_path}: {e}")
+            self.close_journal()
+            self.journal_path = None
+
+    def close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def mark_saved(self, saved_path: Optional[str] = None):
+        """
+        Called after the file was saved: the journal is no longer needed.
+
+        Args:
+            saved_path: Where the file was saved, if that may not be the file the
+                journal was kept for (Save As). Later edits are journaled against it.
+        """
+        self.close_journal()
+        if self.journal_path and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        if saved_path and self.journal_path:
+            self.source_path = saved_path
+            self.journal_path = journal_path_for(saved_path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)  # Left by an earlier session, for what was overwritten
+
+    def replay_journal(self) -> int:
+        """
+        Re-applies the steps stored in the journal and rebuilds the undo
+        history from them. Returns the number of steps replayed.
+
+        Raises:
+            ValueError: If the journal was written for a different version of the file.
+        """
+        records = read_journal(self.journal_path)
+        header = records.pop(0) if records else {}
+        if header != _journal_header(self.source_path):
+            raise ValueError("The edit journal was written for a different version of this file.")
+
+        replayed = 0
+        self._replaying = True
+        try:
+            for record in records:
+                op = record.get('op')
+                if op == 'step':
+                    deltas = [tuple(delta) for delta in record['deltas']]
+                    for row, column, _, new in deltas:
+                        self.apply(row, column, new)
+                    self._push(UndoStep(record.get('label', 'Edit'), deltas))
+                    replayed += 1
+                elif op == 'undo':
+                    if self.undo_steps:
+                        self.undo()
+                    elif 'deltas' in record:  # Step made before the last save
+                        deltas = [tuple(delta) for delta in record['deltas']]
+                        for row, column, old, _ in reversed(deltas):
+                            self.apply(row, column, old)
+                        self.redo_steps.append(UndoStep(record.get('label', 'Edit'), deltas))
+                elif op == 'redo':
+                    if self.redo_steps:
+                        self.redo()
+                    elif 'deltas' in record:  # Undone before the last save
+                        deltas = [tuple(delta) for delta in record['deltas']]
+                        for row, column, _, new in deltas:
+                            self.apply(row, column, new)
+                        self.undo_steps.append(UndoStep(record.get('label', 'Edit'), deltas))
+                        self.delta_count += len(deltas)
+        finally:
+            self._replaying = False
+        return replayed
+
+
+def journal_path_for(file_path: str) -> str:
+    """Journal file used for a data file: a hidden sidecar next to it."""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f'.{name}.journal')
+
+
+def has_journal(file_path: str) -> bool:
+    return os.path.exists(journal_path_for(file_path))
+
+
+def read_journal(journal_path: str) -> List[dict]:
+    """Reads a journal, ignoring a truncated last line left by a crash."""
+    records = []
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def _journal_header(source_path: Optional[str]) -> dict:
+    header = {'journal': JOURNAL_VERSION}
+    if source_path and os.path.exists(source_path):
+        stat = os.stat(source_path)
+        header.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+    return header
@@ -0,0 +1,289 @@
+"""
+Deduplicated, compressed backup store for files overwritten by the editor.
+
+Files are split into content-defined chunks and each chunk is stored once,
+zlib-compressed, under its SHA-256. A backup is a small JSON manifest
+listing its chunks, so backing up a file that only changed in a few places
+costs roughly the size of the changed chunks.
+
+Chunk boundaries are picked after NUL bytes (every LTB string ends with
+one), when a CRC of the bytes before the candidate matches a mask. Inserting
+or resizing a string therefore only changes the chunks around it, instead
+of shifting every chunk after it as fixed-size chunks would.
+
+Layout, next to the backed up file:
+    .ltb_backups/objects/ab/abcdef...      compressed chunks
+    .ltb_backups/manifests/NAME/ID.json    one manifest per backup
+
+Usage:
+    python backup_store.py list FILE
+    python backup_store.py restore FILE [--id BACKUP_ID] [-o OUTPUT]
+    python backup_store.py prune FILE [--keep-last 20] [--keep-days 7]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+STORE_DIR_NAME = '.ltb_backups'
+
+MIN_CHUNK_SIZE = 2 * 1024
+MAX_CHUNK_SIZE = 64 * 1024
+BOUNDARY_MASK = 0x1f  # About one candidate in 32 becomes a boundary
+BOUNDARY_WINDOW = 16
+
+DEFAULT_KEEP_LAST = 20
+
+
+def iter_chunks(data: bytes) -> Iterator[bytes]:
+    """Splits data into content-defined chunks."""
+    size = len(data)
+    start = 0
+    position = MIN_CHUNK_SIZE
+    while start < size:
+        position = data.find(b'\x00', position, start + MAX_CHUNK_SIZE)
+        if position == -1:
+            # No boundary found before the size limit
+            yield data[start:start + MAX_CHUNK_SIZE]
+            start += MAX_CHUNK_SIZE
+            position = start + MIN_CHUNK_SIZE
+            continue
+        position += 1
+        if zlib.crc32(data[position - BOUNDARY_WINDOW:position]) & BOUNDARY_MASK == 0:
+            yield data[start:position]
+            start = position
+            position = start + MIN_CHUNK_SIZE
+
+
+class BackupStore:
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Folder of the files being backed up. The store lives in
+                a hidden sub-folder of it.
+        """
+        self.root = os.path.join(os.path.abspath(directory), STORE_DIR_NAME)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+
+    @staticmethod
+    def for_file(file_path: str) -> 'BackupStore':
+        return BackupStore(os.path.dirname(os.path.abspath(file_path)))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _manifest_dir(self, file_name: str) -> str:
+        return os.path.join(self.manifests_dir, file_name)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def backup(self, file_path: str) -> dict:
+        """
+        Backs up the current contents of a file.
+
+        Returns:
+            dict: The manifest, with 'id', 'stored_bytes' (new compressed bytes
+            written) and the other manifest fields.
+        """
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        chunks = []
+        stored_bytes = 0
+        for chunk in iter_chunks(data):
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append(digest)
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                compressed = zlib.compress(chunk, 6)
+                self._write_atomic(object_path, compressed)
+                stored_bytes += len(compressed)
+
+        created = time.time()
+        manifest = {
+            'id': datetime.fromtimestamp(created).strftime('%Y%m%d%H%M%S%f'),
+            'file': os.path.basename(file_path),
+            'created': created,
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'chunks': chunks,
+        }
+        manifest_path = os.path.join(self._manifest_dir(manifest['file']), manifest['id'] + '.json')
+        self._write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+        manifest['stored_bytes'] = stored_bytes
+        return manifest
+
+    def list_backups(self, file_name: str) -> List[dict]:
+        """Manifests of every backup of a file, newest first."""
+        manifest_dir = self._manifest_dir(os.path.basename(file_name))
+        if not os.path.isdir(manifest_dir):
+            return []
+        manifests = []
+        for name in os.listdir(manifest_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(manifest_dir, name), 'r', encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+        manifests.sort(key=lambda manifest: manifest['id'], reverse=True)
+        return manifests
+
+    def read_backup(self, manifest: dict) -> bytes:
+        """
+        Reassembles the contents of a backup.
+
+        Raises:
+            ValueError: If a chunk is missing or the result doesn't match its checksum.
+        """
+        parts = []
+        for digest in manifest['chunks']:
+            try:
+                with open(self._object_path(digest), 'rb') as f:
+                    parts.append(zlib.decompress(f.read()))
+            except (OSError, zlib.error) as e:
+                raise ValueError(f"Backup {manifest['id']} is damaged, chunk {digest} unreadable: {e}")
+        data = b''.join(parts)
+        if hashlib.sha256(data).hexdigest() != manifest['sha256']:
+            raise ValueError(f"Backup {manifest['id']} is damaged, checksum mismatch.")
+        return data
+
+    def restore(self, manifest: dict, output_path: str, keep_current: bool = False) -> Optional[dict]:
+        """
+        Writes the contents of a backup to output_path.
+
+        Args:
+            keep_current: Back up what output_path holds first (unless it is the
+                same as the backup), so that the restore can be undone too.
+
+        Returns:
+            dict: Manifest of the backup of the overwritten contents, or None.
+        """
+        data = self.read_backup(manifest)
+        previous = None
+        if keep_current and os.path.exists(output_path):
+            with open(output_path, 'rb') as f:
+                unchanged = hashlib.sha256(f.read()).hexdigest() == manifest['sha256']
+            if unchanged:
+                return None
+            previous = self.backup(output_path)
+        self._write_atomic(output_path, data)
+        return previous
+
+    def prune(self, file_name: str, keep_last: int = DEFAULT_KEEP_LAST, keep_days: Optional[float] = None) -> int:
+        """
+        Applies the retention policy to the backups of one file: a backup is
+        kept if it is one of the `keep_last` newest or younger than `keep_days`.
+        Chunks no longer used by any backup are deleted.
+
+        Returns:
+            int: Number of backups removed.
+        """
+        cutoff = time.time() - keep_days * 86400 if keep_days is not None else None
+        removed = 0
+        for position, manifest in enumerate(self.list_backups(file_name)):
+            if position < keep_last or (cutoff is not None and manifest['created'] >= cutoff):
+                continue
+            os.remove(os.path.join(self._manifest_dir(manifest['file']), manifest['id'] + '.json'))
+            removed += 1
+        if removed:
+            self.collect_garbage()
+        return removed
+
+    def collect_garbage(self) -> int:
+        """Deletes chunks not referenced by any manifest. Returns the number deleted."""
+        referenced = set()
+        if os.path.isdir(self.manifests_dir):
+            for file_name in os.listdir(self.manifests_dir):
+                for manifest in self.list_backups(file_name):
+                    referenced.update(manifest['chunks'])
+
+        deleted = 0
+        if not os.path.isdir(self.objects_dir):
+            return deleted
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                if digest not in referenced:
+                    os.remove(os.path.join(prefix_dir, digest))
+                    deleted += 1
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """Number of stored chunks and their total compressed size."""
+        count = total = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for digest in os.listdir(prefix_dir):
+                    count += 1
+                    total += os.path.getsize(os.path.join(prefix_dir, digest))
+        return {'chunks': count, 'bytes': total}
+
+
+def describe(manifest: dict) -> str:
+    created = datetime.fromtimestamp(manifest['created']).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{manifest['id']}  {created}  {manifest['size']} bytes"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage backups made when the LTB editor overwrites a file.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="List the backups of a file.")
+    list_parser.add_argument('file')
+
+    restore_parser = subparsers.add_parser('restore', help="Restore a backup.")
+    restore_parser.add_argument('file')
+    restore_parser.add_argument('--id', help="Backup to restore (default: the newest).")
+    restore_parser.add_argument('-o', '--output', help="Write here instead of overwriting FILE.")
+
+    prune_parser = subparsers.add_parser('prune', help="Delete old backups of a file.")
+    prune_parser.add_argument('file')
+    prune_parser.add_argument('--keep-last', type=int, default=DEFAULT_KEEP_LAST)
+    prune_parser.add_argument('--keep-days', type=float, help="Also keep every backup younger than this.")
+
+    args = parser.parse_args(argv)
+    store = BackupStore.for_file(args.file)
+    backups = store.list_backups(args.file)
+
+    if args.command == 'list':
+        for manifest in backups:
+            print(describe(manifest))
+        stats = store.stats()
+        print(f"{len(backups)} backup(s), store holds {stats['chunks']} chunks / {stats['bytes']} bytes")
+        return 0
+
+    if args.command == 'restore':
+        if args.id:
+            backups = [manifest for manifest in backups if manifest['id'] == args.id]
+        if not backups:
+            print("No matching backup found.", file=sys.stderr)
+            return 1
+        try:
+            # Overwriting FILE in place backs up its current contents first
+            previous = store.restore(backups[0], args.output or args.file, keep_current=not args.output)
+        except (OSError, ValueError) as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        print(f"Restored {describe(backups[0])} to {args.output or args.file}")
+        if previous:
+            print(f"The contents it replaced were backed up as {previous['id']}")
+        return 0
+
+    removed = store.prune(args.file, keep_last=args.keep_last, keep_days=args.keep_days)
+    print(f"Removed {removed} backup(s).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
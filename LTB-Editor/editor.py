@@ -1,17 +1,28 @@
 # editor.py
 
 from PyQt5.QtWidgets import (
-    QMainWindow, QAction, QFileDialog,
+    QApplication, QMainWindow, QAction, QFileDialog,
     QTableView, QVBoxLayout, QWidget,
-    QHBoxLayout, QMessageBox, QComboBox, QLabel, QHeaderView, QInputDialog
+    QHBoxLayout, QMessageBox, QComboBox, QLabel, QHeaderView, QInputDialog,
+    QDialog, QCheckBox, QListWidget, QAbstractItemView, QProgressBar, QFormLayout, QTableWidget,
+    QTableWidgetItem
 )
-from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
-from ltb_file import LTBFile
+from PyQt5.QtCore import Qt, QAbstractTableModel, QItemSelectionModel, QModelIndex, QVariant, QTimer
+from PyQt5.QtGui import QBrush, QColor, QKeySequence
+from ltb_file import LTBFile, rate_limiter
+from undo import UndoStack, has_journal, journal_path_for  # Data-Tools folder, put on the path by ltb_file
+from findreplace import Finder, ScanThread
+from rosesql import ROW_COLUMN, RoseDatabase, table_name_for
+from filewatch import WATCH_POLL_MS, FileWatcher, conflict_prompt, merge_rows, snapshot_rows, start_reload
+import profiling
 import os
-import shutil
-from datetime import datetime
+import re
+import bisect
 import logging
-from typing import List  # Import List from typing
+import threading
+from contextlib import contextmanager
+from backup_store import BackupStore, describe as describe_backup
+from typing import Dict, List, Optional, Set, Tuple  # Import typing helpers
 from PyQt5.QtWidgets import QLineEdit, QPushButton
 from PyQt5.QtWidgets import QStyledItemDelegate, QPlainTextEdit, QWidget, QVBoxLayout
 from PyQt5.QtWidgets import QStyledItemDelegate, QPlainTextEdit
@@ -19,6 +30,99 @@ from PyQt5.QtCore import Qt
 import csv
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
 
+# Header of each LTB column. Column 0 holds the Dialog ID, the others one
+# language each, in the same order as the languages of STL files.
+COLUMN_NAMES = {
+    0: "Dialog ID",
+    1: "Korean",
+    2: "English Dialogue",
+    3: "Japanese",
+    4: "Chinese (Simplified)",
+    5: "Chinese (Traditional)",
+}
+
+# Columns loaded when a file is opened: Dialog ID and English
+DEFAULT_DISPLAY_COLUMNS = [0, 2]
+
+
+# Columns kept in a multi-column sort: the clicked one first, then the previously sorted ones
+MAX_SORT_COLUMNS = 3
+# Above this many rows moved by a batch of edits, the sort is redone instead of moving rows one by one
+INCREMENTAL_SORT_LIMIT = 64
+# Runs of digits are zero-padded to this width in Dialog ID sort keys, so "QST_9" sorts before "QST_10"
+SORT_NUMBER_WIDTH = 20
+DIGITS = '0123456789'
+NUMBER_PATTERN = re.compile(r'[0-9]+')
+# Zeros put in front of a trailing digit run of each length (nothing when there is none)
+NUMBER_PADDING = [''] + ['0' * (SORT_NUMBER_WIDTH - width) for width in range(1, SORT_NUMBER_WIDTH + 1)]
+
+
+def column_name(column: int) -> str:
+    return COLUMN_NAMES.get(column, f"Col {column}")
+
+
+def _pad_number(match) -> str:
+    return match.group().zfill(SORT_NUMBER_WIDTH)
+
+
+def natural_sort_keys(values: List[str]) -> List[str]:
+    """
+    The 'natural' keys of cell_sort_key for a whole column of stripped cells.
+    Dialog IDs mostly end in their only digit run (QST_12), so the trailing
+    digits are padded by string concatenation, and the regex runs once per
+    distinct rest of the ID instead of once per cell.
+    """
+    values = [value.casefold() for value in values]
+    prefixes = [value.rstrip(DIGITS) for value in values]
+    padded = {prefix: NUMBER_PATTERN.sub(_pad_number, prefix) for prefix in set(prefixes)}
+    try:
+        return [padded[prefix] + NUMBER_PADDING[len(value) - len(prefix)] + value[len(prefix):]
+                for prefix, value in zip(prefixes, values)]
+    except IndexError:  # A trailing number longer than SORT_NUMBER_WIDTH, which zfill leaves as it is
+        return [NUMBER_PATTERN.sub(_pad_number, value) for value in values]
+
+
+def column_sort_keys(values: List[str], natural: bool = False) -> Tuple[str, list]:
+    """
+    Sort keys of a column's cells, and their kind: 'int' when every non-empty
+    cell is a whole number (empty cells sort first), otherwise 'natural'
+    (digit runs compared as numbers, used for Dialog IDs) or 'text' (case
+    insensitive) strings.
+    """
+    stripped = [(value or "").strip() for value in values]
+    if all(value.isdecimal() or not value for value in stripped):
+        return 'int', [int(value) if value else -1 for value in stripped]
+    if natural:
+        return 'natural', natural_sort_keys(stripped)
+    return 'text', [value.casefold() for value in stripped]
+
+
+def cell_sort_key(kind: str, value: str):
+    """Sort key of one cell for a column of the given kind, or None if it doesn't fit an 'int' column."""
+    value = (value or "").strip()
+    if kind == 'int':
+        if not value:
+            return -1
+        return int(value) if value.isdecimal() else None
+    if kind == 'natural':
+        return NUMBER_PATTERN.sub(_pad_number, value.casefold())
+    return value.casefold()
+
+
+def read_ltb_rows(file_path: str, encoding: str, columns: List[int]) -> Tuple[LTBFile, List[List[str]]]:
+    """
+    Loads an LTB file for filewatch.start_reload: the file and its rows of
+    the given columns.
+
+    Raises:
+        ValueError: If the file no longer has all of the columns.
+    """
+    ltb = LTBFile.read_cached(file_path, encoding=encoding)
+    if columns and max(columns) >= ltb.columns:
+        raise ValueError(f"The file now has {ltb.columns} column(s), import it again.")
+    return ltb, ltb.to_string_table(columns)
+
+
 class MultiLineDelegate(QStyledItemDelegate):
     def createEditor(self, parent, option, index):
         editor = QPlainTextEdit(parent)
@@ -41,11 +145,94 @@ class MultiLineDelegate(QStyledItemDelegate):
         editor.setGeometry(option.rect.adjusted(-10, -10, 10, 10))
 
 class LTBTableModel(QAbstractTableModel):
-    def __init__(self, table_data: List[List[str]], headers: List[str], parent=None):
+    def __init__(self, table_data: List[List[str]], headers: List[str], key_column: Optional[int] = None,
+                 source_model: Optional['LTBTableModel'] = None, source_rows: Optional[List[int]] = None,
+                 parent=None):
         super().__init__(parent)
         self.table_data = table_data
         self.headers = headers
 
+        # Live index of Dialog ID -> rows holding it, kept up to date by setData,
+        # append_row and set_cell so duplicate checks never rescan the table.
+        # Filtered views share the index of the model they were built from.
+        self.key_column = key_column
+        self.source_model = source_model
+        self.source_rows = source_rows
+        self.key_index: Dict[str, Set[int]] = {}
+        self.duplicate_keys: Set[str] = set()
+        self.undo_stack: Optional[UndoStack] = None  # Set by the editor on the full-table model
+        self.column_ids: Optional[List[int]] = None  # LTB column of each model column, used in undo deltas
+
+        # Sorting never reorders table_data: the view shows it through `order`
+        # (view row -> table_data row), so row numbers used by the Dialog ID
+        # index, undo and saving stay in file order. Methods taking a `row`
+        # take a table_data row; QModelIndex rows are view rows.
+        self.order: Optional[List[int]] = None  # None while in file order
+        self.sort_spec: List[Tuple[int, int]] = []  # (column, Qt sort order), most significant first
+        self.sort_keys: Dict[int, Tuple[str, list]] = {}  # column -> (kind, key of each row), built on demand
+        self.sort_deferred = 0
+        self.unsorted_rows: Set[int] = set()  # Rows edited in a deferred_sort block
+        # Text being generated for a cell, shown (greyed) in its place until it is applied.
+        # Keyed by full-table row and model column, kept on the full-table model.
+        self.previews: Dict[Tuple[int, int], str] = {}
+        # Bumped on every change to the cells, rows or columns (on the full-table
+        # model), so copies of the table such as the SQL one know when to rebuild
+        self.version = 0
+        if self.source_model is None:
+            self.rebuild_key_index()
+
+    def rebuild_key_index(self):
+        """
+        Rebuilds the Dialog ID index from scratch.
+        """
+        self.key_index = {}
+        self.duplicate_keys = set()
+        if self.key_column is None:
+            return
+        for row, row_data in enumerate(self.table_data):
+            self._index_add(row_data[self.key_column], row)
+
+    def _index_add(self, key: str, row: int) -> bool:
+        """Indexes a row; returns True if the key just became a duplicate."""
+        key = (key or "").strip()
+        if not key:
+            return False  # Empty Dialog IDs are not indexed
+        rows = self.key_index.setdefault(key, set())
+        rows.add(row)
+        if len(rows) == 2:
+            self.duplicate_keys.add(key)
+            return True
+        return False
+
+    def _index_remove(self, key: str, row: int) -> bool:
+        """Unindexes a row; returns True if the key just stopped being a duplicate."""
+        key = (key or "").strip()
+        rows = self.key_index.get(key)
+        if not rows or row not in rows:
+            return False
+        rows.discard(row)
+        if not rows:
+            del self.key_index[key]
+        if len(rows) == 1:
+            self.duplicate_keys.discard(key)
+            return True
+        return False
+
+    def _key_owner(self) -> 'LTBTableModel':
+        return self.source_model if self.source_model is not None else self
+
+    def _owner_row(self, row: int) -> int:
+        return self.source_rows[row] if self.source_rows is not None else row
+
+    def rows_for_key(self, key: str) -> Set[int]:
+        """
+        Returns the rows (in the full table) holding the given Dialog ID.
+        """
+        return self._key_owner().key_index.get(key.strip(), set())
+
+    def has_duplicate_keys(self) -> bool:
+        return bool(self._key_owner().duplicate_keys)
+
     def rowCount(self, parent=QModelIndex()):
         return len(self.table_data)
 
@@ -55,21 +242,284 @@ class LTBTableModel(QAbstractTableModel):
     def data(self, index: QModelIndex, role=Qt.DisplayRole):
         if not index.isValid():
             return QVariant()
+        row = self.data_row(index.row())
+        previews = self._key_owner().previews
+        if previews and role in (Qt.DisplayRole, Qt.ForegroundRole):
+            preview = previews.get((self._owner_row(row), index.column()))
+            if preview is not None:
+                return preview if role == Qt.DisplayRole else QBrush(QColor(128, 128, 128))
         if role == Qt.DisplayRole or role == Qt.EditRole:
-            return self.table_data[index.row()][index.column()]
+            return self.table_data[row][index.column()]
         if role == Qt.ToolTipRole:
-            return f"Row: {index.row() + 1}, Column: {self.headers[index.column()]}"
+            return f"Row: {row + 1}, Column: {self.headers[index.column()]}"
+        if role == Qt.BackgroundRole and index.column() == self.key_column:
+            key = (self.table_data[row][index.column()] or "").strip()
+            if key in self._key_owner().duplicate_keys:
+                return QBrush(QColor(255, 200, 200))  # Highlight duplicate Dialog IDs
         return QVariant()
 
     def setData(self, index: QModelIndex, value, role=Qt.EditRole):
         if index.isValid() and role == Qt.EditRole:
             # Allow empty strings to clear the cell content
             if isinstance(value, str):
-                self.table_data[index.row()][index.column()] = value.strip()  # Save even empty strings
-                self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+                row = self.data_row(index.row())
+                old_value = self.table_data[row][index.column()]
+                self.set_cell(row, index.column(), value.strip())  # Save even empty strings
+                self.record_edit(row, index.column(), old_value)
+                changed = self.index(self.view_row(row), index.column())  # The row may have moved
+                self.dataChanged.emit(changed, changed, [Qt.DisplayRole, Qt.EditRole])
                 return True
         return False
 
+    def record_edit(self, row: int, column: int, old_value: str):
+        """
+        Records an edit already stored in table_data on the undo stack, using
+        full-table row numbers and LTB column numbers.
+        """
+        owner = self._key_owner()
+        if owner.undo_stack is None:
+            return
+        column_id = owner.column_ids[column] if owner.column_ids else column
+        owner.undo_stack.record(self._owner_row(row), column_id, old_value, self.table_data[row][column])
+
+    def set_cell(self, row: int, column: int, value: str):
+        """
+        Stores a value and keeps the Dialog ID index and the sort order in sync.
+        Does not emit dataChanged for the cell itself.
+        """
+        self._set_value(row, column, value)
+        self._sort_key_changed(row, column)
+        owner = self._key_owner()
+        if owner is not self:
+            owner._sort_key_changed(self._owner_row(row), column)  # Rows are shared with the full table
+
+    def _set_value(self, row: int, column: int, value: str):
+        self._key_owner().version += 1
+        if column == self.key_column:
+            owner = self._key_owner()
+            owner_row = self._owner_row(row)
+            removed = owner._index_remove(self.table_data[row][column], owner_row)
+            added = owner._index_add(value, owner_row)
+            self.table_data[row][column] = value
+            if removed or added:
+                # Duplicate state changed elsewhere in the column, refresh its highlighting
+                self.dataChanged.emit(self.index(0, column), self.index(self.rowCount() - 1, column),
+                                      [Qt.BackgroundRole])
+        else:
+            self.table_data[row][column] = value
+
+    def append_row(self, row_data: List[str]):
+        """
+        Appends a row to the table and indexes its Dialog ID. In a sorted view
+        it is shown at its sorted position.
+        """
+        row = len(self.table_data)
+        place_now = self.order is not None and not self.sort_deferred
+        if place_now:
+            for column, _ in self.sort_spec:
+                self._column_keys(column)
+        for column, (kind, keys) in list(self.sort_keys.items()):
+            key = cell_sort_key(kind, row_data[column])
+            if key is None:
+                del self.sort_keys[column]  # No longer an all-numbers column, rebuilt when needed
+                place_now = place_now and all(col != column for col, _ in self.sort_spec)
+            else:
+                keys.append(key)
+        position = len(self.table_data)
+        if place_now:
+            position = self._sorted_position(row)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._key_owner().version += 1
+        self.table_data.append(row_data)
+        if self.order is not None:
+            self.order.insert(position, row)
+        if self.key_column is not None:
+            self._key_owner()._index_add(row_data[self.key_column], self._owner_row(row))
+        self.endInsertRows()
+        if self.order is not None and not place_now:
+            self._sort_rows_later_or_now({row})
+
+    def insert_column(self, position: int, header: str, values: List[str]):
+        """
+        Inserts a column into every row (rows past the end of `values` get "").
+        """
+        self.beginInsertColumns(QModelIndex(), position, position)
+        self._key_owner().version += 1
+        for row_index, row_data in enumerate(self.table_data):
+            row_data.insert(position, values[row_index] if row_index < len(values) else "")
+        self.headers.insert(position, header)
+        if self.key_column is not None and position <= self.key_column:
+            self.key_column += 1
+        self.sort_keys = {column + (column >= position): keys for column, keys in self.sort_keys.items()}
+        self.sort_spec = [(column + (column >= position), order) for column, order in self.sort_spec]
+        self.endInsertColumns()
+
+    def remove_last_row(self):
+        """
+        Removes the last row (used to undo "Add Row").
+        """
+        row = len(self.table_data) - 1
+        if row < 0:
+            return
+        position = self.view_row(row)
+        self.beginRemoveRows(QModelIndex(), position, position)
+        self._key_owner().version += 1
+        if self.key_column is not None:
+            self._key_owner()._index_remove(self.table_data[row][self.key_column], self._owner_row(row))
+        self.table_data.pop()
+        if self.order is not None:
+            del self.order[position]
+        self.unsorted_rows.discard(row)
+        for _, keys in self.sort_keys.values():
+            del keys[row:]
+        self.endRemoveRows()
+
+    # Sorting
+
+    def data_row(self, view_row: int) -> int:
+        """table_data row shown at a view row."""
+        return self.order[view_row] if self.order is not None else view_row
+
+    def view_row(self, row: int) -> int:
+        """View row showing a table_data row."""
+        return self.order.index(row) if self.order is not None else row
+
+    def sorted_rows(self) -> List[int]:
+        """table_data rows in view order."""
+        return list(self.order) if self.order is not None else list(range(len(self.table_data)))
+
+    @profiling.profiled('ltb.sort')
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """
+        Sorts the view by a column (called by QTableView when a header is
+        clicked). Earlier sort columns are kept as tie-breakers, so sorting by
+        language then by Dialog ID orders by Dialog ID, then language. A
+        column of -1 goes back to file order.
+        """
+        if 0 <= column < len(self.headers):
+            spec = [(column, order)] + [(col, col_order) for col, col_order in self.sort_spec if col != column]
+            self.sort_spec = spec[:MAX_SORT_COLUMNS]
+        else:
+            self.sort_spec = []
+        self._relayout(self._full_sort() if self.sort_spec else None)
+
+    def set_sort_spec(self, sort_spec: List[Tuple[int, int]], presorted: bool = False):
+        """Applies another model's sort columns; `presorted` if table_data is already in that order."""
+        self.sort_spec = list(sort_spec)
+        if not self.sort_spec:
+            self._relayout(None)
+        elif presorted:
+            self._relayout(list(range(len(self.table_data))))
+        else:
+            self._relayout(self._full_sort())
+
+    @contextmanager
+    def deferred_sort(self):
+        """
+        Holds back re-sorting while many cells are edited (find/replace, CSV
+        import, undo of a batch); edited rows are put back in order once at
+        the end of the block.
+        """
+        self.sort_deferred += 1
+        try:
+            yield
+        finally:
+            self.sort_deferred -= 1
+            if self.sort_deferred == 0 and self.unsorted_rows:
+                rows, self.unsorted_rows = self.unsorted_rows, set()
+                self._sort_rows_later_or_now(rows)
+
+    def _sort_rows_later_or_now(self, rows: Set[int]):
+        """Puts rows whose sort keys changed back in order (once the deferred_sort block ends)."""
+        if self.order is None or not self.sort_spec:
+            return
+        if self.sort_deferred:
+            self.unsorted_rows |= rows
+        elif len(rows) > INCREMENTAL_SORT_LIMIT or any(col not in self.sort_keys for col, _ in self.sort_spec):
+            self._relayout(self._full_sort())
+        else:
+            for row in sorted(rows):
+                self._move_to_sorted_position(row)
+
+    def _column_keys(self, column: int) -> Tuple[str, list]:
+        cached = self.sort_keys.get(column)
+        if cached is None or len(cached[1]) != len(self.table_data):
+            values = [row_data[column] for row_data in self.table_data]
+            cached = self.sort_keys[column] = column_sort_keys(values, natural=column == self.key_column)
+        return cached
+
+    def _full_sort(self) -> List[int]:
+        # One stable sort per column, least significant first; ties keep file order.
+        # Columns after one without ties (e.g. all-distinct Dialog IDs) can't change the order.
+        spec = self.sort_spec
+        for position, (column, _) in enumerate(spec[:-1]):
+            kind, keys = self._column_keys(column)
+            if kind == 'int' and len(set(keys)) == len(keys):
+                spec = spec[:position + 1]
+                break
+        rows = list(range(len(self.table_data)))
+        for column, order in reversed(spec):
+            keys = self._column_keys(column)[1]
+            rows.sort(key=keys.__getitem__, reverse=order == Qt.DescendingOrder)
+        return rows
+
+    def _relayout(self, new_order: Optional[List[int]]):
+        """Switches to a new view order, keeping selections and the current cell on their rows."""
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rows = [self.data_row(index.row()) for index in persistent]
+        self.order = new_order
+        if persistent:
+            positions = list(range(len(self.table_data)))
+            if new_order is not None:
+                for position, row in enumerate(new_order):
+                    positions[row] = position
+            self.changePersistentIndexList(persistent, [self.index(positions[row], index.column())
+                                                        for row, index in zip(rows, persistent)])
+        self.layoutChanged.emit()
+
+    def _sorts_before(self, row: int, other: int) -> bool:
+        for column, order in self.sort_spec:
+            keys = self.sort_keys[column][1]
+            if keys[row] != keys[other]:
+                return (keys[row] < keys[other]) != (order == Qt.DescendingOrder)
+        return row < other
+
+    def _sorted_position(self, row: int) -> int:
+        """Binary search for where a row (not currently in `order`) belongs. Needs the sort keys built."""
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._sorts_before(self.order[middle], row):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _move_to_sorted_position(self, row: int):
+        source = self.order.index(row)
+        del self.order[source]
+        target = self._sorted_position(row)
+        self.order.insert(source, row)
+        if target == source:
+            return
+        # Qt wants the destination in the row numbers from before the move
+        self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), target if target < source else target + 1)
+        del self.order[source]
+        self.order.insert(target, row)
+        self.endMoveRows()
+
+    def _sort_key_changed(self, row: int, column: int):
+        cached = self.sort_keys.get(column)
+        if cached is not None:
+            key = cell_sort_key(cached[0], self.table_data[row][column])
+            if key is None:
+                del self.sort_keys[column]  # No longer an all-numbers column, rebuilt when needed
+            else:
+                cached[1][row] = key
+        if any(col == column for col, _ in self.sort_spec):
+            self._sort_rows_later_or_now({row})
+
     def flags(self, index: QModelIndex):
         if not index.isValid():
             return Qt.ItemIsEnabled
@@ -83,11 +533,295 @@ class LTBTableModel(QAbstractTableModel):
                 return self.headers[section]
             else:
                 return f"Col {section}"
-        return super().headerData(section, orientation, role)
+        return str(self.data_row(section) + 1)  # Row number in the file, also when sorted
 
 
 from PyQt5.QtWidgets import QPushButton
 
+class GenerationThread(threading.Thread):
+    """
+    Generates dialogue lines on a worker thread, so the window keeps
+    responding. The editor polls `partial_lines` from a timer to show the
+    text streamed so far, and reads `results` once `done` is set.
+    """
+
+    def __init__(self, ltb: LTBFile, specs: List[dict], use_assistant: bool):
+        super().__init__(daemon=True)
+        self.ltb = ltb
+        self.specs = specs
+        self.use_assistant = use_assistant
+        self.lock = threading.Lock()
+        self.partial: Dict[int, str] = {}  # Spec index -> text received so far
+        self.results: Optional[List[dict]] = None
+        self.stats: dict = {}
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.results = self.ltb.generate_dialogue_batch(self.specs, self.use_assistant, stats=self.stats,
+                                                            on_text=self.on_text)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def on_text(self, index: int, text: str):
+        with self.lock:
+            self.partial[index] = text
+
+    def partial_lines(self) -> Dict[int, str]:
+        with self.lock:
+            return dict(self.partial)
+
+
+class FindReplaceDialog(QDialog):
+    """
+    Find/replace across the whole table (not just the filtered view). Matches
+    are counted and replacements planned on a worker thread; the editor then
+    applies them as a single undo step.
+    """
+
+    def __init__(self, editor: 'LTBEditor'):
+        super().__init__(editor)
+        self.editor = editor
+        self.setWindowTitle("Find and Replace")
+        self.scan_thread: Optional[ScanThread] = None
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        form = QFormLayout()
+        self.find_box = QLineEdit()
+        form.addRow("Find:", self.find_box)
+        self.replace_box = QLineEdit()
+        form.addRow("Replace with:", self.replace_box)
+        layout.addLayout(form)
+
+        self.regex_check = QCheckBox("Regular expression (\\1 in the replacement inserts a group)")
+        layout.addWidget(self.regex_check)
+        self.case_check = QCheckBox("Match case")
+        layout.addWidget(self.case_check)
+
+        # Columns to search, all of them by default
+        layout.addWidget(QLabel("Columns:"))
+        self.column_list = QListWidget()
+        self.column_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        self.column_list.addItems(editor.model.headers)
+        self.column_list.selectAll()
+        layout.addWidget(self.column_list)
+
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+        self.result_label = QLabel("")
+        layout.addWidget(self.result_label)
+
+        button_layout = QHBoxLayout()
+        self.count_button = QPushButton("Count")
+        self.count_button.clicked.connect(lambda: self.start_scan(replace=False))
+        button_layout.addWidget(self.count_button)
+        self.replace_button = QPushButton("Replace All")
+        self.replace_button.clicked.connect(lambda: self.start_scan(replace=True))
+        button_layout.addWidget(self.replace_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_scan)
+        button_layout.addWidget(self.cancel_button)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(50)
+        self.poll_timer.timeout.connect(self.poll_scan)
+
+    def start_scan(self, replace: bool):
+        if self.scan_thread is not None or not self.editor.model:
+            return
+        try:
+            finder = Finder(self.find_box.text(), regex=self.regex_check.isChecked(),
+                            case_sensitive=self.case_check.isChecked())
+        except ValueError as e:
+            QMessageBox.warning(self, "Find and Replace", str(e))
+            return
+        columns = sorted(self.column_list.row(item) for item in self.column_list.selectedItems())
+        if not columns:
+            QMessageBox.warning(self, "Find and Replace", "Select at least one column.")
+            return
+
+        self.scan_thread = ScanThread(self.editor.model.table_data, columns, finder,
+                                      self.replace_box.text() if replace else None)
+        self.progress_bar.setRange(0, max(self.scan_thread.total_rows, 1))
+        self.progress_bar.setValue(0)
+        self.count_button.setEnabled(False)
+        self.replace_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.result_label.setText("Searching...")
+        self.scan_thread.start()
+        self.poll_timer.start()
+
+    def cancel_scan(self):
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+
+    def poll_scan(self):
+        scan_thread = self.scan_thread
+        self.progress_bar.setValue(scan_thread.rows_done)
+        if not scan_thread.done.is_set():
+            return
+        self.poll_timer.stop()
+        self.scan_thread = None
+        self.count_button.setEnabled(True)
+        self.replace_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+        if scan_thread.error is not None:
+            self.result_label.setText("")
+            QMessageBox.critical(self, "Find and Replace", f"Search failed:\n{str(scan_thread.error)}")
+            return
+        result = scan_thread.result
+        if result.cancelled:
+            self.result_label.setText("Cancelled.")
+            return
+        self.result_label.setText(f"{result.matches} match(es) in {result.cells} cell(s).")
+        if scan_thread.replacement is None or not result.deltas:
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Replace All",
+            f"Replace {result.matches} match(es) in {len(result.deltas)} cell(s)?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes
+        )
+        if reply == QMessageBox.Yes:
+            changed = self.editor.apply_replacements(result.deltas, f"Replace '{self.find_box.text()}'")
+            self.result_label.setText(f"Replaced text in {changed} cell(s).")
+
+    def closeEvent(self, event):
+        self.cancel_scan()
+        super().closeEvent(event)
+
+
+class SqlQueryDialog(QDialog):
+    """
+    Filters and sorts the loaded table with SQL. Results are added to the list
+    in batches so large results show up progressively; double-clicking a
+    result selects its row in the table.
+    """
+
+    def __init__(self, editor: 'LTBEditor', table_name: str):
+        super().__init__(editor)
+        self.editor = editor
+        self.setWindowTitle("SQL Query")
+        self.resize(900, 500)
+        self.columns: List[str] = []
+        self.batches = None
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.addWidget(QLabel(f"Table: {table_name}. Columns are col0 (Dialog ID), col1, col2... (the LTB "
+                                f"columns loaded in the table) and _row (row number, starting at 0)."))
+        self.query_box = QPlainTextEdit()
+        self.query_box.setPlainText(f"SELECT * FROM {table_name} ORDER BY col0 LIMIT 1000")
+        self.query_box.setMaximumHeight(80)
+        layout.addWidget(self.query_box)
+
+        button_layout = QHBoxLayout()
+        run_button = QPushButton("Run (Ctrl+Enter)")
+        run_button.clicked.connect(self.run_query)
+        button_layout.addWidget(run_button)
+        self.result_label = QLabel("")
+        button_layout.addWidget(self.result_label)
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+        run_action = QAction(self)
+        run_action.setShortcut(QKeySequence("Ctrl+Return"))
+        run_action.triggered.connect(self.run_query)
+        self.addAction(run_action)
+
+        self.result_table = QTableWidget()
+        self.result_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.result_table.cellDoubleClicked.connect(self.select_result_row)
+        layout.addWidget(self.result_table)
+
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setInterval(1)
+        self.batch_timer.timeout.connect(self.add_next_batch)
+
+    def run_query(self):
+        self.batch_timer.stop()  # Stops adding the results of a previous query
+        self.result_table.setRowCount(0)
+        try:
+            self.columns, self.batches = self.editor.get_sql_database().execute(
+                self.query_box.toPlainText().strip())
+        except Exception as e:
+            self.result_label.setText(f"Query failed: {str(e)}")
+            return
+        self.result_table.setColumnCount(len(self.columns))
+        self.result_table.setHorizontalHeaderLabels(self.columns)
+        self.add_next_batch()
+        self.batch_timer.start()
+
+    def add_next_batch(self):
+        batch = next(self.batches, None)
+        count = self.result_table.rowCount()
+        if batch is None:
+            self.batch_timer.stop()
+            self.result_label.setText(f"{count} row(s).")
+            return
+        self.result_table.setRowCount(count + len(batch))
+        for row, values in enumerate(batch, count):
+            for column, value in enumerate(values):
+                self.result_table.setItem(row, column, QTableWidgetItem('' if value is None else str(value)))
+        self.result_label.setText(f"{count + len(batch)} row(s) so far...")
+
+    def select_result_row(self, result_row: int, result_column: int):
+        if ROW_COLUMN not in self.columns:
+            return
+        item = self.result_table.item(result_row, self.columns.index(ROW_COLUMN))
+        if item is not None:
+            self.editor.select_row(int(item.text()))
+
+    def closeEvent(self, event):
+        self.batch_timer.stop()
+        super().closeEvent(event)
+
+
+class ColumnPickerDialog(QDialog):
+    """
+    Lets the user pick which LTB columns are shown. Dialog ID is always shown.
+    """
+
+    def __init__(self, parent, column_count: int, shown_columns: Set[int]):
+        super().__init__(parent)
+        self.setWindowTitle("Columns")
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.checkboxes: List[QCheckBox] = []
+        for column in range(column_count):
+            checkbox = QCheckBox(f"{column}: {column_name(column)}")
+            checkbox.setChecked(column in shown_columns or column == 0)
+            checkbox.setEnabled(column != 0)  # Dialog ID is needed to save the file
+            layout.addWidget(checkbox)
+            self.checkboxes.append(checkbox)
+
+        button_layout = QHBoxLayout()
+        ok_button = QPushButton("OK")
+        ok_button.clicked.connect(self.accept)
+        button_layout.addWidget(ok_button)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+    def selected_columns(self) -> List[int]:
+        return [column for column, checkbox in enumerate(self.checkboxes) if checkbox.isChecked()]
+
+
 class LTBEditor(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -97,8 +831,11 @@ class LTBEditor(QMainWindow):
         # Initialize LTBFile instance
         self.ltb = LTBFile()
 
-        # Define which columns to display (0 and 2)
-        self.display_columns = [0, 2]  # Adjust as needed
+        # LTB columns loaded into the table, in file order. Columns picked in the
+        # Columns dialog are decoded and added when first shown; unticking one
+        # only hides it, so its edits are kept and saved.
+        self.display_columns = list(DEFAULT_DISPLAY_COLUMNS)
+        self.hidden_columns: Set[int] = set()
 
         # Create central widget
         central_widget = QWidget()
@@ -145,6 +882,19 @@ class LTBEditor(QMainWindow):
         self.generate_dialog_button.clicked.connect(self.generate_dialogue)  # Connect to the existing method
         button_layout.addWidget(self.generate_dialog_button)
 
+        # Column picker button
+        self.columns_button = QPushButton("Columns...")
+        self.columns_button.setFixedSize(100, 30)
+        self.columns_button.clicked.connect(self.choose_columns)
+        button_layout.addWidget(self.columns_button)
+
+        # Jump to Dialog ID box
+        self.goto_id_box = QLineEdit()
+        self.goto_id_box.setPlaceholderText("Go to Dialog ID...")
+        self.goto_id_box.setFixedWidth(160)
+        self.goto_id_box.returnPressed.connect(self.jump_to_dialog_id)
+        button_layout.addWidget(self.goto_id_box)
+
         button_layout.addStretch()  # Add stretch to push the buttons to the left (optional)
         layout.addLayout(button_layout)
 
@@ -158,8 +908,32 @@ class LTBEditor(QMainWindow):
         # Setup menu
         self.create_menu()
 
-        # Initialize model as None
+        # Initialize model and undo history as None
         self.model = None
+        self.undo_stack = None
+
+        # In-memory SQL copy of the table for the query window, see get_sql_database
+        self.sql_database: Optional[RoseDatabase] = None
+        self.sql_version: Optional[Tuple[LTBTableModel, int]] = None  # Model and version it was built from
+
+        # Dialogue generation running in the background
+        self.generation: Optional[GenerationThread] = None
+        self.generation_jobs: List[Tuple[int, str, str]] = []  # (full-table row, dialog id, NPC name) per spec
+        self.generation_model: Optional[LTBTableModel] = None
+        self.generation_choice = ""
+        self.generation_timer = QTimer(self)
+        self.generation_timer.setInterval(100)
+        self.generation_timer.timeout.connect(self.poll_generation)
+
+        # Reloading the open file when another program changes it (see poll_watcher)
+        self.watcher: Optional[FileWatcher] = None
+        self.reloader = None
+        self.reload_columns: List[int] = []  # display_columns the running reload decodes
+        self.disk_rows: Optional[List[tuple]] = None  # Rows of the file as last loaded, saved or reloaded
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(WATCH_POLL_MS)
+        self.watch_timer.timeout.connect(self.poll_watcher)
+        self.watch_timer.start()
 
     def add_row(self):
         """
@@ -172,18 +946,18 @@ class LTBEditor(QMainWindow):
         # Define default values for the new row
         new_row = [""] * len(self.display_columns)
 
-        # Add the row to the model's data
-        self.model.table_data.append(new_row)
-
-        # Emit a signal to inform the view of the update
-        self.model.layoutChanged.emit()
+        # Add the row to the model's data (this also updates the Dialog ID index)
+        self.model.append_row(new_row)
+        if self.undo_stack:
+            self.undo_stack.record(self.model.rowCount() - 1, None, None, list(new_row))
 
-        # Scroll to the new row
-        new_row_index = self.model.rowCount() - 1
+        # Scroll to the new row (in a sorted view it is shown at its sorted position)
+        new_row_index = self.model.view_row(self.model.rowCount() - 1)
         self.table_view.scrollTo(self.model.index(new_row_index, 0))
 
         self.statusBar().showMessage("Added a new row.")
 
+    @profiling.profiled('ltb.search')
     def filter_table(self):
         """
         Filters the table based on the search query.
@@ -191,27 +965,104 @@ class LTBEditor(QMainWindow):
         query = self.search_box.text().strip().lower()
         if not self.model or not query:
             self.table_view.setModel(self.model)
+            self.apply_column_visibility()
             return
 
         filtered_data = []
-        for row in self.model.table_data:
+        filtered_rows = []
+        table_data = self.model.table_data
+        for row_index in self.model.sorted_rows():  # Keep the current sort order
+            row = table_data[row_index]
             # Check if any cell in the visible columns matches the query
             if any(query in (cell or "").lower() for cell in row):
                 filtered_data.append(row)
+                filtered_rows.append(row_index)
 
-        # Create a new model with filtered data
+        # Create a new model with filtered data, sharing the Dialog ID index of the full table
         headers = self.get_headers()
-        filtered_model = LTBTableModel(filtered_data, headers)
+        filtered_model = LTBTableModel(filtered_data, headers, self.model.key_column,
+                                       source_model=self.model, source_rows=filtered_rows)
+        filtered_model.set_sort_spec(self.model.sort_spec, presorted=True)
         self.table_view.setModel(filtered_model)
+        self.apply_column_visibility()
 
         self.statusBar().showMessage(f"Filtered results for '{query}'")
 
+    def jump_to_dialog_id(self):
+        """
+        Selects the row holding the Dialog ID typed in the "Go to" box.
+        """
+        dialog_id = self.goto_id_box.text().strip()
+        if not self.model or not dialog_id:
+            return
+
+        rows = self.model.rows_for_key(dialog_id)
+        if not rows:
+            self.statusBar().showMessage(f"Dialog ID '{dialog_id}' not found.")
+            return
+
+        # Row numbers in the index refer to the full table
+        if self.table_view.model() is not self.model:
+            self.clear_search()
+        row = min(rows)
+        model_index = self.model.index(self.model.view_row(row), self.model.key_column)
+        self.table_view.setCurrentIndex(model_index)
+        self.table_view.scrollTo(model_index)
+
+        if len(rows) > 1:
+            self.statusBar().showMessage(f"Dialog ID '{dialog_id}' is used by {len(rows)} rows.")
+        else:
+            self.statusBar().showMessage(f"Jumped to Dialog ID '{dialog_id}' (row {row + 1}).")
+
+    def choose_columns(self):
+        """
+        Shows the column picker and applies the choice: new columns are decoded
+        on their own and spliced into the table, unticked ones are hidden.
+        """
+        if not self.model:
+            QMessageBox.warning(self, "Error", "No table loaded. Import a file first.")
+            return
+        shown = set(self.display_columns) - self.hidden_columns
+        dialog = ColumnPickerDialog(self, self.ltb.columns, shown)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+
+        selected = set(dialog.selected_columns()) | {0}
+        for column in sorted(selected - set(self.display_columns)):
+            self.add_display_column(column)
+        self.hidden_columns = set(self.display_columns) - selected
+        self.apply_column_visibility()
+        self.statusBar().showMessage(f"Showing {len(selected)} column(s).")
+
+    def add_display_column(self, column: int):
+        """
+        Decodes one more LTB column and inserts it into the table.
+        """
+        if column in self.display_columns or column >= self.ltb.columns:
+            return
+        position = bisect.bisect(self.display_columns, column)
+        values = self.ltb.decode_column(column)
+        self.model.insert_column(position, column_name(column), values)
+        if self.disk_rows is not None:
+            # Keep the base of the next merge in step (self.ltb is the version on disk)
+            self.disk_rows = [row[:position] + (value,) + row[position:]
+                              for row, value in zip(self.disk_rows, values)]
+        self.display_columns.insert(position, column)
+        self.model.column_ids = list(self.display_columns)
+        if self.table_view.model() is not self.model:
+            self.filter_table()  # The filtered view holds its own headers
+
+    def apply_column_visibility(self):
+        for model_column, column in enumerate(self.display_columns):
+            self.table_view.setColumnHidden(model_column, column in self.hidden_columns)
+
     def clear_search(self):
         """
         Clears the search box and restores the original table view.
         """
         self.search_box.clear()
         self.table_view.setModel(self.model)
+        self.apply_column_visibility()
         self.statusBar().showMessage("Cleared search and restored full table.")
 
     def create_menu(self):
@@ -237,14 +1088,267 @@ class LTBEditor(QMainWindow):
         export_csv_action.triggered.connect(self.export_to_csv)
         file_menu.addAction(export_csv_action)
 
+        restore_backup_action = QAction("Restore Backup...", self)
+        restore_backup_action.triggered.connect(self.restore_backup)
+        file_menu.addAction(restore_backup_action)
+
         export_column_action = QAction("Export Column to Text File", self)
         export_column_action.triggered.connect(self.export_column_to_text)
         file_menu.addAction(export_column_action)
 
+        self.watch_action = QAction("Watch for External Changes", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.setChecked(True)
+        self.watch_action.toggled.connect(self.toggle_watching)
+        file_menu.addAction(self.watch_action)
+
+        export_profile_action = QAction("Export Profile...", self)
+        export_profile_action.triggered.connect(self.export_profile)
+        file_menu.addAction(export_profile_action)
+
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
+        # Edit Menu
+        edit_menu = menubar.addMenu("Edit")
+
+        undo_action = QAction("Undo", self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(undo_action)
+
+        redo_action = QAction("Redo", self)
+        redo_action.setShortcut(QKeySequence.Redo)
+        redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(redo_action)
+
+        find_replace_action = QAction("Find and Replace...", self)
+        find_replace_action.setShortcut(QKeySequence.Replace)
+        find_replace_action.triggered.connect(self.show_find_replace)
+        edit_menu.addAction(find_replace_action)
+
+        # Tools Menu
+        tools_menu = menubar.addMenu("Tools")
+
+        sql_query_action = QAction("SQL Query...", self)
+        sql_query_action.triggered.connect(self.show_sql_query)
+        tools_menu.addAction(sql_query_action)
+
+    def export_profile(self):
+        """
+        Saves the timings and counters recorded so far as a JSON report or a
+        Chrome trace (profiling is on when ROSE_PROFILE is set).
+        """
+        if not profiling.is_enabled():
+            QMessageBox.information(self, "Export Profile",
+                                    "Profiling is off. Start the editor with the environment variable "
+                                    "ROSE_PROFILE=1 to record load, decode, search, save and AI request timings.")
+            return
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Profile", "", "JSON report (*.json);;Chrome trace (*.trace.json)")
+        if not file_path:
+            return
+        try:
+            profiling.export(file_path, chrome_trace=selected_filter.startswith("Chrome")
+                             or profiling.is_chrome_trace_path(file_path))
+        except OSError as e:
+            QMessageBox.critical(self, "Export Profile", f"Failed to write the profile:\n{str(e)}")
+            return
+        logging.info("Profile summary:\n%s", profiling.format_summary())
+        self.statusBar().showMessage(f"Profile exported to {file_path}")
+
+    def undo(self):
+        with self.deferred_sort():
+            step = self.undo_stack.undo() if self.undo_stack else None
+        self.statusBar().showMessage(f"Undid: {step.label}" if step else "Nothing to undo.")
+        self.refresh_after_history_change()
+
+    def redo(self):
+        with self.deferred_sort():
+            step = self.undo_stack.redo() if self.undo_stack else None
+        self.statusBar().showMessage(f"Redid: {step.label}" if step else "Nothing to redo.")
+        self.refresh_after_history_change()
+
+    @contextmanager
+    def deferred_sort(self):
+        """LTBTableModel.deferred_sort of the full table, if one is loaded."""
+        if self.model is None:
+            yield
+            return
+        with self.model.deferred_sort():
+            yield
+
+    def refresh_after_history_change(self):
+        # A filtered view holds its own row list, rebuild it so added/removed rows show up
+        if self.model and self.table_view.model() is not self.model:
+            self.filter_table()
+
+    def show_find_replace(self):
+        if not self.model:
+            QMessageBox.warning(self, "Error", "No table loaded. Import a file first.")
+            return
+        FindReplaceDialog(self).show()
+
+    def get_sql_database(self) -> RoseDatabase:
+        """
+        Returns the loaded columns as an in-memory SQL table, building it again
+        when the table was edited since the last query.
+        """
+        if self.sql_database is None or self.sql_version != (self.model, self.model.version):
+            current_file = getattr(self, 'current_file', None)
+            self.sql_database = RoseDatabase()
+            self.sql_database.add_table(table_name_for(current_file or 'ltb'),
+                                        [f'col{column}' for column in self.display_columns],
+                                        self.model.table_data, ['col0'], current_file)
+            self.sql_version = (self.model, self.model.version)
+        return self.sql_database
+
+    def show_sql_query(self):
+        if not self.model:
+            QMessageBox.warning(self, "Error", "No table loaded. Import a file first.")
+            return
+        SqlQueryDialog(self, table_name_for(getattr(self, 'current_file', None) or 'ltb')).show()
+
+    def select_row(self, row: int):
+        """Selects a full-table row, clearing the search if it filters the row out."""
+        if not self.model or row >= len(self.model.table_data):
+            return
+        if self.table_view.model() is not self.model:
+            self.clear_search()
+        model_index = self.model.index(self.model.view_row(row), 0)
+        self.table_view.setCurrentIndex(model_index)
+        self.table_view.scrollTo(model_index)
+
+    def apply_replacements(self, deltas, label: str) -> int:
+        """
+        Applies (row, column, old, new) replacements planned by the find/replace
+        dialog as one undo step. Cells edited since the scan are left alone.
+
+        Returns:
+            int: Number of cells changed.
+        """
+        changed = 0
+        with self.undo_stack.batch(label), self.model.deferred_sort():
+            for row, column, old_value, new_value in deltas:
+                if row >= self.model.rowCount() or self.model.table_data[row][column] != old_value:
+                    continue
+                self.model.set_cell(row, column, new_value)
+                self.model.record_edit(row, column, old_value)
+                changed += 1
+
+        # Notify the model of data changes once instead of per cell
+        self.model.layoutChanged.emit()
+        self.refresh_after_history_change()
+        self.statusBar().showMessage(f"{label}: {changed} cell(s) changed.")
+        return changed
+
+    def apply_undo_delta(self, row: int, column, value):
+        """
+        Writes one side of an undo delta back into the model.
+        A column of None means a whole row was appended (value is None to remove it again).
+        """
+        if column is None:
+            if value is None:
+                self.model.remove_last_row()
+            else:
+                self.model.append_row(list(value))
+            return
+        if column not in self.display_columns:
+            self.add_display_column(column)  # Edited in a column that isn't loaded yet
+            if column not in self.display_columns:
+                return
+        model_column = self.display_columns.index(column)
+        self.model.set_cell(row, model_column, value)
+        model_index = self.model.index(self.model.view_row(row), model_column)
+        self.model.dataChanged.emit(model_index, model_index, [Qt.DisplayRole, Qt.EditRole])
+
+    def start_undo_history(self):
+        """
+        Starts a fresh undo history for the loaded file, offering to recover
+        unsaved edits if the edit journal of a previous session is still there.
+        """
+        if self.undo_stack:
+            self.undo_stack.close_journal()
+        current_file = getattr(self, 'current_file', None)
+        self.undo_stack = UndoStack(
+            self.apply_undo_delta,
+            journal_path=journal_path_for(current_file) if current_file else None,
+            source_path=current_file
+        )
+        if self.model:
+            self.model.undo_stack = self.undo_stack
+            self.model.column_ids = list(self.display_columns)
+
+        if not current_file or not has_journal(current_file):
+            return
+        reply = QMessageBox.question(
+            self,
+            "Recover Edits",
+            "Unsaved edits from a previous session were found for this file.\nDo you want to recover them?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes
+        )
+        if reply != QMessageBox.Yes:
+            self.undo_stack.mark_saved()  # Discard the old journal
+            return
+        try:
+            steps = self.undo_stack.replay_journal()
+            self.statusBar().showMessage(f"Recovered {steps} edit(s) from the previous session.")
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Recover Edits", f"Could not recover edits:\n{str(e)}")
+
+    def restore_backup(self):
+        """
+        Restores a backup made when an LTB file was overwritten.
+        """
+        options = QFileDialog.Options()
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select LTB File to Restore",
+            os.path.dirname(getattr(self, 'current_file', '') or ''),
+            "LTB Files (*.ltb);;All Files (*)",
+            options=options
+        )
+        if not file_path:
+            return
+
+        store = BackupStore.for_file(file_path)
+        backups = store.list_backups(file_path)
+        if not backups:
+            QMessageBox.information(self, "Restore Backup", f"No backups found for {file_path}.")
+            return
+
+        descriptions = [describe_backup(backup) for backup in backups]
+        choice, ok = QInputDialog.getItem(self, "Restore Backup", "Choose the backup to restore:",
+                                          descriptions, 0, False)
+        if not ok:
+            return
+
+        backup = backups[descriptions.index(choice)]
+        reply = QMessageBox.question(
+            self,
+            "Restore Backup",
+            f"Overwrite {file_path} with backup {backup['id']}?\n"
+            "Its current contents are backed up first.",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            previous = store.restore(backup, file_path, keep_current=True)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Restore Backup", f"Failed to restore backup:\n{str(e)}")
+            return
+        message = f"Restored backup {backup['id']} to {file_path}"
+        if previous:
+            message += f"\nThe contents it replaced were backed up as {previous['id']}."
+        if os.path.abspath(file_path) == os.path.abspath(getattr(self, 'current_file', '') or ''):
+            message += "\nImport the file again to see the restored contents."
+        QMessageBox.information(self, "Restore Backup", message)
+        self.statusBar().showMessage(f"Restored backup {backup['id']} to {file_path}")
+
     def export_column_to_text(self):
         """
         Exports the content of a selected column to a text file.
@@ -308,8 +1412,9 @@ class LTBEditor(QMainWindow):
             if reply == QMessageBox.Yes:
                 current_file = getattr(self, 'current_file', None)
                 if current_file:
+                    self.stop_watching()
                     try:
-                        self.ltb = LTBFile.read(current_file, encoding=encoding)
+                        self.ltb = LTBFile.read_cached(current_file, encoding=encoding)
                         self.populate_table()
                         self.statusBar().showMessage(f"Reloaded {current_file} with encoding {encoding}")
                     except Exception as e:
@@ -337,7 +1442,7 @@ class LTBEditor(QMainWindow):
         if file_path:
             try:
                 encoding = self.encoding_combo.currentText()
-                self.ltb = LTBFile.read(file_path, encoding=encoding)
+                self.ltb = LTBFile.read_cached(file_path, encoding=encoding)
                 self.current_file = file_path  # Store current file path
                 self.populate_table()
                 self.statusBar().showMessage(f"Imported {file_path} with encoding {encoding}")
@@ -362,14 +1467,29 @@ class LTBEditor(QMainWindow):
             options=options
         )
         if file_path:
+            watched = self.watcher is not None and self.watcher.watches(file_path)
+            if watched and self.watcher.changed_on_disk():
+                reply = QMessageBox.question(
+                    self,
+                    "File Changed on Disk",
+                    f"{os.path.basename(file_path)} was changed on disk by another program, and those changes "
+                    "are not in the editor.\nDo you want to overwrite them?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    return
             try:
-                backup_path = None  # Initialize backup_path
+                backup = None  # Initialize backup
 
-                # Create backup if file exists
+                # Create backup if file exists. Only chunks that changed since the
+                # previous backup are stored, and the oldest backups are pruned.
                 if os.path.exists(file_path):
-                    backup_path = f"{file_path}.backup_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    shutil.copyfile(file_path, backup_path)
-                    logging.info(f"Backup created at {backup_path}")  # Replace with logging if preferred
+                    store = BackupStore.for_file(file_path)
+                    backup = store.backup(file_path)
+                    store.prune(file_path)
+                    logging.info(f"Backup {backup['id']} created in {store.root} "
+                                 f"({backup['stored_bytes']} new bytes stored)")
 
                 # Confirm overwrite
                 if os.path.exists(file_path):
@@ -390,11 +1510,21 @@ class LTBEditor(QMainWindow):
                 self.ltb.rows = len(updated_table_data)
 
                 # Write back to the specified file with updates
-                self.ltb.write_with_update(file_path, updated_table_data, self.display_columns)
+                with profiling.span('ltb.save', rows=len(updated_table_data)):
+                    self.ltb.write_with_update(file_path, updated_table_data, self.display_columns)
+
+                # The edits are on disk now, the crash-recovery journal is no longer needed
+                if self.undo_stack:
+                    self.undo_stack.mark_saved(file_path)
+                if watched:
+                    self.stop_reload()  # Whatever it read is older than what was just written
+                    self.disk_rows = snapshot_rows(updated_table_data)
+                    self.watcher.mark_synced()
 
                 # Prepare the success message
-                if backup_path:
-                    success_message = f"File exported successfully to {file_path}\nBackup created at {backup_path}"
+                if backup:
+                    success_message = (f"File exported successfully to {file_path}\n"
+                                       f"Backup {backup['id']} created (File > Restore Backup to recover it)")
                 else:
                     success_message = f"File exported successfully to {file_path}"
 
@@ -405,21 +1535,24 @@ class LTBEditor(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export LTB file:\n{str(e)}")
 
+    @profiling.profiled('ltb.populate')
     def populate_table(self):
-        # Debugging statements
-        logging.info("Available attributes in LTBFile: %s", dir(self.ltb))
-        logging.info("Type of self.ltb: %s", type(self.ltb))
-
-        table_data = self.ltb.to_string_table(self.display_columns)  # Ensure no space here
+        # Keep the chosen columns that exist in this file; Dialog ID always comes first
+        self.display_columns = sorted({0} | {col for col in self.display_columns if col < self.ltb.columns})
+        self.hidden_columns &= set(self.display_columns)
+        table_data = self.ltb.to_string_table(self.display_columns)  # Only the chosen columns are decoded
         if not table_data:
             self.model = None
             self.table_view.setModel(None)
             return
         headers = self.get_headers()
-        self.model = LTBTableModel(table_data, headers)
+        key_column = self.display_columns.index(0) if 0 in self.display_columns else None
+        self.model = LTBTableModel(table_data, headers, key_column)
         self.table_view.setModel(self.model)
+        self.apply_column_visibility()
 
-        # Enable sorting
+        # Enable sorting (clicking a header sorts the view; the file keeps its order)
+        self.table_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)  # Start in file order
         self.table_view.setSortingEnabled(True)
 
         # Resize columns to fit content
@@ -434,6 +1567,162 @@ class LTBEditor(QMainWindow):
         delegate = MultiLineDelegate()
         self.table_view.setItemDelegate(delegate)
 
+        self.start_watching()  # Before recovered edits are replayed
+        self.start_undo_history()
+
+    def start_watching(self):
+        """Watches the loaded file for changes made by other programs."""
+        self.stop_watching()
+        current_file = getattr(self, 'current_file', None)
+        if not current_file or not self.model:
+            return
+        self.watcher = FileWatcher(current_file)
+        self.disk_rows = snapshot_rows(self.model.table_data)
+        if self.watch_action.isChecked():
+            self.watcher.start()
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.stop_reload()
+        self.disk_rows = None
+
+    def stop_reload(self):
+        if self.reloader is not None:
+            self.reloader.cancel()
+            self.reloader = None
+
+    def toggle_watching(self, checked: bool):
+        if self.watcher is None:
+            return
+        if checked:
+            self.watcher.start()
+        else:
+            self.watcher.stop()
+            self.stop_reload()
+
+    def poll_watcher(self):
+        """
+        Runs every WATCH_POLL_MS: when another program changed the open file,
+        reads it again in the background and merges the changed rows in.
+        """
+        if self.watcher is None or self.model is None:
+            return
+        if (self.generation is not None or QApplication.activeModalWidget() is not None
+                or self.table_view.state() == QAbstractItemView.EditingState):
+            return  # Row numbers are in use (generation, a dialog, a cell editor), wait until done
+        if self.reloader is None:
+            if self.watch_action.isChecked() and self.watcher.poll():
+                self.reload_columns = list(self.display_columns)
+                encoding = self.encoding_combo.currentText()
+                self.reloader = start_reload(
+                    self.watcher.file_path,
+                    lambda path: read_ltb_rows(path, encoding, self.reload_columns), self.disk_rows)
+                self.statusBar().showMessage(f"{os.path.basename(self.watcher.file_path)} changed on disk, reloading...")
+            return
+        chunks, finished = self.reloader.poll()
+        if not finished:
+            return
+        reloader, self.reloader = self.reloader, None
+        if reloader.error is not None or not chunks:
+            self.statusBar().showMessage(
+                f"Failed to reload {os.path.basename(self.watcher.file_path)}: {str(reloader.error)}")
+            return
+        if self.reload_columns != self.display_columns:
+            self.watcher.recheck()  # A column was added meanwhile, read the file again
+            return
+        self.apply_disk_changes(*chunks[0])
+
+    def apply_disk_changes(self, new_ltb: LTBFile, new_rows: List[List[str]], pairs, signature):
+        """
+        Merges the version of the file now on disk into the table. Rows only
+        changed on disk are updated in place; cells also edited here are
+        conflicts, resolved by the user.
+        """
+        file_name = os.path.basename(self.watcher.file_path)
+        merge = merge_rows(self.disk_rows, self.model.table_data, new_rows, pairs=pairs)
+        if merge.conflicts:
+            reply = QMessageBox.question(
+                self,
+                "File Changed on Disk",
+                conflict_prompt(file_name, merge, self.get_headers()),
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                QMessageBox.Yes
+            )
+            if reply == QMessageBox.Cancel:
+                self.statusBar().showMessage(f"{file_name} changed on disk, not reloaded.")
+                return
+            if reply == QMessageBox.No:
+                merge = merge_rows(self.disk_rows, self.model.table_data, new_rows, keep_ours=False, pairs=pairs)
+
+        with profiling.span('ltb.reload', changed=len(merge.changed_rows), moved=merge.rows_moved):
+            if merge.rows_moved:
+                self.replace_table_rows(merge.rows, merge.row_map())
+            else:
+                model = self.model
+                with model.deferred_sort():
+                    for row in merge.changed_rows:
+                        for column, value in enumerate(merge.rows[row]):
+                            if model.table_data[row][column] != value:
+                                model.set_cell(row, column, value)
+                for row in merge.changed_rows:
+                    view_row = model.view_row(row)
+                    model.dataChanged.emit(model.index(view_row, 0), model.index(view_row, model.columnCount() - 1),
+                                           [Qt.DisplayRole, Qt.EditRole])
+                if merge.changed_rows:
+                    self.refresh_after_history_change()  # Changed rows may now match the search, or no longer
+        self.ltb = new_ltb  # Columns that aren't shown are saved from the new version
+        self.disk_rows = snapshot_rows(new_rows)
+        self.watcher.mark_synced(signature)
+
+        # Row numbers of the undo history and the journal belong to the previous
+        # version of the file: start over, with the unsaved edits kept as one step
+        if self.undo_stack:
+            self.undo_stack.mark_saved()
+        self.start_undo_history()
+        with self.undo_stack.batch("Unsaved Edits"):
+            for row, column, disk_value, value in merge.kept_edits:
+                self.undo_stack.record(row, None if column is None else self.display_columns[column],
+                                       disk_value, value)
+
+        message = f"Reloaded {file_name} from disk: {len(merge.changed_rows)} row(s) updated"
+        if merge.removed_rows:
+            message += f", {len(merge.removed_rows)} removed"
+        if merge.conflicts:
+            message += f", {len(merge.conflicts)} conflict(s) resolved"
+        self.statusBar().showMessage(message + ".")
+
+    def replace_table_rows(self, table_data: List[List[str]], row_map: Dict[int, int]):
+        """
+        Shows a reloaded table whose rows moved, keeping the sort order,
+        search, selected rows and scroll position. `row_map` maps old rows
+        to new ones.
+        """
+        view_model = self.table_view.model()
+        selected = {row_map.get(view_model._owner_row(view_model.data_row(index.row())))
+                    for index in self.table_view.selectionModel().selectedRows()}
+        scroll = self.table_view.verticalScrollBar().value()
+
+        model = LTBTableModel(table_data, self.get_headers(), self.model.key_column)
+        if self.model.sort_spec:
+            model.set_sort_spec(self.model.sort_spec)
+        self.model = model
+        self.table_view.setModel(model)
+        self.apply_column_visibility()
+        self.refresh_after_history_change()
+
+        view_model = self.table_view.model()
+        view_rows = {row: view_row for view_row, row in enumerate(view_model.sorted_rows())}
+        if view_model.source_rows is not None:  # Filtered view: its rows are positions in source_rows
+            view_rows = {view_model.source_rows[row]: view_row for row, view_row in view_rows.items()}
+        selection_model = self.table_view.selectionModel()
+        for row in selected:
+            if row in view_rows:
+                selection_model.select(view_model.index(view_rows[row], 0),
+                                       QItemSelectionModel.Select | QItemSelectionModel.Rows)
+        self.table_view.verticalScrollBar().setValue(scroll)
+
     def extract_table_data(self) -> List[List[str]]:
         """
         Extracts the edited data from the table.
@@ -444,25 +1733,12 @@ class LTBEditor(QMainWindow):
 
     def get_headers(self) -> List[str]:
         """
-        Retrieve headers for the selected columns.
-        Modify this method if you have specific header names.
+        Retrieve headers for the loaded columns (names come from COLUMN_NAMES).
         """
-        headers = []
-        for col in self.display_columns:
-            if col == 0:
-                headers.append("Dialog ID")
-            elif col == 2:
-                headers.append("English Dialogue")
-            else:
-                headers.append(f"Col {col}")
-        return headers
+        return [column_name(col) for col in self.display_columns]
 
     def validate_unique_dialog_ids(self) -> bool:
-        dialog_ids = set()
-        duplicates = set()
-        try:
-            dialog_id_col = self.display_columns.index(0)  # Assuming column 0 is "Dialog ID"
-        except ValueError:
+        if 0 not in self.display_columns:  # Column 0 is "Dialog ID"
             QMessageBox.critical(
                 self,
                 "Configuration Error",
@@ -470,16 +1746,8 @@ class LTBEditor(QMainWindow):
             )
             return False
 
-        for row in range(self.model.rowCount() if self.model else 0):
-            index = self.model.index(row, dialog_id_col)
-            dialog_id = self.model.data(index, Qt.DisplayRole).strip()
-            if not dialog_id:
-                continue  # Skip empty Dialog IDs
-            if dialog_id in dialog_ids:
-                duplicates.add(dialog_id)
-            else:
-                dialog_ids.add(dialog_id)
-
+        # The model keeps its duplicate set up to date on every edit
+        duplicates = sorted(self.model.duplicate_keys) if self.model else []
         if duplicates:
             QMessageBox.critical(
                 self,
@@ -492,7 +1760,7 @@ class LTBEditor(QMainWindow):
 
     def export_to_csv(self):
         """
-        Exports selected columns (e.g., Dialog ID and English language) to a CSV file.
+        Exports the shown columns (Dialog ID first) to a CSV file.
         """
         if not self.model:
             QMessageBox.warning(self, "Export Error", "No table loaded. Please import a file first.")
@@ -511,20 +1779,20 @@ class LTBEditor(QMainWindow):
             return  # User canceled the dialog
 
         try:
-            # Determine indices for Dialog ID and English language columns
-            dialog_id_index = self.display_columns.index(0)  # Column 0: Dialog ID
-            english_index = self.display_columns.index(2)  # Column 2: English Dialogue
+            # Model indices of the shown columns
+            export_indexes = [index for index, col in enumerate(self.display_columns)
+                              if col not in self.hidden_columns]
 
             # Extract the data from the model
             data_to_export = [
-                [self.model.table_data[row][dialog_id_index], self.model.table_data[row][english_index]]
-                for row in range(self.model.rowCount())
+                [row_data[index] for index in export_indexes]
+                for row_data in self.model.table_data
             ]
 
             # Write the data to a CSV file
             with open(file_path, mode='w', encoding='utf-8', newline='') as csv_file:
                 writer = csv.writer(csv_file)
-                writer.writerow(["Dialog ID", "English Dialogue"])  # Header row
+                writer.writerow([column_name(self.display_columns[index]) for index in export_indexes])  # Header row
                 writer.writerows(data_to_export)
 
             QMessageBox.information(self, "Export Successful", f"Data exported successfully to {file_path}")
@@ -534,7 +1802,9 @@ class LTBEditor(QMainWindow):
 
     def import_from_csv(self):
         """
-        Imports data from a CSV file and updates columns 0 (Dialog ID) and 2 (English Dialogue).
+        Imports data from a CSV file. The first CSV column must be Dialog ID; the
+        other CSV columns are matched to LTB columns by header name (as exported
+        by Export to CSV, e.g. "English Dialogue" or "Korean").
         """
         if not self.model:
             QMessageBox.warning(self, "Import Error", "No table loaded. Please import a file first.")
@@ -558,11 +1828,19 @@ class LTBEditor(QMainWindow):
                 header = next(reader, None)  # Read the header row
 
                 # Validate CSV structure
-                if header is None or len(header) < 2 or header[0].lower() != "dialog id" or header[
-                    1].lower() != "english dialogue":
+                if header is None or len(header) < 2 or header[0].strip().lower() != "dialog id":
                     QMessageBox.critical(self, "Import Error",
-                                         "Invalid CSV format. Ensure the first two columns are 'Dialog ID' and 'English Dialogue'.")
+                                         "Invalid CSV format. Ensure the first column is 'Dialog ID', followed by the language columns.")
                     return
+                columns_by_name = {column_name(col).lower(): col for col in range(self.ltb.columns)}
+                csv_columns = [columns_by_name.get(name.strip().lower()) for name in header]
+                unknown = [name for name, col in zip(header, csv_columns) if col is None]
+                if unknown:
+                    QMessageBox.critical(self, "Import Error",
+                                         f"Unknown column(s) in the CSV header: {', '.join(unknown)}.")
+                    return
+                for col in csv_columns:
+                    self.add_display_column(col)  # Load columns that aren't in the table yet
 
                 # Read the CSV data into a list
                 csv_data = list(reader)
@@ -575,17 +1853,19 @@ class LTBEditor(QMainWindow):
                         f"The CSV contains {len(csv_data)} rows, but the table has {self.model.rowCount()} rows. Extra rows in the CSV will be ignored."
                     )
 
-                # Update the table with CSV data
-                for row_index, row in enumerate(csv_data):
-                    if row_index >= self.model.rowCount():
-                        break  # Stop if the CSV has more rows than the table
-                    if len(row) < 2:
-                        continue  # Skip rows with insufficient columns
-                    dialog_id_index = self.display_columns.index(0)
-                    english_index = self.display_columns.index(2)
+                # Update the table with CSV data, as a single undo step
+                model_indexes = [self.display_columns.index(col) for col in csv_columns]
+                with self.undo_stack.batch("Import from CSV"), self.model.deferred_sort():
+                    for row_index, row in enumerate(csv_data):
+                        if row_index >= self.model.rowCount():
+                            break  # Stop if the CSV has more rows than the table
+                        if len(row) < 2:
+                            continue  # Skip rows with insufficient columns
 
-                    self.model.table_data[row_index][dialog_id_index] = row[0]  # Update Dialog ID
-                    self.model.table_data[row_index][english_index] = row[1]  # Update English Dialogue
+                        for column_index, value in zip(model_indexes, row):
+                            old_value = self.model.table_data[row_index][column_index]
+                            self.model.set_cell(row_index, column_index, value)
+                            self.model.record_edit(row_index, column_index, old_value)
 
                 # Notify the model of data changes
                 self.model.layoutChanged.emit()
@@ -598,11 +1878,23 @@ class LTBEditor(QMainWindow):
         """
         Generates a dialogue for the selected NPC based on its role and name.
         """
+        if self.generation is not None:
+            QMessageBox.warning(self, "Generation Running", "Wait for the current dialogue generation to finish.")
+            return
         selected_indexes = self.table_view.selectionModel().selectedRows()
         if not selected_indexes:
             QMessageBox.warning(self, "No Selection", "Please select at least one NPC to generate dialogue.")
             return
 
+        # Full-table rows of the selection (the view may show a filtered model); rows on screen are generated first
+        view_model = self.table_view.model()
+        first_visible = self.table_view.rowAt(0)
+        last_visible = self.table_view.rowAt(self.table_view.viewport().height() - 1)
+        if last_visible < 0:
+            last_visible = view_model.rowCount() - 1
+        selected = [(view_model._owner_row(view_model.data_row(index.row())),
+                     first_visible <= index.row() <= last_visible) for index in selected_indexes]
+
         # First, ask user which model to use
         model_choice, ok = QInputDialog.getItem(
             self,
@@ -617,13 +1909,20 @@ class LTBEditor(QMainWindow):
 
         use_assistant = model_choice == "AiRose Assistant"
 
-        # Iterate over selected NPCs
-        for index in selected_indexes:
-            row = index.row()
-
-            # Assuming column 0 is "Dialog ID" and column 2 is "English Dialogue"
+        # Generated lines go to the English column, load it if it isn't shown
+        self.add_display_column(2)
+        if 2 not in self.display_columns:
+            QMessageBox.warning(self, "Generation Failed", "This file has no English column (column 2).")
+            return
+        self.hidden_columns.discard(2)
+        self.apply_column_visibility()
+
+        # Ask for every NPC's details first, so the lines can be generated in batches
+        jobs = []
+        specs = []
+        for row, on_screen in selected:
+            # Column 0 is "Dialog ID" and column 2 is "English Dialogue"
             dialog_id = self.model.table_data[row][self.display_columns.index(0)]
-            current_dialogue = self.model.table_data[row][self.display_columns.index(2)]
 
             # Prompt user for NPC details
             npc_name, ok = QInputDialog.getText(self, "NPC Name", f"Enter the name for NPC with Dialog ID {dialog_id}:")
@@ -647,15 +1946,83 @@ class LTBEditor(QMainWindow):
             else:
                 context = context.strip() if context.strip() else None
 
-            # Generate dialogue using selected model
-            dialogue = self.ltb.generate_dialogue(npc_role, npc_name, context, use_assistant)
-            if dialogue:
-                self.model.table_data[row][self.display_columns.index(2)] = dialogue
-                model_index = self.model.index(row, self.display_columns.index(2))
-                self.model.dataChanged.emit(model_index, model_index, [Qt.DisplayRole, Qt.EditRole])
-                logging.info(f"Dialogue generated for NPC '{npc_name}' (Dialog ID {dialog_id}) using {model_choice}.")
-            else:
-                QMessageBox.critical(self, "Generation Failed",
-                                     f"Failed to generate dialogue for NPC '{npc_name}' (Dialog ID {dialog_id}). Check logs for details.")
+            jobs.append((row, dialog_id, npc_name))
+            specs.append({'npc_name': npc_name, 'npc_role': npc_role, 'context': context,
+                          'priority': 0 if on_screen else 1})
+
+        if not specs:
+            return
+
+        # Generate dialogue using selected model, several NPCs per request, in the background
+        self.generation = GenerationThread(self.ltb, specs, use_assistant)
+        self.generation_jobs = jobs
+        self.generation_model = self.model
+        self.generation_choice = model_choice
+        self.generate_dialog_button.setEnabled(False)
+        self.statusBar().showMessage(f"Generating {len(specs)} dialogue line(s) using {model_choice}...")
+        self.generation.start()
+        self.generation_timer.start()
+
+    def poll_generation(self):
+        """
+        Shows the lines streamed so far in their cells and, once generation
+        has finished, applies them as one undo step.
+        """
+        generation = self.generation
+        model = self.generation_model
+        still_shown = model is self.model and 2 in self.display_columns
+        english_index = self.display_columns.index(2) if still_shown else None
+        if still_shown:
+            model.previews = {(self.generation_jobs[index][0], english_index): text
+                              for index, text in generation.partial_lines().items()}
+            self.table_view.viewport().update()
+
+        if not generation.done.is_set():
+            counters = rate_limiter.snapshot()
+            self.statusBar().showMessage(
+                f"Generating dialogue using {self.generation_choice}: {len(model.previews)} of "
+                f"{len(self.generation_jobs)} line(s) received, {counters['tokens_per_minute']:.0f} tokens/min, "
+                f"{counters['tokens']} tokens (about ${counters['cost']:.3f}) this session...")
+            return
+
+        self.generation_timer.stop()
+        self.generation = None
+        self.generate_dialog_button.setEnabled(True)
+        model.previews = {}
+        self.table_view.viewport().update()
+        if generation.error is not None:
+            QMessageBox.critical(self, "Generation Failed", f"Dialogue generation failed:\n{str(generation.error)}")
+            return
+        if not still_shown:
+            QMessageBox.warning(self, "Generation Discarded",
+                                "The table was reloaded or its English column removed while dialogue was "
+                                "being generated, so the generated lines were not applied.")
+            return
 
-        self.statusBar().showMessage(f"Dialogue generation completed using {model_choice}.")
\ No newline at end of file
+        failed = []
+        with self.undo_stack.batch("Generate dialogue"), model.deferred_sort():
+            for (row, dialog_id, npc_name), result in zip(self.generation_jobs, generation.results):
+                dialogue = result['dialogue']
+                if not dialogue:
+                    failed.append(f"{npc_name} (Dialog ID {dialog_id})")
+                    continue
+                old_value = model.table_data[row][english_index]
+                model.set_cell(row, english_index, dialogue)
+                model.record_edit(row, english_index, old_value)
+                model_index = model.index(model.view_row(row), english_index)
+                model.dataChanged.emit(model_index, model_index, [Qt.DisplayRole, Qt.EditRole])
+                logging.debug(f"Dialogue generated for NPC '{npc_name}' (Dialog ID {dialog_id}) using "
+                             f"{self.generation_choice}: {result['tokens']} tokens, {result['latency']:.1f}s"
+                             f"{'' if result['batched'] else ' (own request)'}.")
+        self.table_view.viewport().update()
+
+        if failed:
+            QMessageBox.critical(self, "Generation Failed",
+                                 "Failed to generate dialogue for:\n" + "\n".join(failed) + "\nCheck logs for details.")
+
+        stats = generation.stats
+        count = len(self.generation_jobs)
+        self.statusBar().showMessage(
+            f"Dialogue generation completed using {self.generation_choice}: {count - len(failed)} of {count} "
+            f"line(s) in {stats['requests']} request(s), {stats['tokens']} tokens (about ${stats['cost']:.3f}), "
+            f"{stats['seconds']:.1f}s.")
@@ -1,18 +1,109 @@
+import functools
 import struct
-from typing import List, Optional
-import openai
+import sys
+from itertools import accumulate, chain
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
 import os
-from dotenv import load_dotenv
+import json
 import logging
+import re
+import threading
 import time
 
-# Load environment variables from .env file
-load_dotenv()
+# The parse cache and profiling code lives in the Data-Tools folder next to this
+# one, which has to be present.
+DATA_TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data-Tools')
+if DATA_TOOLS_DIR not in sys.path:
+    sys.path.append(DATA_TOOLS_DIR)
+from parsecache import ParseCache
+import profiling
+from ratelimit import RateLimiter, backoff_delay, estimate_tokens, retry_after, with_jitter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Limits of the cell table: string sizes are 16-bit, offsets 32-bit
+MAX_CELL_SIZE = 0xFFFF
+MAX_DATA_END = 0xFFFFFFFF
+
+_env_loaded = False
+
+DIALOGUE_MODEL = "gpt-4o"
+ASSISTANT_ID = "asst_EqgqfB5HpggNuKyq0rqcEUL4"
+DIALOGUE_MAX_TOKENS = 60  # Per generated line
+# NPCs per batched request, and the tokens allowed per line for the JSON around it
+DIALOGUE_BATCH_SIZE = 20
+BATCH_TOKENS_PER_LINE = 20
+
+# Polling of assistant runs, when the SDK can't stream them: seconds before the
+# first check, growth of the interval after each one, and its cap
+RUN_POLL_FIRST = 0.1
+RUN_POLL_GROWTH = 1.5
+RUN_POLL_MAX = 2.0
+
+# Assistant thread kept per NPC, so later lines for it build on the earlier ones
+_assistant_threads: Dict[Hashable, str] = {}
+_assistant_thread_locks: Dict[Hashable, threading.Lock] = {}
+_assistant_threads_lock = threading.Lock()
+
+# A complete {"id": ..., "dialogue": "..."} entry in a batch reply still being streamed
+_STREAMED_LINE = re.compile(r'\{\s*"id"\s*:\s*(\d+)\s*,\s*"dialogue"\s*:\s*("(?:[^"\\]|\\.)*")\s*\}')
+
+# Requests-per-minute and tokens-per-minute budgets shared by all dialogue generation
+rate_limiter = RateLimiter.from_env()
+
+# Structured output of a batched request: one {id, dialogue} entry per NPC
+BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "npc_dialogue_lines",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "lines": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "dialogue": {"type": "string"},
+                        },
+                        "required": ["id", "dialogue"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["lines"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _load_openai():
+    """
+    Imports the OpenAI SDK and loads the .env file on first use.
+    Both are slow to import and most sessions never generate dialogue.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()  # Load environment variables from .env file
+        _env_loaded = True
+    import openai
+    return openai
+
+def _encodable(char: str, encoding: str) -> bool:
+    try:
+        char.encode(encoding)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
 class LTBFile:
     def __init__(self, encoding='utf-16le'):
         self.rows: int = 0
@@ -54,6 +145,7 @@ class LTBFile:
         pass  # No action needed here
 
     @staticmethod
+    @profiling.profiled('ltb.read')
     def read(file_path: str, encoding='utf-16le') -> 'LTBFile':
         ltb = LTBFile(encoding=encoding)
         with open(file_path, 'rb') as f:
@@ -77,75 +169,214 @@ class LTBFile:
             # Read data section
             ltb.data = f.read()
             logger.info(f"Data length (bytes): {len(ltb.data)}")
+            profiling.count('ltb.bytes_read', ltb.data_offset + len(ltb.data))
+
+        return ltb
 
+    @staticmethod
+    def read_cached(file_path: str, encoding='utf-16le') -> 'LTBFile':
+        """
+        Same as read, going through the parse cache when it is enabled.
+        """
+        cache = ParseCache.from_environment()
+        if cache is None:
+            return LTBFile.read(file_path, encoding=encoding)
+
+        # The encoding only matters when decoding, so it is not part of the key
+        state = cache.get_or_parse(file_path, 'ltb', lambda: vars(LTBFile.read(file_path)))
+        ltb = LTBFile()
+        vars(ltb).update(state)
+        ltb.encoding = encoding
         return ltb
 
     def write_with_update(self, file_path: str, edited_table: List[List[str]], selected_columns: List[int]):
+        """
+        Writes the file, taking the selected columns from the edited table.
+        Every other column is copied byte for byte from the loaded data, so
+        only the edited columns are encoded.
+
+        Args:
+            file_path (str): Output file.
+            edited_table (List[List[str]]): Rows holding the selected columns, in order.
+            selected_columns (List[int]): LTB column of each edited_table column.
+        """
+        unit = self._code_unit()
+        terminator = b'\x00' * unit  # Strings are null-terminated
+        edited_position = {col: idx for idx, col in enumerate(selected_columns)}
+        edited_rows = edited_table[:self.rows]
+
+        # Encode column by column (a list comprehension per column is much
+        # faster than one Python-level step per cell); _set_columns interleaves them by row
+        column_parts = []
+        for col_index in range(self.columns):
+            position = edited_position.get(col_index)
+            if position is not None:
+                encoding = self.encoding
+                encoded = [(value if isinstance(value, str) else str(value)).encode(encoding) + terminator
+                           for value in (row[position] for row in edited_rows)]
+            else:
+                encoded = self._raw_column(col_index, unit)[:len(edited_rows)]
+            column_parts.append(encoded)
+
+        self._set_columns(column_parts)
+        self.write(file_path)
+
+    @profiling.profiled('ltb.write')
+    def write(self, file_path: str):
+        """Writes the file as it is in memory (header, cell table, data)."""
         with open(file_path, 'wb') as f:
-            # Write header
             f.write(struct.pack('<II', self.columns, self.rows))
+            f.write(struct.pack('<' + 'IH' * len(self.cells), *chain.from_iterable(self.cells)))
+            f.write(self.data)
+        profiling.count('ltb.bytes_written', 8 + 6 * len(self.cells) + len(self.data))
+
+    def _set_columns(self, column_parts: List[List[bytes]]):
+        """
+        Rebuilds the cell table and data section from the encoded cells of
+        every column (terminators included). Missing rows get empty strings.
+
+        Raises:
+            ValueError: If a cell or the data section is too large for the
+                format (sizes are 16-bit, offsets 32-bit).
+        """
+        unit = self._code_unit()
+        terminator = b'\x00' * unit
+        for encoded in column_parts:
+            encoded.extend([terminator] * (self.rows - len(encoded)))
+        parts = [part for row_parts in zip(*column_parts) for part in row_parts]
+
+        data_offset = 8 + self.rows * self.columns * 6  # Header, then 6 bytes per cell
+        lengths = [len(part) for part in parts]
+        sizes = lengths if unit == 1 else [length // unit for length in lengths]
+        offsets = list(accumulate(lengths, initial=data_offset))
+        if sizes and max(sizes) > MAX_CELL_SIZE:
+            index = next(index for index, size in enumerate(sizes) if size > MAX_CELL_SIZE)
+            row, column = divmod(index, self.columns)
+            raise ValueError(f"The string at row {row}, column {column} is too long for an LTB file "
+                             f"({sizes[index]} {'bytes' if unit == 1 else 'code units'}, "
+                             f"at most {MAX_CELL_SIZE}).")
+        if offsets[-1] > MAX_DATA_END:
+            raise ValueError(f"The strings are too large for an LTB file ({offsets[-1]} bytes, at most {MAX_DATA_END}).")
+        self.cells = list(zip(offsets, sizes))
+        self.data = b''.join(parts)
+        self.data_offset = data_offset
+
+    @profiling.profiled('ltb.transcode')
+    def transcode(self, encoding: str, problems: Optional[List[dict]] = None) -> 'LTBFile':
+        """
+        Returns a copy of the file with every string re-encoded to another
+        encoding. Sizes are recomputed for the target (UTF-16 code units or
+        EUC-KR bytes, as in get_string). Works on the file as loaded, so the
+        source and the result are both held in memory.
+
+        Characters that can't be decoded from the source or encoded in the
+        target are replaced (U+FFFD / '?') and, if a problems list is given,
+        reported in it as {'row', 'column', 'stage', 'characters'}.
+
+        Args:
+            encoding (str): Target encoding, 'utf-16le' or 'euc-kr'.
+            problems (Optional[List[dict]]): Receives the replaced characters.
+
+        Returns:
+            LTBFile: The transcoded file, in memory.
+        """
+        source_unit = self._code_unit()
+        target = LTBFile(encoding=encoding)
+        target.rows, target.columns = self.rows, self.columns
+        terminator = b'\x00' * target._code_unit()
+        source_encoding = self.encoding
+
+        column_parts = []
+        for column in range(self.columns):
+            raw_cells = self._raw_column(column, source_unit)[:self.rows]
+            try:
+                # Fast path, a single comprehension for the whole column
+                encoded = [raw.decode(source_encoding).rstrip('\x00').encode(encoding) + terminator
+                           for raw in raw_cells]
+            except UnicodeError:
+                encoded = [self._transcode_cell(raw, encoding, row, column, problems) + terminator
+                           for row, raw in enumerate(raw_cells)]
+            column_parts.append(encoded)
+
+        target._set_columns(column_parts)
+        return target
+
+    @staticmethod
+    def from_columns(columns: List[List[str]], encoding='utf-16le') -> 'LTBFile':
+        """
+        Builds a file in memory from the strings of every column, e.g. a table
+        imported from another format. Shorter columns are padded with "".
 
-            # Placeholder for cell definitions
-            cell_definitions = [(0, 0) for _ in range(self.rows * self.columns)]
-            # Write placeholders
-            for cell in cell_definitions:
-                f.write(struct.pack('<IH', cell[0], cell[1]))
-
-            # Record new data_offset
-            new_data_offset = f.tell()
-
-            # Initialize temporary variables
-            temp_new_data = bytearray()
-            temp_new_cells = []
-            current_offset = 0
-
-            for row_index in range(self.rows):
-                for col_index in range(self.columns):
-                    if col_index in selected_columns:
-                        # Get the edited string
-                        edited_string = edited_table[row_index][selected_columns.index(col_index)]
-                        if not isinstance(edited_string, str):
-                            edited_string = str(edited_string)
-
-                        if self.encoding.lower() == 'utf-16le':
-                            encoded = edited_string.encode(self.encoding) + b'\x00\x00'  # Null-terminated
-                            size = len(encoded) // 2
-                        elif self.encoding.lower() == 'euc-kr':
-                            encoded = edited_string.encode(self.encoding) + b'\x00'  # Null-terminated
-                            size = len(encoded)
-                        else:
-                            raise ValueError(f"Unsupported encoding: {self.encoding}")
-                    else:
-                        # Retain the original string
-                        original_string = self.get_string(row_index, col_index)
-                        if not isinstance(original_string, str):
-                            original_string = str(original_string)
-
-                        if self.encoding.lower() == 'utf-16le':
-                            encoded = original_string.encode(self.encoding) + b'\x00\x00'  # Null-terminated
-                            size = len(encoded) // 2
-                        elif self.encoding.lower() == 'euc-kr':
-                            encoded = original_string.encode(self.encoding) + b'\x00'  # Null-terminated
-                            size = len(encoded)
-                        else:
-                            raise ValueError(f"Unsupported encoding: {self.encoding}")
-
-                    # Update cells with new offsets and sizes
-                    temp_new_cells.append((new_data_offset + current_offset, size))
-                    temp_new_data += encoded
-                    current_offset += len(encoded)
-
-            # Write data section
-            f.write(temp_new_data)
-
-            # Now, go back and write the correct cell definitions
-            f.seek(8)  # After header
-            for cell in temp_new_cells:
-                f.write(struct.pack('<IH', cell[0], cell[1]))
-
-            # Update self.cells and self.data
-            self.cells = temp_new_cells
-            self.data = bytes(temp_new_data)
+        Raises:
+            UnicodeEncodeError: If a string can't be encoded in `encoding`.
+        """
+        ltb = LTBFile(encoding=encoding)
+        ltb.columns = len(columns)
+        ltb.rows = max(map(len, columns), default=0)
+        terminator = b'\x00' * ltb._code_unit()
+        ltb._set_columns([[value.encode(encoding) + terminator for value in column] for column in columns])
+        return ltb
+
+    def _transcode_cell(self, raw: bytes, encoding: str, row: int, column: int,
+                        problems: Optional[List[dict]]) -> bytes:
+        """Transcodes one cell, replacing and reporting what doesn't convert."""
+        try:
+            text = raw.decode(self.encoding)
+        except UnicodeDecodeError as e:
+            text = raw.decode(self.encoding, errors='replace')
+            if problems is not None:
+                problems.append({'row': row, 'column': column, 'stage': 'decode',
+                                 'characters': e.object[e.start:e.end].hex(' ')})
+        text = text.rstrip('\x00')
+        try:
+            return text.encode(encoding)
+        except UnicodeEncodeError:
+            if problems is not None:
+                characters = ''.join(dict.fromkeys(char for char in text if not _encodable(char, encoding)))
+                problems.append({'row': row, 'column': column, 'stage': 'encode', 'characters': characters})
+            return text.encode(encoding, errors='replace')
+
+    def _raw_column(self, column: int, unit: int) -> List[bytes]:
+        """Stored bytes of every cell of a column, terminator included ("" cells get just a terminator)."""
+        data, data_offset = self.data, self.data_offset
+        terminator = b'\x00' * unit
+        cells = self.cells[column::self.columns] if self.columns else []
+        return [data[offset - data_offset:offset - data_offset + size * unit]
+                if offset >= data_offset and size else terminator
+                for offset, size in cells]
+
+    def _code_unit(self) -> int:
+        """Bytes per unit of the cell sizes: 2 for UTF-16LE, 1 for EUC-KR."""
+        if self.encoding.lower() == 'utf-16le':
+            return 2
+        if self.encoding.lower() == 'euc-kr':
+            return 1
+        raise ValueError(f"Unsupported encoding: {self.encoding}")
+
+    @profiling.profiled('ltb.decode_column')
+    def decode_column(self, column: int) -> List[str]:
+        """
+        Decodes one column for every row. Empty or undecodable cells become "".
+        Only this column is touched, so adding a column to the view does not
+        decode the others again.
+        """
+        unit = self._code_unit()
+        data, data_offset, encoding = self.data, self.data_offset, self.encoding
+        values = []
+        if self.columns:
+            for row, (offset, size) in enumerate(self.cells[column::self.columns][:self.rows]):
+                if offset < data_offset or size == 0:
+                    values.append("")
+                    continue
+                start = offset - data_offset
+                try:
+                    values.append(data[start:start + size * unit].decode(encoding).rstrip('\x00'))
+                except UnicodeDecodeError as e:
+                    logger.error(f"Error decoding string at row {row}, column {column}: {e}")
+                    values.append("")
+        values.extend([""] * (self.rows - len(values)))
+        profiling.count('ltb.cells_decoded', len(values))
+        return values
 
     def to_string_table(self, selected_columns: List[int]) -> List[List[str]]:
         """
@@ -158,17 +389,14 @@ class LTBFile:
         Returns:
             List[List[str]]: Table data as a list of rows, each row is a list of strings.
         """
-        table = []
-        for row in range(self.rows):
-            row_data = []
-            for col in selected_columns:
-                string = self.get_string(row, col)
-                row_data.append(string if string is not None else "")
-            table.append(row_data)
-        return table
+        if not selected_columns:
+            return [[] for _ in range(self.rows)]
+        columns = [self.decode_column(col) for col in selected_columns]
+        return [list(row) for row in zip(*columns)]
 
     def generate_dialogue(self, npc_role: str, npc_name: str, context: Optional[str] = None,
-                          use_assistant: bool = False) -> Optional[str]:
+                          use_assistant: bool = False,
+                          on_text: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
         Generates a dialogue line for an NPC based on their role and name.
         Args:
@@ -176,79 +404,398 @@ class LTBFile:
             npc_name: The name of the NPC
             context: Optional context for the dialogue
             use_assistant: If True, uses the custom assistant; if False, uses GPT-4
+            on_text: If given, called with the line received so far while it is streamed
         """
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        if not client.api_key:
-            logger.error("OpenAI API key not found. Please set it in the .env file.")
+        openai, client = _openai_client()
+        if client is None:
             return None
 
-        # Define the prompt based on NPC role
-        prompt = f"You are a role-playing game character named {npc_name}, who is a {npc_role} in the world of Rose Online."
-        if context:
-            prompt += f" Context: {context}"
-        prompt += " Generate an engaging dialogue line appropriate for your role."
+        prompt = _dialogue_prompt(npc_role, npc_name, context)
+        reply = _with_retries(openai, lambda: _complete(client, prompt, use_assistant, DIALOGUE_MAX_TOKENS,
+                                                        on_text=on_text, thread_key=(npc_name, npc_role)),
+                              estimate_tokens(prompt, DIALOGUE_MAX_TOKENS))
+        if reply is None:
+            return None
+        dialogue = reply[0].strip()
+        logger.debug(f"Generated dialogue for {npc_name} ({npc_role}): {dialogue}")
+        return dialogue
+
+    def generate_dialogue_batch(self, specs: List[dict], use_assistant: bool = False,
+                                batch_size: int = DIALOGUE_BATCH_SIZE,
+                                stats: Optional[dict] = None,
+                                on_text: Optional[Callable[[int, str], None]] = None) -> List[dict]:
+        """
+        Generates dialogue lines for many NPCs, several per API request.
 
-        try:
-            max_retries = 5
-            backoff_factor = 0.5
+        Each batch of specs is sent as one request asking for a JSON list of
+        lines (enforced by a response schema for GPT-4, asked for in the prompt
+        for the assistant). The reply is validated and split back into lines;
+        any NPC missing from it, or a whole batch whose reply can't be parsed,
+        is generated again with its own request.
 
-            for attempt in range(max_retries):
-                try:
-                    if use_assistant:
-                        # Use the custom assistant
-                        thread = client.beta.threads.create()
-                        message = client.beta.threads.messages.create(
-                            thread_id=thread.id,
-                            role="user",
-                            content=prompt
-                        )
-                        run = client.beta.threads.runs.create(
-                            thread_id=thread.id,
-                            assistant_id="asst_EqgqfB5HpggNuKyq0rqcEUL4"
-                        )
-
-                        # Wait for completion
-                        while True:
-                            run_status = client.beta.threads.runs.retrieve(
-                                thread_id=thread.id,
-                                run_id=run.id
-                            )
-                            if run_status.status == 'completed':
-                                messages = client.beta.threads.messages.list(thread_id=thread.id)
-                                dialogue = messages.data[0].content[0].text.value.strip()
-                                break
-                            elif run_status.status in ['failed', 'cancelled', 'expired']:
-                                raise Exception(f"Assistant run failed with status: {run_status.status}")
-                            time.sleep(1)
-                    else:
-                        # Use GPT-4
-                        response = client.chat.completions.create(
-                            model="gpt-4o",
-                            messages=[
-                                {"role": "system", "content": "You are a helpful assistant."},
-                                {"role": "user", "content": prompt}
-                            ],
-                            max_tokens=60,
-                            n=1,
-                            stop=None,
-                            temperature=0.7,
-                        )
-                        dialogue = response.choices[0].message.content.strip()
-
-                    logger.info(f"Generated dialogue for {npc_name} ({npc_role}): {dialogue}")
-                    return dialogue
-
-                except openai.OpenAIError as e:
-                    wait = backoff_factor * (2 ** attempt)
-                    logger.warning(f"OpenAI API error. Retrying in {wait} seconds... Error: {e}")
-                    time.sleep(wait)
-                except Exception as e:
-                    logger.error(f"Unexpected error: {e}")
-                    return None
-
-            logger.error("Max retries exceeded. Failed to generate dialogue.")
-            return None
+        Requests go through the shared rate limiter, most urgent first: specs
+        are sent in order of their 'priority' (lower first, e.g. 0 for rows on
+        screen), keeping their given order otherwise. Lines generated on their
+        own reuse the assistant thread of their NPC.
+
+        Args:
+            specs: One dict per NPC with 'npc_name', 'npc_role' and optionally
+                'context' and 'priority'
+            use_assistant: If True, uses the custom assistant; if False, uses GPT-4
+            batch_size: NPCs per request
+            stats: If given, filled with the totals: 'requests', 'tokens', 'cost'
+                (estimated, in dollars), 'seconds' (wall time) and 'retried'
+                (lines generated on their own)
+            on_text: If given, called with (spec index, text so far) while replies
+                are streamed: for a batch, with each line once its JSON entry is
+                complete; for a line generated on its own, as its text arrives
 
+        Returns:
+            One dict per spec, in order: 'dialogue' (None if generation failed),
+            'tokens' (the line's share of its request's tokens), 'latency'
+            (seconds until the line was available) and 'batched' (False if it
+            came from its own request).
+        """
+        totals = {'requests': 0, 'tokens': 0, 'cost': 0.0, 'seconds': 0.0, 'retried': 0}
+        if stats is not None:
+            stats.update(totals)
+            totals = stats
+        results = [{'dialogue': None, 'tokens': 0, 'latency': 0.0, 'batched': False} for _ in specs]
+        if not specs:
+            return results
+
+        openai, client = _openai_client()
+        if client is None:
+            return results
+
+        started = time.perf_counter()
+        order = sorted(range(len(specs)), key=lambda index: specs[index].get('priority', 0))
+        batch_size = max(1, batch_size)
+        missing = []
+        for start in range(0, len(order), batch_size):
+            indexes = order[start:start + batch_size]
+            batch = [specs[index] for index in indexes]
+            if len(batch) == 1:
+                missing.append(indexes[0])  # No point wrapping a single line in JSON
+                continue
+            prompt = _batch_prompt(batch, use_assistant)
+            max_tokens = (DIALOGUE_MAX_TOKENS + BATCH_TOKENS_PER_LINE) * len(batch)
+            batch_stream = None if on_text is None else functools.partial(_stream_batch, on_text, indexes)
+            request_started = time.perf_counter()
+            reply = _with_retries(openai, lambda: _complete(
+                client, prompt, use_assistant, max_tokens, None if use_assistant else BATCH_RESPONSE_FORMAT, batch_stream),
+                estimate_tokens(prompt, max_tokens), batch[0].get('priority', 0))
+            latency = time.perf_counter() - request_started
+            totals['requests'] += 1
+            lines, tokens = {}, 0
+            if reply is not None:
+                text, tokens = reply
+                totals['tokens'] += tokens
+                lines = _parse_batch_reply(text, len(batch))
+                if len(lines) < len(batch):
+                    logger.warning(f"Batch reply had {len(lines)} of {len(batch)} lines; "
+                                   f"generating the rest one by one.")
+            for offset, index in enumerate(indexes):
+                dialogue = lines.get(offset)
+                if dialogue is None:
+                    missing.append(index)
+                    continue
+                results[index] = {'dialogue': dialogue, 'tokens': tokens // len(batch),
+                                  'latency': latency, 'batched': True}
+
+        for index in missing:
+            spec = specs[index]
+            prompt = _dialogue_prompt(spec['npc_role'], spec['npc_name'], spec.get('context'))
+            request_started = time.perf_counter()
+            line_stream = None if on_text is None else functools.partial(_stream_line, on_text, index)
+            reply = _with_retries(openai, lambda: _complete(
+                client, prompt, use_assistant, DIALOGUE_MAX_TOKENS, on_text=line_stream,
+                thread_key=(spec['npc_name'], spec['npc_role'])),
+                estimate_tokens(prompt, DIALOGUE_MAX_TOKENS), spec.get('priority', 0))
+            totals['requests'] += 1
+            totals['retried'] += 1
+            if reply is not None:
+                dialogue = reply[0].strip()
+                totals['tokens'] += reply[1]
+                results[index] = {'dialogue': dialogue or None, 'tokens': reply[1],
+                                  'latency': time.perf_counter() - request_started, 'batched': False}
+
+        totals['seconds'] = time.perf_counter() - started
+        totals['cost'] = totals['tokens'] / 1000.0 * rate_limiter.cost_per_1k_tokens
+        generated = sum(1 for result in results if result['dialogue'])
+        logger.info(f"Generated {generated} of {len(specs)} dialogue lines in {totals['requests']} requests, "
+                    f"{totals['tokens']} tokens, {totals['seconds']:.1f}s.")
+        return results
+
+
+def _dialogue_prompt(npc_role: str, npc_name: str, context: Optional[str] = None) -> str:
+    prompt = f"You are a role-playing game character named {npc_name}, who is a {npc_role} in the world of Rose Online."
+    if context:
+        prompt += f" Context: {context}"
+    prompt += " Generate an engaging dialogue line appropriate for your role."
+    return prompt
+
+
+def _batch_prompt(specs: List[dict], use_assistant: bool) -> str:
+    npcs = [{'id': number, 'name': spec['npc_name'], 'role': spec['npc_role'], 'context': spec.get('context') or ''}
+            for number, spec in enumerate(specs, 1)]
+    prompt = ("You write dialogue for role-playing game characters in the world of Rose Online. "
+              "For each NPC below, write one engaging dialogue line appropriate for their role, "
+              "spoken in character and taking their context into account. Every line must stand on its own.\n"
+              f"NPCs:\n{json.dumps(npcs, ensure_ascii=False)}")
+    if use_assistant:
+        # Runs of the assistant don't take a response schema, so the format is spelled out
+        prompt += ('\nReply with JSON only, of the form {"lines": [{"id": <NPC id>, "dialogue": "<line>"}]}, '
+                   'one entry per NPC.')
+    return prompt
+
+
+def _parse_batch_reply(text: str, count: int) -> Dict[int, str]:
+    """
+    Lines of a batch reply by position in the batch, skipping entries that are
+    malformed, empty, duplicated or for an id that wasn't asked for.
+    """
+    text = text.strip()
+    if text.startswith('```'):
+        # Strip a Markdown code fence around the JSON
+        text = text.split('\n', 1)[-1].rsplit('```', 1)[0]
+    try:
+        reply = json.loads(text)
+    except ValueError:
+        logger.warning("Batch reply is not valid JSON.")
+        return {}
+    entries = reply.get('lines') if isinstance(reply, dict) else reply
+    if not isinstance(entries, list):
+        logger.warning("Batch reply has no list of lines.")
+        return {}
+    lines = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        number, dialogue = entry.get('id'), entry.get('dialogue')
+        if type(number) is not int or not 1 <= number <= count or not isinstance(dialogue, str):
+            continue
+        dialogue = dialogue.strip()
+        if dialogue and number - 1 not in lines:
+            lines[number - 1] = dialogue
+    return lines
+
+
+def _streamed_lines(text: str, count: int) -> Dict[int, str]:
+    """
+    Lines of the entries already complete in a batch reply that is still being
+    streamed, by position in the batch. The whole reply is validated by
+    _parse_batch_reply once it has arrived.
+    """
+    lines = {}
+    for match in _STREAMED_LINE.finditer(text):
+        number = int(match.group(1))
+        if 1 <= number <= count and number - 1 not in lines:
+            try:
+                dialogue = json.loads(match.group(2)).strip()
+            except ValueError:
+                continue
+            if dialogue:
+                lines[number - 1] = dialogue
+    return lines
+
+
+def _stream_batch(on_text: Callable[[int, str], None], indexes: List[int], text: str):
+    """Passes the lines completed so far in a streamed batch reply to on_text, by spec index."""
+    for offset, line in _streamed_lines(text, len(indexes)).items():
+        on_text(indexes[offset], line)
+
+
+def _stream_line(on_text: Callable[[int, str], None], index: int, text: str):
+    on_text(index, text.strip())
+
+
+def _complete(client, prompt: str, use_assistant: bool, max_tokens: int,
+              response_format: Optional[dict] = None,
+              on_text: Optional[Callable[[str], None]] = None,
+              thread_key: Optional[Hashable] = None) -> Tuple[str, int]:
+    """
+    Sends one prompt; returns the reply and the tokens used (0 if not reported).
+
+    Args:
+        on_text: If given, the reply is streamed and on_text is called with
+            the text received so far as it arrives.
+        thread_key: For the assistant, reuses the thread of earlier prompts
+            with the same key (e.g. the same NPC), so it keeps their context.
+    """
+    if use_assistant:
+        # Use the custom assistant
+        with _assistant_thread(client, thread_key) as thread_id:
+            client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=prompt
+            )
+            return _stream_run(client, thread_id, on_text)
+
+    # Use GPT-4
+    request = dict(
+        model=DIALOGUE_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        n=1,
+        stop=None,
+        temperature=0.7,
+    )
+    if response_format is not None:
+        request['response_format'] = response_format
+    if on_text is None:
+        response = client.chat.completions.create(**request)
+        usage = response.usage
+        return response.choices[0].message.content, usage.total_tokens if usage else 0
+
+    parts = []
+    tokens = 0
+    for chunk in client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request):
+        if chunk.usage:
+            tokens = chunk.usage.total_tokens  # Sent in a last chunk without choices
+        for choice in chunk.choices:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                on_text(''.join(parts))
+    return ''.join(parts), tokens
+
+
+@contextmanager
+def _assistant_thread(client, key: Optional[Hashable]):
+    """
+    Yields the id of the assistant thread to run a prompt on: the thread kept
+    for `key`, created the first time, or a new thread if there is no key.
+    Runs on one thread don't overlap, and a thread whose run failed is
+    dropped (it may still have an active run, which blocks new messages).
+    """
+    if key is None:
+        yield client.beta.threads.create().id
+        return
+    with _assistant_threads_lock:
+        lock = _assistant_thread_locks.setdefault(key, threading.Lock())
+    with lock:
+        thread_id = _assistant_threads.get(key)
+        if thread_id is None:
+            thread_id = _assistant_threads[key] = client.beta.threads.create().id
+        try:
+            yield thread_id
+        except BaseException:
+            _assistant_threads.pop(key, None)
+            raise
+
+
+def _stream_run(client, thread_id: str, on_text: Optional[Callable[[str], None]]) -> Tuple[str, int]:
+    """
+    Runs the assistant on a thread and returns its reply and the tokens used,
+    reading the run's events as they are streamed. Falls back to polling if
+    the installed SDK can't stream runs.
+    """
+    try:
+        events = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT_ID, stream=True)
+    except TypeError:
+        run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT_ID)
+        return _poll_run(client, thread_id, run.id, on_text)
+
+    parts = []
+    tokens = 0
+    for event in events:
+        if event.event == 'thread.message.delta':
+            for content in event.data.delta.content or ():
+                text = getattr(content, 'text', None)
+                if text is not None and text.value:
+                    parts.append(text.value)
+                    if on_text is not None:
+                        on_text(''.join(parts))
+        elif event.event == 'thread.run.completed':
+            usage = event.data.usage
+            tokens = usage.total_tokens if usage else 0
+        elif event.event in ('thread.run.failed', 'thread.run.cancelled', 'thread.run.expired',
+                             'thread.run.incomplete'):
+            raise Exception(f"Assistant run failed with status: {event.data.status}")
+        elif event.event == 'error':
+            raise Exception(f"Assistant run failed: {event.data}")
+    return ''.join(parts), tokens
+
+
+def _poll_run(client, thread_id: str, run_id: str, on_text: Optional[Callable[[str], None]]) -> Tuple[str, int]:
+    """
+    Waits for a run by polling it, first after RUN_POLL_FIRST seconds and then
+    RUN_POLL_GROWTH times longer each time, up to RUN_POLL_MAX.
+    """
+    interval = RUN_POLL_FIRST
+    while True:
+        time.sleep(interval)
+        run_status = client.beta.threads.runs.retrieve(
+            thread_id=thread_id,
+            run_id=run_id
+        )
+        if run_status.status == 'completed':
+            messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+            usage = getattr(run_status, 'usage', None)
+            dialogue = messages.data[0].content[0].text.value
+            if on_text is not None:
+                on_text(dialogue)
+            return dialogue, usage.total_tokens if usage else 0
+        elif run_status.status in ['failed', 'cancelled', 'expired', 'incomplete']:
+            raise Exception(f"Assistant run failed with status: {run_status.status}")
+        interval = min(interval * RUN_POLL_GROWTH, RUN_POLL_MAX)
+
+
+def _openai_client():
+    """
+    The OpenAI module and a client for it, or a None client if no API key is set.
+    The SDK's own retries are turned off, so every retry goes through the rate limiter.
+    """
+    openai = _load_openai()
+    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    if not client.api_key:
+        logger.error("OpenAI API key not found. Please set it in the .env file.")
+        return openai, None
+    return openai, client
+
+
+def _with_retries(openai, request, estimated_tokens: int, priority: int = 0,
+                  max_retries: int = 5, backoff_factor: float = 0.5):
+    """
+    Calls request() (which returns the reply and the tokens it used) once the
+    rate limiter lets it through, retrying OpenAI errors. A 429 pauses every
+    request for the server's Retry-After; other errors back off exponentially,
+    with jitter. Returns None if the request never succeeds.
+    """
+    for attempt in range(max_retries):
+        if attempt:
+            rate_limiter.count_retry()
+        with profiling.span('openai.wait', priority=priority):
+            rate_limiter.acquire(estimated_tokens, priority)
+        try:
+            with profiling.span('openai.request', attempt=attempt) as span:
+                reply = request()
+                span.set('tokens', reply[1])
+        except openai.OpenAIError as e:
+            profiling.count('openai.errors')
+            rate_limiter.record(estimated_tokens, 0)
+            delay = retry_after(e)
+            if delay is not None or isinstance(e, openai.RateLimitError):
+                delay = with_jitter(delay if delay is not None else backoff_factor * (2 ** attempt))
+                rate_limiter.pause(delay)
+                logger.warning(f"Rate limited by the OpenAI API. Retrying in {delay:.1f} seconds... Error: {e}")
+            else:
+                delay = backoff_delay(attempt, backoff_factor)
+                logger.warning(f"OpenAI API error. Retrying in {delay:.1f} seconds... Error: {e}")
+                time.sleep(delay)
+            continue
         except Exception as e:
+            rate_limiter.record(estimated_tokens, 0)
             logger.error(f"Unexpected error: {e}")
-            return None
\ No newline at end of file
+            return None
+        rate_limiter.record(estimated_tokens, reply[1])
+        profiling.count('openai.requests')
+        profiling.count('openai.tokens', reply[1])
+        return reply
+
+    logger.error("Max retries exceeded. Failed to generate dialogue.")
+    return None
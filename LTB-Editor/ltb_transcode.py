@@ -0,0 +1,130 @@
+"""
+Converts LTB files between UTF-16LE and EUC-KR on disk.
+
+The editor's encoding box only changes how a file is read. This tool
+re-encodes every string and recomputes the cell sizes (UTF-16 code units or
+EUC-KR bytes), for a single file or every .ltb file below a directory.
+Directories are converted in parallel, one file per process.
+
+Characters the target encoding can't represent are replaced with '?' and
+listed in the report; with --strict, such files are not written at all.
+
+Usage:
+    python ltb_transcode.py SOURCE OUTPUT --from euc-kr --to utf-16le [--strict] [--workers N] [--json]
+
+SOURCE and OUTPUT are both files or both directories (the directory tree is
+mirrored). OUTPUT may be SOURCE to convert in place.
+"""
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from ltb_file import LTBFile
+
+ENCODINGS = ['utf-16le', 'euc-kr']
+# Problems listed per file in the text report (the JSON report has all of them)
+MAX_LISTED_PROBLEMS = 20
+
+
+def transcode_file(source: str, output: str, source_encoding: str, target_encoding: str,
+                   strict: bool = False) -> dict:
+    """
+    Converts one file. Runs in worker processes.
+
+    Returns:
+        dict: Report with 'file', 'output', 'cells', 'problems', 'written',
+        'error' and 'seconds'.
+    """
+    started = time.perf_counter()
+    report = {'file': source, 'output': output, 'cells': 0, 'problems': [], 'written': False, 'error': None}
+    temp_path = output + '.tmp'
+    try:
+        ltb = LTBFile.read(source, encoding=source_encoding)
+        report['cells'] = ltb.rows * ltb.columns
+        converted = ltb.transcode(target_encoding, report['problems'])  # ValueError if a string gets too long
+        if not (strict and report['problems']):
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            converted.write(temp_path)
+            os.replace(temp_path, output)  # OUTPUT may be SOURCE
+            report['written'] = True
+    except (OSError, ValueError, struct.error) as e:
+        report['error'] = str(e)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)  # Left by a failed write
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def iter_jobs(source: str, output: str) -> Iterator[Tuple[str, str]]:
+    """(source file, output file) pairs for a file or a directory tree."""
+    if not os.path.isdir(source):
+        yield source, output
+        return
+    for dir_path, dir_names, file_names in os.walk(source):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith('.'))
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith('.ltb'):
+                file_path = os.path.join(dir_path, file_name)
+                yield file_path, os.path.join(output, os.path.relpath(file_path, source))
+
+
+def transcode_paths(source: str, output: str, source_encoding: str, target_encoding: str,
+                    strict: bool = False, workers: Optional[int] = None) -> List[dict]:
+    """Converts a file or directory, returning one report per file."""
+    jobs = list(iter_jobs(source, output))
+    arguments = ([path for path, _ in jobs], [out for _, out in jobs], [source_encoding] * len(jobs),
+                 [target_encoding] * len(jobs), [strict] * len(jobs))
+    if len(jobs) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(transcode_file, *arguments))
+    return list(map(transcode_file, *arguments))
+
+
+def describe(report: dict) -> str:
+    if report['error']:
+        return f"{report['file']}: failed: {report['error']}"
+    status = 'converted' if report['written'] else 'not written (--strict)'
+    lines = [f"{report['file']}: {status}, {report['cells']} cells in {report['seconds']}s, "
+             f"{len(report['problems'])} cell(s) with unconvertible characters"]
+    for problem in report['problems'][:MAX_LISTED_PROBLEMS]:
+        lines.append(f"  row {problem['row']}, column {problem['column']}: "
+                     f"can't {problem['stage']} {problem['characters']!r}")
+    if len(report['problems']) > MAX_LISTED_PROBLEMS:
+        lines.append(f"  ... and {len(report['problems']) - MAX_LISTED_PROBLEMS} more")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert LTB files between UTF-16LE and EUC-KR.")
+    parser.add_argument('source', help="LTB file, or a directory to convert every .ltb file below.")
+    parser.add_argument('output', help="Output file or directory (may be the source, to convert in place).")
+    parser.add_argument('--from', dest='source_encoding', choices=ENCODINGS, required=True)
+    parser.add_argument('--to', dest='target_encoding', choices=ENCODINGS, required=True)
+    parser.add_argument('--strict', action='store_true',
+                        help="Don't write files containing characters the target encoding can't represent.")
+    parser.add_argument('--workers', type=int, help="Number of processes (default: CPU count).")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('ltb_file').setLevel(logging.WARNING)  # Skip the per-file header logging
+    reports = transcode_paths(args.source, args.output, args.source_encoding, args.target_encoding,
+                              args.strict, args.workers)
+    if args.json:
+        json.dump(reports, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        for report in reports:
+            print(describe(report))
+        print(f"{sum(report['written'] for report in reports)} of {len(reports)} file(s) converted.")
+    return 0 if all(report['written'] and not report['problems'] for report in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Client-side rate limiting of the OpenAI requests made for dialogue generation.
+
+The API limits both requests per minute and tokens per minute. Rather than
+sending requests until it answers 429 and then sleeping blindly, a
+RateLimiter keeps a token bucket for each budget and makes every request
+wait until both buckets can pay for it. The token cost of a request isn't
+known until its reply arrives, so it is paid up front with an estimate
+(prompt length plus max_tokens) and settled with the real usage afterwards.
+
+Waiting requests are served by priority (lower first, e.g. rows on screen
+before the rest), then in arrival order. When the API does answer 429, its
+Retry-After header pauses every request, not just the one that failed, and
+retries are spread out with random jitter so they don't all fire at once.
+
+Budgets come from the environment (OPENAI_RPM, OPENAI_TPM), so they can be
+set to the account's tier. The clock and sleep are injectable, which keeps
+the limiter testable without waiting and, together with OPENAI_BASE_URL
+(read by the OpenAI SDK), lets dialogue generation run against a local fake
+endpoint.
+"""
+import email.utils
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Defaults match the lowest paid tier for gpt-4o
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 30000
+# Rough blended price of gpt-4o (input and output tokens), in dollars per 1000 tokens
+DEFAULT_COST_PER_1K_TOKENS = 0.005
+# Window of the live throughput counters, in seconds
+THROUGHPUT_WINDOW = 60.0
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    The level may go negative when a request turns out to cost more than
+    it paid for; later requests then wait for the debt to refill.
+    """
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        amount = min(amount, self.capacity)  # A request bigger than the bucket waits for a full one
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Gives back (positive) or charges (negative) tokens after the fact."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by every thread
+    sending requests. Call `acquire` before a request and `record` after it.
+    """
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 cost_per_1k_tokens: float = DEFAULT_COST_PER_1K_TOKENS,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0, now)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0, now)
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+        self.waiting = []  # Heap of (priority, arrival) of the requests waiting for their turn
+        self.arrivals = itertools.count()
+
+        # Counters
+        self.sent = 0
+        self.tokens_used = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited = 0.0
+        self.recent = deque()  # (time, tokens) of the requests settled in the last THROUGHPUT_WINDOW
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        """Budgets from OPENAI_RPM, OPENAI_TPM and OPENAI_COST_PER_1K, or the defaults."""
+        def number(name, default):
+            try:
+                return float(os.getenv(name, default))
+            except ValueError:
+                return default
+        return cls(number("OPENAI_RPM", DEFAULT_REQUESTS_PER_MINUTE),
+                   number("OPENAI_TPM", DEFAULT_TOKENS_PER_MINUTE),
+                   number("OPENAI_COST_PER_1K", DEFAULT_COST_PER_1K_TOKENS))
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.paused_until - now, self.requests.time_until(1), self.tokens.time_until(tokens))
+
+    def acquire(self, tokens: float, priority: int = 0) -> float:
+        """
+        Blocks until the budgets allow a request estimated to use `tokens`
+        tokens and every waiting request of a lower priority value (or the
+        same priority, arrived earlier) has gone. Returns the seconds waited.
+        """
+        started = self.clock()
+        with self.condition:
+            ticket = (priority, next(self.arrivals))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if self.waiting[0] != ticket:
+                        self.condition.wait()  # Woken when the request ahead of this one leaves
+                        continue
+                    now = self.clock()
+                    wait = self._wait_time(tokens, now)
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.sent += 1
+                        break
+                    # Sleep without the lock, so more urgent requests can queue up ahead
+                    self.condition.release()
+                    try:
+                        self.sleep(wait)
+                    finally:
+                        self.condition.acquire()
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+            waited = self.clock() - started
+            self.waited += waited
+            return waited
+
+    def record(self, estimated_tokens: float, used_tokens: float):
+        """Settles a request that paid `estimated_tokens` up front and used `used_tokens`."""
+        with self.condition:
+            self.tokens.adjust(min(estimated_tokens, self.tokens.capacity) - used_tokens)
+            self.tokens_used += used_tokens
+            now = self.clock()
+            self.recent.append((now, used_tokens))
+            self._trim_recent(now)
+
+    def pause(self, seconds: float):
+        """Holds back every request for `seconds` (the server's Retry-After)."""
+        with self.condition:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def count_retry(self):
+        with self.condition:
+            self.retries += 1
+
+    def _trim_recent(self, now: float):
+        while self.recent and self.recent[0][0] < now - THROUGHPUT_WINDOW:
+            self.recent.popleft()
+
+    def snapshot(self) -> dict:
+        """Live counters: totals so far, and the throughput over the last minute."""
+        with self.condition:
+            now = self.clock()
+            self._trim_recent(now)
+            return {
+                'requests': self.sent,
+                'tokens': self.tokens_used,
+                'cost': self.tokens_used / 1000.0 * self.cost_per_1k_tokens,
+                'rate_limited': self.rate_limited,
+                'retries': self.retries,
+                'waited': self.waited,
+                'queued': len(self.waiting),
+                'requests_per_minute': len(self.recent) * 60.0 / THROUGHPUT_WINDOW,
+                'tokens_per_minute': sum(tokens for _, tokens in self.recent) * 60.0 / THROUGHPUT_WINDOW,
+            }
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the server asked to wait before retrying, from the Retry-After
+    (or OpenAI's retry-after-ms) header of a failed request, if it sent one.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds:
+        try:
+            return max(0.0, float(milliseconds) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)  # Retry-After may also be an HTTP date
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter: a random delay up to base * 2**attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def with_jitter(seconds: float, spread: float = 0.1) -> float:
+    """`seconds` plus up to `spread` of it, so clients told the same Retry-After don't retry in step."""
+    return seconds * (1 + random.uniform(0, spread))
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Tokens a request may use: its prompt (about 4 characters a token) plus the most it may generate."""
+    return len(prompt) // 4 + max_tokens
@@ -0,0 +1,252 @@
+"""
+The STB file format: the STB class and the loaders shared by the STB editor
+and the command line tools (stbdiff, stbstats and the Data-Tools scripts),
+which import it without pulling in Tk.
+"""
+import os
+import struct
+import sys
+from typing import Callable, Iterator, List, Tuple
+
+# The parse cache and profiling code lives in the Data-Tools folder next to this
+# one, which has to be present.
+DATA_TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data-Tools')
+if DATA_TOOLS_DIR not in sys.path:
+    sys.path.append(DATA_TOOLS_DIR)
+from parsecache import ParseCache
+import profiling
+
+# Rows parsed between two progress updates while opening a file
+LOAD_CHUNK_ROWS = 2000
+
+
+class STB:
+    def __init__(self, file_path: str = None):
+        self.file_path: str = file_path
+        self.row_size: int = 0
+        self.column_sizes: List[int] = []
+        self.column_names: List[str] = []
+        self.cells: List[List[str]] = []
+        self.encoding: str = 'euc-kr'  # Encoding used in the STB files
+        self.listeners: List[Callable[[int, int, str, str], None]] = []  # Called by set_cell
+
+        if file_path:
+            self.load(file_path)
+
+    @profiling.profiled('stb.load')
+    def load(self, file_path: str):
+        for _ in self.iter_load(file_path):
+            pass
+
+    def iter_load(self, file_path: str, chunk_rows: int = LOAD_CHUNK_ROWS) -> Iterator[Tuple[int, int]]:
+        """
+        Same as load, as a generator yielding (complete rows, total rows) once the
+        header is read and after every chunk_rows rows, so the rows read so far
+        can be shown while the rest of the file is parsed.
+        """
+        with open(file_path, 'rb') as f:
+            self.file_path = file_path
+
+            # Read header
+            magic = f.read(4)
+            if magic not in (b'STB0', b'STB1'):
+                raise ValueError('Invalid STB file.')
+
+            data_offset = struct.unpack('<I', f.read(4))[0]
+            row_count = struct.unpack('<I', f.read(4))[0]
+            column_count = struct.unpack('<I', f.read(4))[0]
+            self.row_size = struct.unpack('<I', f.read(4))[0]
+
+            # Read column sizes
+            self.column_sizes = []
+            for _ in range(column_count + 1):
+                size_data = f.read(2)
+                if not size_data:
+                    break
+                size = struct.unpack('<h', size_data)[0]
+                self.column_sizes.append(size)
+
+            # Read column names
+            self.column_names = []
+            for _ in range(column_count + 1):
+                name_length_data = f.read(2)
+                if not name_length_data:
+                    break
+                name_length = struct.unpack('<h', name_length_data)[0]
+                name_data = f.read(name_length)
+                name = name_data.decode(self.encoding)
+                self.column_names.append(name)
+
+            # Read row names (first cell of each row)
+            self.cells = []
+            for _ in range(row_count - 1):
+                row = []
+                name_length_data = f.read(2)
+                if not name_length_data:
+                    break
+                name_length = struct.unpack('<h', name_length_data)[0]
+                name_data = f.read(name_length)
+                name = name_data.decode(self.encoding)
+                row.append(name)
+                self.cells.append(row)
+
+            # Seek to data offset if necessary
+            current_position = f.tell()
+            if current_position < data_offset:
+                f.seek(data_offset)
+
+            # Read the rest of the cells
+            total_rows = len(self.cells)
+            yield 0, total_rows
+            for row_index, row in enumerate(self.cells, start=1):
+                for _ in range(column_count - 1):
+                    cell_length_data = f.read(2)
+                    if not cell_length_data:
+                        break
+                    cell_length = struct.unpack('<h', cell_length_data)[0]
+                    cell_data = f.read(cell_length)
+                    cell = cell_data.decode(self.encoding)
+                    row.append(cell)
+                if row_index % chunk_rows == 0 or row_index == total_rows:
+                    yield row_index, total_rows
+            profiling.count('stb.cells_decoded', total_rows * column_count)
+
+    @profiling.profiled('stb.save')
+    def save(self, file_path: str = None):
+        if file_path is None:
+            file_path = self.file_path
+
+        with open(file_path, 'wb') as f:
+            # Write header
+            f.write(b'STB1')
+
+            # Placeholder for data offset
+            data_offset_position = f.tell()
+            f.write(struct.pack('<I', 0))  # Placeholder
+
+            # Calculate row and column counts
+            row_count = len(self.cells) + 1  # Include header row
+            column_count = max(len(row) for row in self.cells) if self.cells else 0
+
+            f.write(struct.pack('<I', row_count))
+            f.write(struct.pack('<I', column_count))
+            f.write(struct.pack('<I', self.row_size))
+
+            # Write column sizes
+            if not self.column_sizes:
+                # Initialize column sizes to zero if not set
+                self.column_sizes = [0] * (column_count + 1)
+
+            for size in self.column_sizes:
+                f.write(struct.pack('<h', size))
+
+            # Write column names
+            for name in self.column_names:
+                name_bytes = name.encode(self.encoding)
+                f.write(struct.pack('<h', len(name_bytes)))
+                f.write(name_bytes)
+
+            # Write row names (first cell of each row)
+            for row in self.cells:
+                name_bytes = row[0].encode(self.encoding)
+                f.write(struct.pack('<h', len(name_bytes)))
+                f.write(name_bytes)
+
+            # Record data offset
+            data_offset = f.tell()
+
+            # Write the rest of the cells
+            for row in self.cells:
+                for cell in row[1:]:
+                    cell_bytes = cell.encode(self.encoding)
+                    f.write(struct.pack('<h', len(cell_bytes)))
+                    f.write(cell_bytes)
+
+            profiling.count('stb.bytes_written', f.tell())
+
+            # Go back and update data offset
+            f.seek(data_offset_position)
+            f.write(struct.pack('<I', data_offset))
+
+    def set_cell(self, row: int, column: int, value: str):
+        if row < 0 or row >= len(self.cells):
+            raise IndexError('Row index out of range.')
+
+        if column < 0:
+            raise IndexError('Column index cannot be negative.')
+
+        # Extend the row if necessary
+        while len(self.cells[row]) <= column:
+            self.cells[row].append('')
+
+        old_value = self.cells[row][column]
+        self.cells[row][column] = value
+        for listener in self.listeners:
+            listener(row, column, old_value, value)
+
+    def add_listener(self, listener: Callable[[int, int, str, str], None]):
+        """Registers listener(row, column, old_value, new_value), called after every set_cell."""
+        self.listeners.append(listener)
+
+    def get_cell(self, row: int, column: int) -> str:
+        if row < 0 or row >= len(self.cells):
+            raise IndexError('Row index out of range.')
+
+        if column < 0 or column >= len(self.cells[row]):
+            return ''
+
+        return self.cells[row][column]
+
+    def add_row(self, row_data: List[str]):
+        self.cells.append(row_data)
+
+    def add_column(self, column_name: str, default_value: str = ''):
+        self.column_names.append(column_name)
+        self.column_sizes.append(0)  # Adjust size as needed
+
+        for row in self.cells:
+            row.append(default_value)
+
+    def get_row_count(self) -> int:
+        return len(self.cells)
+
+    def get_column_count(self) -> int:
+        return len(self.column_names)
+
+
+def load_stb(file_path: str) -> STB:
+    """Loads an STB file, going through the parse cache when it is enabled."""
+    cache = ParseCache.from_environment()
+    if cache is None:
+        return STB(file_path)
+
+    state = cache.get_or_parse(file_path, 'stb', lambda: vars(STB(file_path)))
+    stb = STB()
+    vars(stb).update(state)
+    stb.file_path = file_path
+    stb.listeners = []
+    return stb
+
+
+def load_stb_chunks(file_path: str) -> Iterator[Tuple[STB, int, int]]:
+    """
+    Loads an STB file in chunks, see STB.iter_load. Yields (stb, complete rows,
+    total rows); the same STB object is yielded every time. Files found in the
+    parse cache are yielded in one go.
+    """
+    cache = ParseCache.from_environment()
+    if cache is None:
+        stb = STB()
+        with profiling.span('stb.load', file=file_path):
+            for rows_done, total_rows in stb.iter_load(file_path):
+                yield stb, rows_done, total_rows
+        return
+
+    stb = load_stb(file_path)
+    yield stb, len(stb.cells), len(stb.cells)
+
+
+def read_stb_rows(file_path: str) -> Tuple[STB, List[List[str]]]:
+    """Loads an STB file for filewatch.start_reload: the STB and its rows."""
+    stb = load_stb(file_path)
+    return stb, stb.cells
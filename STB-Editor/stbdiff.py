@@ -0,0 +1,405 @@
+"""
+Structural diff and three-way merge for STB files.
+
+Rows are aligned by row index (the item number used by the game) or by row
+name, columns are aligned by header. Rows are compared as whole tuples first,
+so only rows that differ are compared cell by cell. A column deleted on one
+side of a merge is dropped, or reported as a conflict when the other side
+edited it.
+
+Usage:
+    python stbdiff.py diff OLD.stb NEW.stb [--key index|name] [--json]
+    python stbdiff.py merge BASE.stb OURS.stb THEIRS.stb -o MERGED.stb [--key index|name]
+"""
+import argparse
+import contextlib
+import gc
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from stb_file import STB
+
+# A row or column key: (name or index, occurrence). The occurrence number keeps
+# repeated names such as "N/A" columns or empty row names apart.
+Key = Tuple[object, int]
+
+
+def _occurrence_keys(names: List[object]) -> List[Key]:
+    seen: Dict[object, int] = {}
+    keys = []
+    for name in names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        keys.append((name, count))
+    return keys
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """
+    Pauses the cyclic garbage collector. Building 100k-row dicts and lists
+    otherwise triggers repeated full collections that cost more than the diff.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def column_width(stb: STB) -> int:
+    """Number of data columns in the rows (the row name is column 0)."""
+    return max(map(len, stb.cells), default=len(stb.column_names))
+
+
+def column_keys(stb: STB) -> List[Key]:
+    """Header keys for every data column, in file order."""
+    width = column_width(stb)
+    names = list(stb.column_names[:width])
+    names += [f'Col {idx}' for idx in range(len(names), width)]
+    return _occurrence_keys(names)
+
+
+def row_keys(stb: STB, key: str = 'index') -> List[Key]:
+    """Row keys in file order, either by row index or by row name."""
+    if key == 'index':
+        return [(idx, 0) for idx in range(len(stb.cells))]
+    if key == 'name':
+        return _occurrence_keys([row[0] if row else '' for row in stb.cells])
+    raise ValueError(f"Unknown row key: {key}")
+
+
+def _projector(stb_columns: List[Key], columns: List[Key]):
+    """
+    Returns a function mapping a row with `stb_columns` to a tuple of values
+    laid out in `columns` order ('' for columns the file doesn't have).
+    """
+    positions = {col: idx for idx, col in enumerate(stb_columns)}
+    layout = [positions.get(col, -1) for col in columns]
+    if stb_columns == columns:
+        width = len(layout)
+
+        def project(row: List[str]) -> tuple:
+            if len(row) == width:
+                return tuple(row)
+            return tuple(row[:width]) + ('',) * (width - len(row))
+        return project
+
+    def project(row: List[str]) -> tuple:
+        return tuple(row[idx] if 0 <= idx < len(row) else '' for idx in layout)
+    return project
+
+
+def _column_changed(base_rows: dict, base_columns: List[Key], rows: dict, columns: List[Key], col: Key) -> bool:
+    """
+    Whether one side edited a column compared to base: a row both have holds
+    another value, or a row the side added is not empty in that column.
+    """
+    base_position = base_columns.index(col)
+    position = columns.index(col)
+    for row_key, row in rows.items():
+        value = row[position] if position < len(row) else ''
+        base_row = base_rows.get(row_key)
+        if base_row is None:
+            base_value = ''
+        else:
+            base_value = base_row[base_position] if base_position < len(base_row) else ''
+        if value != base_value:
+            return True
+    return False
+
+
+class STBDiff:
+    """Differences between two STB files, as produced by `diff_stb`."""
+
+    def __init__(self):
+        self.added_columns: List[Key] = []
+        self.removed_columns: List[Key] = []
+        self.added_rows: List[Key] = []
+        self.removed_rows: List[Key] = []
+        # Cell changes: {'row': key, 'column': key, 'old': str, 'new': str}
+        self.changes: List[dict] = []
+
+    def is_empty(self) -> bool:
+        return not (self.added_columns or self.removed_columns or
+                    self.added_rows or self.removed_rows or self.changes)
+
+    def to_dict(self) -> dict:
+        return {
+            'added_columns': self.added_columns,
+            'removed_columns': self.removed_columns,
+            'added_rows': self.added_rows,
+            'removed_rows': self.removed_rows,
+            'changes': self.changes,
+        }
+
+
+def diff_stb(old: STB, new: STB, key: str = 'index') -> STBDiff:
+    """
+    Compares two loaded STB files and returns the cell-level differences.
+    Rows present in both files are compared as whole tuples before their cells.
+    """
+    with _gc_paused():
+        return _diff_stb(old, new, key)
+
+
+def _diff_stb(old: STB, new: STB, key: str) -> STBDiff:
+    result = STBDiff()
+
+    old_columns = column_keys(old)
+    new_columns = column_keys(new)
+    new_column_set = set(new_columns)
+    old_column_set = set(old_columns)
+    result.removed_columns = [col for col in old_columns if col not in new_column_set]
+    result.added_columns = [col for col in new_columns if col not in old_column_set]
+    common_columns = [col for col in old_columns if col in new_column_set]
+
+    project_old = _projector(old_columns, common_columns)
+    project_new = _projector(new_columns, common_columns)
+
+    old_rows = dict(zip(row_keys(old, key), old.cells))
+    new_keys = row_keys(new, key)
+    new_rows = dict(zip(new_keys, new.cells))
+    result.removed_rows = [row_key for row_key in old_rows if row_key not in new_rows]
+
+    for row_key in new_keys:
+        old_row = old_rows.get(row_key)
+        if old_row is None:
+            result.added_rows.append(row_key)
+            continue
+        old_values = project_old(old_row)
+        new_values = project_new(new_rows[row_key])
+        if old_values == new_values:
+            continue
+        for col, old_value, new_value in zip(common_columns, old_values, new_values):
+            if old_value != new_value:
+                result.changes.append({'row': row_key, 'column': col, 'old': old_value, 'new': new_value})
+
+    return result
+
+
+def _pick(base, ours, theirs):
+    """Three-way pick of a single value; returns (value, conflict)."""
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    return ours, True
+
+
+def merge_stb(base: STB, ours: STB, theirs: STB, key: str = 'index') -> Tuple[STB, List[dict]]:
+    """
+    Three-way merges `ours` and `theirs` against their common ancestor `base`.
+
+    Non-conflicting edits from both sides are applied. Where both sides changed
+    the same cell (or one side deleted a row the other changed) "ours" is kept
+    and a conflict is recorded. Columns are merged the same way as a whole: a
+    column deleted by one side is dropped unless the other side edited it, in
+    which case ours is kept and one conflict with 'row' None is recorded.
+
+    Returns:
+        Tuple[STB, List[dict]]: The merged file and the list of conflicts.
+    """
+    with _gc_paused():
+        return _merge_stb(base, ours, theirs, key)
+
+
+def _merge_stb(base: STB, ours: STB, theirs: STB, key: str) -> Tuple[STB, List[dict]]:
+    conflicts: List[dict] = []
+
+    base_rows = dict(zip(row_keys(base, key), base.cells))
+    ours_keys = row_keys(ours, key)
+    ours_rows = dict(zip(ours_keys, ours.cells))
+    theirs_keys = row_keys(theirs, key)
+    theirs_rows = dict(zip(theirs_keys, theirs.cells))
+
+    # Columns: ours in order, then columns only theirs added. A column deleted by one
+    # side is dropped if the other side left it alone, and a conflict otherwise.
+    base_columns = column_keys(base)
+    ours_columns = column_keys(ours)
+    theirs_columns = column_keys(theirs)
+    ours_column_set = set(ours_columns)
+    theirs_column_set = set(theirs_columns)
+    base_column_set = set(base_columns)
+    added_theirs = [col for col in theirs_columns
+                    if col not in ours_column_set and col not in base_column_set]
+    dropped = set()
+    kept_deleted = []  # Deleted by theirs but edited by ours: ours is kept
+    for col in ours_columns:
+        if col in base_column_set and col not in theirs_column_set:
+            if _column_changed(base_rows, base_columns, ours_rows, ours_columns, col):
+                kept_deleted.append(col)
+                conflicts.append({'row': None, 'column': col, 'reason': 'changed by ours, deleted by theirs'})
+            else:
+                dropped.add(col)
+    for col in theirs_columns:
+        if col in base_column_set and col not in ours_column_set and \
+                _column_changed(base_rows, base_columns, theirs_rows, theirs_columns, col):
+            conflicts.append({'row': None, 'column': col, 'reason': 'deleted by ours, changed by theirs'})
+    kept_ours_columns = [col for col in ours_columns if col not in dropped]
+    columns = kept_ours_columns + added_theirs
+
+    project_base = _projector(base_columns, columns)
+    project_ours = _projector(ours_columns, columns)
+    project_theirs_columns = _projector(theirs_columns, columns)
+    deleted_positions = [columns.index(col) for col in kept_deleted]
+
+    def project_theirs(row: List[str], base_row: Optional[List[str]]) -> tuple:
+        # Theirs has no value in the columns it deleted and ours kept: count them as
+        # unchanged from base, so those cells take ours instead of merging against ''
+        values = project_theirs_columns(row)
+        if not deleted_positions:
+            return values
+        values = list(values)
+        base_values = project_base(base_row) if base_row is not None else None
+        for position in deleted_positions:
+            values[position] = base_values[position] if base_values is not None else ''
+        return tuple(values)
+
+    # Row order: ours, then rows only theirs added
+    order = ours_keys + [row_key for row_key in theirs_keys
+                         if row_key not in ours_rows and row_key not in base_rows]
+    # Rows deleted by ours but still present in base and theirs must be checked too
+    deleted_by_ours = [row_key for row_key in theirs_keys
+                       if row_key not in ours_rows and row_key in base_rows]
+
+    # When all three files share the same columns, unchanged rows are detected
+    # by comparing the raw row lists without building projections
+    same_layout = base_columns == columns and ours_columns == columns and theirs_columns == columns
+
+    empty = ('',) * len(columns)
+    merged_cells: List[List[str]] = []
+    for row_key in order:
+        base_row = base_rows.get(row_key)
+        theirs_row = theirs_rows.get(row_key)
+        if same_layout and base_row is not None and theirs_row is not None and row_key in ours_rows:
+            ours_row = ours_rows[row_key]
+            if ours_row == theirs_row or theirs_row == base_row:
+                merged_cells.append(list(ours_row))
+                continue
+            if ours_row == base_row:
+                merged_cells.append(list(theirs_row))
+                continue
+        o = project_ours(ours_rows[row_key]) if row_key in ours_rows else project_theirs(theirs_row, base_row)
+        b = project_base(base_row) if base_row is not None else None
+        t = project_theirs(theirs_row, base_row) if theirs_row is not None else None
+
+        if row_key not in ours_rows:
+            # Only theirs has this row
+            merged_cells.append(list(t))
+            continue
+        if t is None:
+            if b is None:
+                merged_cells.append(list(o))  # Added by ours
+            elif o == b:
+                continue  # Deleted by theirs, untouched by ours
+            else:
+                conflicts.append({'row': row_key, 'column': None, 'reason': 'changed by ours, deleted by theirs'})
+                merged_cells.append(list(o))
+            continue
+        if b is None:
+            b = empty  # Added on both sides, merge cell by cell against an empty row
+        if o == t or t == b:
+            merged_cells.append(list(o))
+            continue
+        if o == b:
+            merged_cells.append(list(t))
+            continue
+
+        row = []
+        for col, base_value, ours_value, theirs_value in zip(columns, b, o, t):
+            value, conflict = _pick(base_value, ours_value, theirs_value)
+            if conflict:
+                conflicts.append({'row': row_key, 'column': col, 'base': base_value,
+                                  'ours': ours_value, 'theirs': theirs_value})
+            row.append(value)
+        merged_cells.append(row)
+
+    for row_key in deleted_by_ours:
+        if project_theirs(theirs_rows[row_key], base_rows[row_key]) != project_base(base_rows[row_key]):
+            conflicts.append({'row': row_key, 'column': None, 'reason': 'deleted by ours, changed by theirs'})
+
+    merged = STB()
+    merged.file_path = ours.file_path
+    merged.encoding = ours.encoding
+    merged.row_size = ours.row_size
+    width = len(ours_columns)
+    kept = [idx for idx, col in enumerate(ours_columns) if col not in dropped]
+    theirs_positions = {col: idx for idx, col in enumerate(theirs_columns)}
+    added_names = [theirs.column_names[theirs_positions[col]] for col in added_theirs]
+    added_sizes = [theirs.column_sizes[theirs_positions[col]] if theirs_positions[col] < len(theirs.column_sizes)
+                   else 0 for col in added_theirs]
+    ours_sizes = list(ours.column_sizes)
+    merged.column_names = ([ours.column_names[idx] for idx in kept if idx < len(ours.column_names)] +
+                           added_names + list(ours.column_names[width:]))
+    merged.column_sizes = ([ours_sizes[idx] for idx in kept if idx < len(ours_sizes)] +
+                           added_sizes + ours_sizes[width:])
+    merged.cells = merged_cells
+    return merged, conflicts
+
+
+def _format_key(key: Key) -> str:
+    name, occurrence = key
+    return f"{name}" if occurrence == 0 else f"{name}#{occurrence + 1}"
+
+
+def print_diff(result: STBDiff, out=sys.stdout):
+    for col in result.removed_columns:
+        print(f"- column {_format_key(col)}", file=out)
+    for col in result.added_columns:
+        print(f"+ column {_format_key(col)}", file=out)
+    for row in result.removed_rows:
+        print(f"- row {_format_key(row)}", file=out)
+    for row in result.added_rows:
+        print(f"+ row {_format_key(row)}", file=out)
+    for change in result.changes:
+        print(f"~ row {_format_key(change['row'])} [{_format_key(change['column'])}]: "
+              f"{change['old']!r} -> {change['new']!r}", file=out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff and merge STB files.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    diff_parser = subparsers.add_parser('diff', help="Show cell-level differences between two STB files.")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('--key', choices=['index', 'name'], default='index',
+                             help="Align rows by row index (default) or by row name.")
+    diff_parser.add_argument('--json', action='store_true', help="Print the diff as JSON.")
+
+    merge_parser = subparsers.add_parser('merge', help="Three-way merge two edited copies of an STB file.")
+    merge_parser.add_argument('base')
+    merge_parser.add_argument('ours')
+    merge_parser.add_argument('theirs')
+    merge_parser.add_argument('-o', '--output', required=True)
+    merge_parser.add_argument('--key', choices=['index', 'name'], default='index')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        result = diff_stb(STB(args.old), STB(args.new), key=args.key)
+        if args.json:
+            json.dump(result.to_dict(), sys.stdout, ensure_ascii=False, indent=1)
+            print()
+        else:
+            print_diff(result)
+        return 0 if result.is_empty() else 1
+
+    merged, conflicts = merge_stb(STB(args.base), STB(args.ours), STB(args.theirs), key=args.key)
+    merged.save(args.output)
+    for conflict in conflicts:
+        row = _format_key(conflict['row']) if conflict['row'] else '*'
+        column = _format_key(conflict['column']) if conflict['column'] else '*'
+        detail = conflict.get('reason') or (f"base={conflict['base']!r} ours={conflict['ours']!r} "
+                                            f"theirs={conflict['theirs']!r}")
+        print(f"CONFLICT row {row} [{column}]: {detail}", file=sys.stderr)
+    print(f"Merged into {args.output} with {len(conflicts)} conflict(s).")
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
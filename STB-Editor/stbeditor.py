@@ -1,177 +1,25 @@
-import struct
-from typing import List
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
 import tkinter.font as tkfont  # Import the font module
 
-
-class STB:
-    def __init__(self, file_path: str = None):
-        self.file_path: str = file_path
-        self.row_size: int = 0
-        self.column_sizes: List[int] = []
-        self.column_names: List[str] = []
-        self.cells: List[List[str]] = []
-        self.encoding: str = 'euc-kr'  # Encoding used in the STB files
-
-        if file_path:
-            self.load(file_path)
-
-    def load(self, file_path: str):
-        with open(file_path, 'rb') as f:
-            self.file_path = file_path
-
-            # Read header
-            magic = f.read(4)
-            if magic not in (b'STB0', b'STB1'):
-                raise ValueError('Invalid STB file.')
-
-            data_offset = struct.unpack('<I', f.read(4))[0]
-            row_count = struct.unpack('<I', f.read(4))[0]
-            column_count = struct.unpack('<I', f.read(4))[0]
-            self.row_size = struct.unpack('<I', f.read(4))[0]
-
-            # Read column sizes
-            self.column_sizes = []
-            for _ in range(column_count + 1):
-                size_data = f.read(2)
-                if not size_data:
-                    break
-                size = struct.unpack('<h', size_data)[0]
-                self.column_sizes.append(size)
-
-            # Read column names
-            self.column_names = []
-            for _ in range(column_count + 1):
-                name_length_data = f.read(2)
-                if not name_length_data:
-                    break
-                name_length = struct.unpack('<h', name_length_data)[0]
-                name_data = f.read(name_length)
-                name = name_data.decode(self.encoding)
-                self.column_names.append(name)
-
-            # Read row names (first cell of each row)
-            self.cells = []
-            for _ in range(row_count - 1):
-                row = []
-                name_length_data = f.read(2)
-                if not name_length_data:
-                    break
-                name_length = struct.unpack('<h', name_length_data)[0]
-                name_data = f.read(name_length)
-                name = name_data.decode(self.encoding)
-                row.append(name)
-                self.cells.append(row)
-
-            # Seek to data offset if necessary
-            current_position = f.tell()
-            if current_position < data_offset:
-                f.seek(data_offset)
-
-            # Read the rest of the cells
-            for row in self.cells:
-                for _ in range(column_count - 1):
-                    cell_length_data = f.read(2)
-                    if not cell_length_data:
-                        break
-                    cell_length = struct.unpack('<h', cell_length_data)[0]
-                    cell_data = f.read(cell_length)
-                    cell = cell_data.decode(self.encoding)
-                    row.append(cell)
-
-    def save(self, file_path: str = None):
-        if file_path is None:
-            file_path = self.file_path
-
-        with open(file_path, 'wb') as f:
-            # Write header
-            f.write(b'STB1')
-
-            # Placeholder for data offset
-            data_offset_position = f.tell()
-            f.write(struct.pack('<I', 0))  # Placeholder
-
-            # Calculate row and column counts
-            row_count = len(self.cells) + 1  # Include header row
-            column_count = max(len(row) for row in self.cells) if self.cells else 0
-
-            f.write(struct.pack('<I', row_count))
-            f.write(struct.pack('<I', column_count))
-            f.write(struct.pack('<I', self.row_size))
-
-            # Write column sizes
-            if not self.column_sizes:
-                # Initialize column sizes to zero if not set
-                self.column_sizes = [0] * (column_count + 1)
-
-            for size in self.column_sizes:
-                f.write(struct.pack('<h', size))
-
-            # Write column names
-            for name in self.column_names:
-                name_bytes = name.encode(self.encoding)
-                f.write(struct.pack('<h', len(name_bytes)))
-                f.write(name_bytes)
-
-            # Write row names (first cell of each row)
-            for row in self.cells:
-                name_bytes = row[0].encode(self.encoding)
-                f.write(struct.pack('<h', len(name_bytes)))
-                f.write(name_bytes)
-
-            # Record data offset
-            data_offset = f.tell()
-
-            # Write the rest of the cells
-            for row in self.cells:
-                for cell in row[1:]:
-                    cell_bytes = cell.encode(self.encoding)
-                    f.write(struct.pack('<h', len(cell_bytes)))
-                    f.write(cell_bytes)
-
-            # Go back and update data offset
-            f.seek(data_offset_position)
-            f.write(struct.pack('<I', data_offset))
-
-    def set_cell(self, row: int, column: int, value: str):
-        if row < 0 or row >= len(self.cells):
-            raise IndexError('Row index out of range.')
-
-        if column < 0:
-            raise IndexError('Column index cannot be negative.')
-
-        # Extend the row if necessary
-        while len(self.cells[row]) <= column:
-            self.cells[row].append('')
-
-        self.cells[row][column] = value
-
-    def get_cell(self, row: int, column: int) -> str:
-        if row < 0 or row >= len(self.cells):
-            raise IndexError('Row index out of range.')
-
-        if column < 0 or column >= len(self.cells[row]):
-            return ''
-
-        return self.cells[row][column]
-
-    def add_row(self, row_data: List[str]):
-        self.cells.append(row_data)
-
-    def add_column(self, column_name: str, default_value: str = ''):
-        self.column_names.append(column_name)
-        self.column_sizes.append(0)  # Adjust size as needed
-
-        for row in self.cells:
-            row.append(default_value)
-
-    def get_row_count(self) -> int:
-        return len(self.cells)
-
-    def get_column_count(self) -> int:
-        return len(self.column_names)
+# The undo journal, find/replace, loading, file watching and profiling code is
+# shared with the tools in the Data-Tools folder next to this one, which has to be
+# present.
+DATA_TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data-Tools')
+if DATA_TOOLS_DIR not in sys.path:
+    sys.path.append(DATA_TOOLS_DIR)
+from undo import UndoStack, has_journal, journal_path_for
+from findreplace import TREE_REBUILD_THRESHOLD, show_find_replace_dialog
+from chunkload import POLL_INTERVAL_MS, TREE_INSERT_BATCH, ChunkLoader
+from stbfilter import OPERATORS, STBFilter, describe_condition, parse_condition
+from filewatch import WATCH_POLL_MS, FileWatcher, conflict_prompt, merge_rows, snapshot_rows, start_reload
+import profiling
+from stb_file import STB, load_stb_chunks, read_stb_rows
 
 
 class STBEditorGUI:
@@ -191,7 +39,40 @@ class STBEditorGUI:
         # Column mapping: Treeview column ID -> actual column index in self.stb.column_names
         self.column_mapping = {}
 
+        # Undo/redo history of the loaded file
+        self.undo_stack = None
+
+        # In-memory SQL copy of the table for the query window, rebuilt after edits
+        self.sql_database = None
+
+        # Cross-file index used to show the STL string behind a cell (see Tools > Load References)
+        self.reference_index = None
+
+        # Column statistics side panel
+        self.show_stats_panel = tk.BooleanVar(value=False)
+        self.stats = None
+        self.stats_column = None  # Column shown in the panel
+        self.stats_refresh_pending = False
+
+        # Filter bar conditions (column, operator, arguments), all of which must hold
+        self.filter_conditions = []
+        self.row_filter = None  # STBFilter of the loaded file, built on the first filter
+        self.filter_columns = []  # STB column of each entry of the filter column box
+
+        # Background load of the file being opened (see open_stb)
+        self.loader = None
+        self.loading_stb = None
+        self.rows_loaded = 0
+        self.rows_shown = 0
+
+        # Reloading the open file when another program changes it (see poll_watcher)
+        self.watch_changes = tk.BooleanVar(value=True)
+        self.watcher = None
+        self.reloader = None
+        self.disk_rows = None  # Rows of the file as last loaded, saved or reloaded: the base of merges
+
         self.create_widgets()
+        self.root.after(WATCH_POLL_MS, self.poll_watcher)
 
     def create_widgets(self):
         # Create menu
@@ -201,22 +82,76 @@ class STBEditorGUI:
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Open", command=self.open_stb)
         file_menu.add_command(label="Save", command=self.save_stb)
+        file_menu.add_checkbutton(label="Watch for External Changes", variable=self.watch_changes,
+                                  command=self.toggle_watching)
+        file_menu.add_command(label="Export Profile...", command=self.export_profile)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.destroy)  # Fixed Exit command
         menubar.add_cascade(label="File", menu=file_menu)
 
+        # Edit menu
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=self.redo)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Find and Replace...", accelerator="Ctrl+H", command=self.show_find_replace)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        self.root.bind_all('<Control-z>', lambda event: self.undo())
+        self.root.bind_all('<Control-y>', lambda event: self.redo())
+        self.root.bind_all('<Control-h>', lambda event: self.show_find_replace())
+
         # View menu
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_checkbutton(label="Show Hidden Columns",
                                   variable=self.show_hidden_columns,
                                   command=self.toggle_hidden_columns)
+        view_menu.add_checkbutton(label="Show Column Statistics",
+                                  variable=self.show_stats_panel,
+                                  command=self.toggle_stats_panel)
         menubar.add_cascade(label="View", menu=view_menu)
 
+        # Tools menu
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="SQL Query...", command=self.show_sql_query)
+        tools_menu.add_command(label="Load References...", command=self.load_references)
+        tools_menu.add_command(label="Check Dangling References", command=self.show_dangling_references)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+
         self.root.config(menu=menubar)
 
+        # Filter bar: conditions are added one by one and combined with AND
+        filter_frame = ttk.Frame(self.root)
+        filter_frame.pack(side=tk.TOP, fill=tk.X)
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT, padx=(5, 2), pady=2)
+        self.filter_column_box = ttk.Combobox(filter_frame, state='readonly', width=28)
+        self.filter_column_box.pack(side=tk.LEFT, padx=2, pady=2)
+        self.filter_operator_box = ttk.Combobox(filter_frame, values=OPERATORS, state='readonly', width=9)
+        self.filter_operator_box.current(0)
+        self.filter_operator_box.pack(side=tk.LEFT, padx=2, pady=2)
+        self.filter_value_entry = ttk.Entry(filter_frame, width=24)
+        self.filter_value_entry.pack(side=tk.LEFT, padx=2, pady=2)
+        ttk.Label(filter_frame, text="to").pack(side=tk.LEFT, padx=2, pady=2)
+        self.filter_high_entry = ttk.Entry(filter_frame, width=10)  # Upper bound of "between"
+        self.filter_high_entry.pack(side=tk.LEFT, padx=2, pady=2)
+        ttk.Button(filter_frame, text="Add", command=self.add_filter_condition).pack(side=tk.LEFT, padx=2, pady=2)
+        ttk.Button(filter_frame, text="Clear", command=self.clear_filter).pack(side=tk.LEFT, padx=2, pady=2)
+        self.filter_label = ttk.Label(filter_frame, text="")
+        self.filter_label.pack(side=tk.LEFT, padx=5, pady=2)
+        self.filter_value_entry.bind('<Return>', lambda event: self.add_filter_condition())
+        self.filter_high_entry.bind('<Return>', lambda event: self.add_filter_condition())
+
         # Create a frame for the Treeview and scrollbars
         tree_frame = ttk.Frame(self.root)
         tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree_frame = tree_frame
+
+        # Column statistics side panel, packed when enabled from the View menu
+        self.stats_panel = ttk.Frame(self.root)
+        ttk.Label(self.stats_panel, text="Column Statistics", font=('Helvetica', 12, 'bold')).pack(anchor='w')
+        self.stats_text = tk.Text(self.stats_panel, width=48, wrap=tk.NONE, font=('Courier', 9))
+        self.stats_text.pack(fill=tk.BOTH, expand=True)
+        self.stats_text.insert('1.0', "Click a cell to see the statistics of its column.")
+        self.stats_text.config(state=tk.DISABLED)
 
         # Initialize the Style
         style = ttk.Style()
@@ -249,6 +184,8 @@ class STBEditorGUI:
         # Create the Treeview with the custom style
         self.tree = ttk.Treeview(tree_frame, style="Custom.Treeview")
         self.tree.bind('<Double-1>', self.on_cell_double_click)
+        self.tree.bind('<ButtonRelease-1>', self.show_cell_reference)
+        self.tree.bind('<ButtonRelease-1>', self.show_column_stats, add='+')
         self.tree.grid(row=0, column=0, sticky='nsew')
 
         # Configure grid to allow the Treeview to expand
@@ -265,14 +202,29 @@ class STBEditorGUI:
         hsb.grid(row=1, column=0, sticky='ew')
         self.tree.configure(xscrollcommand=hsb.set)
 
+        # String referenced by the clicked cell, placed just below it (see show_cell_reference)
+        self.reference_label = tk.Label(self.tree, background='#ffffe0', relief=tk.SOLID, borderwidth=1,
+                                        anchor=tk.W, justify=tk.LEFT, wraplength=400)
+        for sequence in ('<ButtonPress-1>', '<MouseWheel>', '<Button-4>', '<Button-5>', '<KeyPress>'):
+            self.tree.bind(sequence, self.hide_cell_reference, add='+')
+        for scrollbar in (vsb, hsb):
+            scrollbar.bind('<ButtonPress-1>', self.hide_cell_reference, add='+')
+
         # Add Status Bar
         self.status_bar = ttk.Label(self.root, text="Welcome to STB Editor", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
+        # Progress of a file being opened, packed while loading
+        self.load_frame = ttk.Frame(self.root)
+        self.load_progress = ttk.Progressbar(self.load_frame, mode='determinate')
+        self.load_progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=2)
+        ttk.Button(self.load_frame, text="Cancel", command=self.cancel_loading).pack(side=tk.LEFT, padx=5, pady=2)
+
         # Configure Tag Styles for Alternating Rows (Zebra Striping)
         self.tree.tag_configure('evenrow', background='aliceblue')  # Changed from 'lightblue' to 'aliceblue'
         self.tree.tag_configure('oddrow', background='white')
 
+    @profiling.profiled('stb.populate')
     def populate_tree(self):
         if not self.stb:
             return
@@ -280,13 +232,25 @@ class STBEditorGUI:
         # Clear existing data
         for item in self.tree.get_children():
             self.tree.delete(item)
+        self.hide_cell_reference()
 
+        self.configure_tree_columns(self.stb)
+        if self.filter_conditions:
+            self.insert_tree_rows(self.stb, self.get_row_filter().matching_rows(self.filter_conditions))
+        else:
+            self.insert_tree_rows(self.stb, range(len(self.stb.cells)))
+
+        # Update the status bar with the total number of rows
+        self.status_bar.config(text=f"Total Rows: {len(self.stb.cells)}")
+
+    def configure_tree_columns(self, stb: STB):
+        """Sets up the Treeview columns for an STB, hiding "Null"/"N/A" columns unless asked not to."""
         # Initialize column lists
-        self.all_columns = [f'col{idx}' for idx in range(1, len(self.stb.column_names))]
+        self.all_columns = [f'col{idx}' for idx in range(1, len(stb.column_names))]
         self.hidden_columns = []  # Reset hidden columns
 
         # Identify columns to hide based on headers
-        for idx, header in enumerate(self.stb.column_names[1:], start=1):
+        for idx, header in enumerate(stb.column_names[1:], start=1):
             if header in ["Null", "N/A"]:
                 self.hidden_columns.append(f'col{idx}')
 
@@ -317,7 +281,7 @@ class STBEditorGUI:
             # Find the header from stb.column_names
             try:
                 col_number = int(col_id.replace('col', ''))
-                header = self.stb.column_names[col_number]
+                header = stb.column_names[col_number]
                 self.column_mapping[col_id] = col_number  # Map Treeview column to actual column index
             except (ValueError, IndexError):
                 header = col_id  # Fallback to col_id if parsing fails
@@ -325,44 +289,459 @@ class STBEditorGUI:
             self.tree.heading(col_id, text=header)
             self.tree.column(col_id, width=150, minwidth=100, stretch=False)
 
+    @profiling.profiled('stb.insert_rows')
+    def insert_tree_rows(self, stb: STB, rows: Iterable[int]):
+        """Appends the given rows of an STB to the Treeview."""
         # Insert data with row numbering and zebra striping
-        total_rows = len(self.stb.cells)
-        for row_idx, row_data in enumerate(self.stb.cells, start=0):
-            values = row_data[1:]  # Exclude row name
-            # Filter out values corresponding to hidden columns
-            filtered_values = [
-                value for idx, value in enumerate(values, start=1)
-                if f'col{idx}' not in self.hidden_columns
-            ]
+        hidden_columns = set(self.hidden_columns)
+        cells = stb.cells
+        for row_idx in rows:
             # Determine tag based on row index for zebra striping
             tag = 'evenrow' if row_idx % 2 == 0 else 'oddrow'
             # Insert the row with 'No.' and 'Row Name' + filtered values
             self.tree.insert(
                 '', 'end', iid=str(row_idx), text=str(row_idx + 1),
-                values=[row_data[0]] + filtered_values,
+                values=self.tree_values(cells[row_idx], hidden_columns),
                 tags=(tag,)
             )
 
-        # Update the status bar with the total number of rows
-        self.status_bar.config(text=f"Total Rows: {total_rows}")
+    @staticmethod
+    def tree_values(row_data: List[str], hidden_columns: Set[str]) -> List[str]:
+        """Treeview values of a row: its name, then the cells of the visible columns."""
+        values = row_data[1:]  # Exclude row name
+        # Filter out values corresponding to hidden columns
+        return [row_data[0]] + [
+            value for idx, value in enumerate(values, start=1)
+            if f'col{idx}' not in hidden_columns
+        ]
+
+    def get_row_filter(self) -> STBFilter:
+        if self.row_filter is None or self.row_filter.stb is not self.stb:
+            self.row_filter = STBFilter(self.stb)
+        return self.row_filter
+
+    def update_filter_columns(self):
+        """Fills the filter bar's column box with the columns of the loaded file."""
+        names = []
+        if self.stb is not None:
+            names = ['Row Name'] + [f"{name} ({idx})" for idx, name in enumerate(self.stb.column_names[1:], start=1)]
+        self.filter_columns = list(range(len(names)))
+        self.filter_column_box['values'] = names
+        self.filter_column_box.set('')
+
+    def add_filter_condition(self):
+        if self.stb is None:
+            messagebox.showwarning("Warning", "No STB file loaded.")
+            return
+        position = self.filter_column_box.current()
+        if position < 0:
+            messagebox.showwarning("Filter", "Choose a column to filter on.")
+            return
+        try:
+            condition = parse_condition(self.filter_columns[position], self.filter_operator_box.get(),
+                                        self.filter_value_entry.get(), self.filter_high_entry.get())
+        except ValueError as e:
+            messagebox.showwarning("Filter", str(e))
+            return
+        self.filter_conditions.append(condition)
+        self.apply_filter()
+
+    def apply_filter(self):
+        """Shows only the rows matching every filter condition."""
+        started = time.perf_counter()
+        with profiling.span('stb.filter', conditions=len(self.filter_conditions)):
+            rows = self.get_row_filter().matching_rows(self.filter_conditions)
+        elapsed = time.perf_counter() - started
+
+        self.tree.delete(*self.tree.get_children())
+        self.insert_tree_rows(self.stb, rows)
+        names = self.filter_column_box['values']
+        self.filter_label.config(text=' AND '.join(
+            describe_condition(condition, names[self.filter_columns.index(condition[0])])
+            for condition in self.filter_conditions))
+        self.status_bar.config(text=f"Filter: {len(rows)} of {len(self.stb.cells)} rows ({elapsed * 1000:.1f} ms)")
+
+    def clear_filter(self):
+        self.filter_conditions = []
+        self.filter_label.config(text="")
+        if self.stb is not None:
+            self.populate_tree()
 
     def toggle_hidden_columns(self):
         """Toggle the visibility of hidden columns based on the menu option."""
         self.populate_tree()
 
+    def undo(self):
+        step = self.undo_stack.undo() if self.undo_stack else None
+        self.status_bar.config(text=f"Undid: {step.label}" if step else "Nothing to undo.")
+
+    def redo(self):
+        step = self.undo_stack.redo() if self.undo_stack else None
+        self.status_bar.config(text=f"Redid: {step.label}" if step else "Nothing to redo.")
+
+    def apply_undo_delta(self, row: int, column: int, value: str):
+        """Writes one side of an undo delta back into the STB data and the Treeview."""
+        self.stb.set_cell(row, column, value)
+        self.sql_database = None
+        column_id = 'row_name' if column == 0 else f'col{column}'
+        if column_id in self.tree['columns'] and self.tree.exists(str(row)):
+            self.tree.set(str(row), column_id, value)
+
+    def show_find_replace(self):
+        """
+        Opens the find/replace window. Matches are counted and replacements
+        planned on a worker thread, then applied as a single undo step.
+        """
+        if self.stb is None:
+            messagebox.showwarning("Warning", "No STB file loaded.")
+            return
+        # Columns to search: "Row Name" is cell 0, the others are labelled like the Treeview headings
+        width = max(map(len, self.stb.cells), default=0)
+        column_labels = ['0: Row Name'] + [
+            f"{idx}: {self.stb.column_names[idx] if idx < len(self.stb.column_names) else f'col{idx}'}"
+            for idx in range(1, width)
+        ]
+        show_find_replace_dialog(self.root, column_labels, range(width),
+                                 lambda columns: (self.stb.cells, columns), self.apply_replacements)
+
+    def apply_replacements(self, deltas, label: str) -> int:
+        """
+        Applies (row, column, old, new) replacements as one undo step. Cells
+        edited since the scan are left alone.
+
+        Returns:
+            int: Number of cells changed.
+        """
+        rebuild_tree = len(deltas) > TREE_REBUILD_THRESHOLD
+        changed = 0
+        with self.undo_stack.batch(label):
+            for row, column, old_value, new_value in deltas:
+                if row >= len(self.stb.cells) or self.stb.get_cell(row, column) != old_value:
+                    continue
+                if rebuild_tree:
+                    self.stb.set_cell(row, column, new_value)
+                else:
+                    self.apply_undo_delta(row, column, new_value)
+                self.undo_stack.record(row, column, old_value, new_value)
+                changed += 1
+        self.sql_database = None
+        if rebuild_tree:
+            self.populate_tree()
+        self.status_bar.config(text=f"{label}: {changed} cell(s) changed | Total Rows: {len(self.stb.cells)}")
+        return changed
+
+    def get_sql_database(self):
+        """
+        Returns the loaded STB as an in-memory SQL table, building it on first
+        use after the file was opened or edited.
+        """
+        from rosesql import RoseDatabase, table_name_for  # Data-Tools folder, loaded on first query
+
+        if self.sql_database is None:
+            width = max(map(len, self.stb.cells), default=0)
+            self.sql_database = RoseDatabase()
+            self.sql_database.add_table(table_name_for(self.stb.file_path or 'stb'),
+                                        [f'col{idx}' for idx in range(width)], self.stb.cells,
+                                        ['col0'], self.stb.file_path)
+        return self.sql_database
+
+    def show_sql_query(self):
+        """
+        Opens a window to filter and sort the loaded table with SQL. Results are
+        streamed into the window in batches; double-clicking a result selects
+        the row in the main view.
+        """
+        from rosesql import show_sql_query_dialog, table_name_for
+
+        if self.stb is None:
+            messagebox.showwarning("Warning", "No STB file loaded.")
+            return
+
+        def select_row(row):
+            if self.tree.exists(str(row)):
+                self.tree.selection_set(str(row))
+                self.tree.focus(str(row))
+                self.tree.see(str(row))
+
+        table_name = table_name_for(self.stb.file_path or 'stb')
+        show_sql_query_dialog(self.root, table_name,
+                              "Columns are col0 (Row Name), col1, col2... and _row (row number, starting at 0).",
+                              f"SELECT * FROM {table_name} WHERE col1 <> '' ORDER BY col0 LIMIT 1000",
+                              self.get_sql_database, select_row)
+
+    def load_references(self, then=None):
+        """
+        Indexes the STL/LTB strings of a data directory so the text behind a
+        clicked cell (e.g. LFAC001 -> "Flu Mask") is shown next to it.
+        `then` is called without arguments once the index is ready.
+        """
+        initial_dir = os.path.dirname(self.stb.file_path) if self.stb and self.stb.file_path else None
+        directory = filedialog.askdirectory(title="Select Data Directory", initialdir=initial_dir)
+        if not directory:
+            return
+        self.status_bar.config(text=f"Indexing references in {directory}...")
+
+        def indexed(parsed):
+            self.status_bar.config(text=f"References: {len(self.reference_index.targets)} string(s) indexed "
+                                        f"({parsed} file(s) parsed). Click a cell to see its string.")
+            if then is not None:
+                then()
+        self.refresh_references(directory=directory, then=indexed)
+
+    def refresh_references(self, directory=None, paths=None, then=None):
+        """
+        Brings the reference index up to date on a worker thread, so walking and
+        parsing a large data directory doesn't freeze the window.
+
+        Args:
+            directory: Index this data directory instead of the current one. Its
+                stored index is read on the worker too.
+            paths: Only check these files (e.g. the one just saved), not the whole directory.
+            then: Called on the main loop as then(files parsed) once the index is current.
+        """
+        from refindex import ReferenceIndex  # Data-Tools folder
+
+        index = self.reference_index
+
+        def refresh():
+            current = ReferenceIndex(directory) if directory else index
+            yield current, current.refresh(paths=paths)
+        loader = ChunkLoader(refresh())
+        loader.start()
+
+        def poll():
+            results, finished = loader.poll()
+            if not finished:
+                self.root.after(POLL_INTERVAL_MS, poll)
+                return
+            if loader.error is not None:
+                messagebox.showerror("Error", f"Failed to index references:\n{loader.error}")
+                self.status_bar.config(text="Failed to index references.")
+                return
+            current, parsed = results[0]
+            if directory:
+                self.reference_index = current
+            elif current is not self.reference_index:
+                return  # Another directory was loaded meanwhile
+            if then is not None:
+                then(parsed)
+        self.root.after(POLL_INTERVAL_MS, poll)
+
+    def column_at(self, event) -> int:
+        """STB column index under the mouse, or -1 (for the No. column or outside the data)."""
+        column = self.tree.identify_column(event.x)
+        if not column or column == '#0':
+            return -1
+        column_id = self.tree['columns'][int(column.replace('#', '')) - 1]
+        return 0 if column_id == 'row_name' else self.column_mapping.get(column_id, -1)
+
+    def show_cell_reference(self, event):
+        """
+        Shows the string referenced by the clicked cell next to the cell, and in
+        the status bar.
+        """
+        if self.reference_index is None or self.stb is None:
+            return
+        item_id = self.tree.identify_row(event.y)
+        column_idx = self.column_at(event)
+        if not item_id or column_idx < 0:
+            return
+        value = self.stb.get_cell(int(item_id), column_idx).strip()
+        if not value:
+            return
+        text = self.reference_index.resolve(value)
+        if text is not None:
+            message = f"{value} -> {text}"
+        elif self.reference_index.referrers.get(value) is not None:
+            message = f"{value}: no string with this id in the indexed directory"
+        else:
+            return
+        self.status_bar.config(text=message)
+
+        bbox = self.tree.bbox(item_id, self.tree.identify_column(event.x))
+        if not bbox:
+            return
+        x, y, width, height = bbox
+        self.reference_label.config(text=text if text is not None else "(no string with this id)")
+        self.reference_label.update_idletasks()
+        label_height = self.reference_label.winfo_reqheight()
+        # Below the cell, or above it when the row is at the bottom of the view
+        top = y + height if y + height + label_height <= self.tree.winfo_height() else max(y - label_height, 0)
+        self.reference_label.place(x=x, y=top)
+        self.reference_label.lift()
+
+    def hide_cell_reference(self, event=None):
+        self.reference_label.place_forget()
+
+    def show_dangling_references(self):
+        """Lists references to strings that don't exist, across the indexed directory."""
+        if self.reference_index is None:
+            self.load_references(then=self.list_dangling_references)
+            return
+        # Only re-parses files changed since the last run
+        self.refresh_references(then=lambda parsed: self.list_dangling_references())
+
+    def list_dangling_references(self):
+        """Shows the dangling references of the (up to date) index in a window."""
+        dangling = self.reference_index.dangling()
+        if not dangling:
+            messagebox.showinfo("Dangling References", "Every reference resolves to a string.")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"Dangling References ({len(dangling)})")
+        listbox = tk.Listbox(window, width=100, height=25)
+        for hit in dangling:
+            listbox.insert(tk.END, f"{hit['file']}  row {hit['row'] + 1}  {hit['column_name']}: {hit['value']}")
+        listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    def toggle_stats_panel(self):
+        if self.show_stats_panel.get():
+            self.stats_panel.pack(side=tk.RIGHT, fill=tk.Y, before=self.tree_frame)
+            self.refresh_stats_panel()
+        else:
+            self.stats_panel.pack_forget()
+
+    def show_column_stats(self, event):
+        """Shows the statistics of the clicked column in the side panel."""
+        if not self.show_stats_panel.get() or self.stb is None:
+            return
+        column_idx = self.column_at(event)
+        if column_idx >= 0 and column_idx != self.stats_column:
+            self.stats_column = column_idx
+            self.refresh_stats_panel()
+
+    def on_stb_cell_changed(self, row: int, column: int, old_value: str, new_value: str):
+        # Refresh once after a batch of edits (find/replace, undo) rather than per cell
+        if column == self.stats_column and self.show_stats_panel.get() and not self.stats_refresh_pending:
+            self.stats_refresh_pending = True
+            self.root.after_idle(self.refresh_stats_panel)
+
+    def refresh_stats_panel(self):
+        from stbstats import STBStats, format_summary  # Loaded when the panel is first shown
+
+        self.stats_refresh_pending = False
+        if self.stb is None or self.stats_column is None:
+            return
+        if self.stats is None or self.stats.stb is not self.stb:
+            self.stats = STBStats(self.stb)
+        text = format_summary(self.stats.summarize(self.stats_column))
+        self.stats_text.config(state=tk.NORMAL)
+        self.stats_text.delete('1.0', tk.END)
+        self.stats_text.insert('1.0', text)
+        self.stats_text.config(state=tk.DISABLED)
+
+    def start_undo_history(self, file_path: str):
+        """
+        Starts a fresh undo history for the loaded file, offering to recover
+        unsaved edits if the edit journal of a previous session is still there.
+        """
+        if self.undo_stack:
+            self.undo_stack.close_journal()
+        self.undo_stack = UndoStack(self.apply_undo_delta, journal_path=journal_path_for(file_path),
+                                    source_path=file_path)
+        if not has_journal(file_path):
+            return
+        if not messagebox.askyesno("Recover Edits",
+                                   "Unsaved edits from a previous session were found for this file.\n"
+                                   "Do you want to recover them?"):
+            self.undo_stack.mark_saved()  # Discard the old journal
+            return
+        try:
+            steps = self.undo_stack.replay_journal()
+            self.status_bar.config(text=f"Recovered {steps} edit(s) from the previous session.")
+        except (OSError, ValueError) as e:
+            messagebox.showwarning("Recover Edits", f"Could not recover edits:\n{e}")
+
     def open_stb(self):
         file_path = filedialog.askopenfilename(
             title="Open STB File",
             filetypes=[("STB files", "*.stb"), ("All files", "*.*")]
         )
         if file_path:
-            try:
-                self.stb = STB(file_path)
-                self.populate_tree()
-                self.status_bar.config(text=f"Loaded: {file_path} | Total Rows: {len(self.stb.cells)}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to open STB file:\n{e}")
-                self.status_bar.config(text="Failed to load STB file.")
+            self.start_loading(file_path)
+
+    def start_loading(self, file_path: str):
+        """
+        Parses the file on a background thread. Rows are added to the Treeview
+        as they come in (see poll_loading); the file becomes editable once it
+        is fully loaded.
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.undo_stack:
+            self.undo_stack.close_journal()
+            self.undo_stack = None
+        self.stop_watching()
+        self.watcher = FileWatcher(file_path)  # Created first, so changes made while loading are caught
+        self.stb = None  # Nothing is editable until the new file is complete
+        self.sql_database = None
+        self.stats = None
+        self.stats_column = None
+        self.loading_stb = None
+        self.rows_loaded = 0
+        self.rows_shown = 0
+        self.filter_conditions = []
+        self.row_filter = None
+        self.filter_label.config(text="")
+        self.update_filter_columns()
+        self.tree.delete(*self.tree.get_children())
+
+        self.loader = ChunkLoader(load_stb_chunks(file_path))
+        self.loader.start()
+        self.load_progress.config(value=0, maximum=1)
+        self.load_frame.pack(side=tk.BOTTOM, fill=tk.X, after=self.status_bar)
+        self.status_bar.config(text=f"Loading: {file_path}")
+        self.root.after(POLL_INTERVAL_MS, self.poll_loading, self.loader, file_path)
+
+    def poll_loading(self, loader: ChunkLoader, file_path: str):
+        if loader is not self.loader:
+            return  # Cancelled, or replaced by another file
+        chunks, finished = loader.poll()
+        for stb, rows_done, total_rows in chunks:
+            if self.loading_stb is None:
+                self.loading_stb = stb
+                self.configure_tree_columns(stb)
+            self.rows_loaded = rows_done
+            self.load_progress.config(value=rows_done, maximum=max(total_rows, 1))
+
+        if self.rows_shown < self.rows_loaded:
+            end = min(self.rows_loaded, self.rows_shown + TREE_INSERT_BATCH)
+            self.insert_tree_rows(self.loading_stb, range(self.rows_shown, end))
+            self.rows_shown = end
+            self.status_bar.config(text=f"Loading: {file_path} | {self.rows_shown} rows")
+
+        if not finished or self.rows_shown < self.rows_loaded:
+            self.root.after(POLL_INTERVAL_MS, self.poll_loading, loader, file_path)
+            return
+
+        self.loader = None
+        self.load_frame.pack_forget()
+        if loader.error is not None or self.loading_stb is None:
+            self.tree.delete(*self.tree.get_children())
+            messagebox.showerror("Error", f"Failed to open STB file:\n{loader.error}")
+            self.status_bar.config(text="Failed to load STB file.")
+            return
+        self.stb = self.loading_stb
+        self.loading_stb = None
+        self.stb.add_listener(self.on_stb_cell_changed)
+        self.update_filter_columns()
+        self.status_bar.config(text=f"Loaded: {file_path} | Total Rows: {len(self.stb.cells)}")
+        self.disk_rows = snapshot_rows(self.stb.cells)  # Before recovered edits are replayed
+        self.start_undo_history(file_path)
+        if self.watch_changes.get():
+            self.watcher.start()
+
+    def cancel_loading(self):
+        if self.loader is None:
+            return
+        self.loader.cancel()
+        self.loader = None
+        self.loading_stb = None
+        self.stop_watching()
+        self.load_frame.pack_forget()
+        self.tree.delete(*self.tree.get_children())
+        self.status_bar.config(text="Loading cancelled.")
 
     def save_stb(self):
         if self.stb is None:
@@ -375,15 +754,192 @@ class STBEditorGUI:
             filetypes=[("STB files", "*.stb"), ("All files", "*.*")]
         )
         if file_path:
+            watched = self.watcher is not None and self.watcher.watches(file_path)
+            if watched and self.watcher.changed_on_disk() and not messagebox.askyesno(
+                    "File Changed on Disk",
+                    f"{os.path.basename(file_path)} was changed on disk by another program, and those changes "
+                    "are not in the editor.\nDo you want to overwrite them?"):
+                return
             try:
                 self.stb.save(file_path)
+                if watched:
+                    self.stop_reload()  # Whatever it read is older than what was just saved
+                    self.disk_rows = snapshot_rows(self.stb.cells)
+                    self.watcher.mark_synced()
+                if self.reference_index is not None:
+                    self.refresh_references(paths=[file_path])  # Re-parses the saved file only
+                if self.undo_stack:
+                    self.undo_stack.mark_saved(file_path)  # The crash-recovery journal is no longer needed
                 messagebox.showinfo("Success", "STB file saved successfully.")
                 self.status_bar.config(text=f"Saved: {file_path} | Total Rows: {len(self.stb.cells)}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save STB file:\n{e}")
                 self.status_bar.config(text="Failed to save STB file.")
 
+    def toggle_watching(self):
+        if self.watcher is None or self.stb is None:
+            return
+        if self.watch_changes.get():
+            self.watcher.start()
+        else:
+            self.watcher.stop()
+            self.stop_reload()
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.stop_reload()
+        self.disk_rows = None
+
+    def stop_reload(self):
+        if self.reloader is not None:
+            self.reloader.cancel()
+            self.reloader = None
+
+    def poll_watcher(self):
+        """
+        Runs every WATCH_POLL_MS: when another program changed the open file,
+        parses it again in the background and merges the changed rows in.
+        """
+        self.root.after(WATCH_POLL_MS, self.poll_watcher)
+        if self.watcher is None or self.stb is None or self.root.grab_current() is not None:
+            return  # Nothing loaded, or a cell is being edited: wait until its dialog is closed
+        if self.reloader is None:
+            if self.watch_changes.get() and self.watcher.poll():
+                self.reloader = start_reload(self.watcher.file_path, read_stb_rows, self.disk_rows)
+                self.status_bar.config(text=f"{os.path.basename(self.watcher.file_path)} changed on disk, reloading...")
+            return
+        chunks, finished = self.reloader.poll()
+        if not finished:
+            return
+        reloader, self.reloader = self.reloader, None
+        if reloader.error is not None or not chunks:
+            self.status_bar.config(text=f"Failed to reload {os.path.basename(self.watcher.file_path)}: {reloader.error}")
+            return
+        self.apply_disk_changes(*chunks[0])
+
+    def apply_disk_changes(self, new_stb: STB, new_rows: List[List[str]], pairs, signature):
+        """
+        Merges the version of the file now on disk into the editor. Rows only
+        changed on disk are updated in place; cells also edited here are
+        conflicts, resolved by the user.
+        """
+        file_name = os.path.basename(self.watcher.file_path)
+        merge = merge_rows(self.disk_rows, self.stb.cells, new_rows, pairs=pairs)
+        if merge.conflicts:
+            keep = messagebox.askyesnocancel(
+                "File Changed on Disk",
+                conflict_prompt(file_name, merge, ['Row Name'] + self.stb.column_names[1:]))
+            if keep is None:
+                self.status_bar.config(text=f"{file_name} changed on disk, not reloaded.")
+                return
+            if not keep:
+                merge = merge_rows(self.disk_rows, self.stb.cells, new_rows, keep_ours=False, pairs=pairs)
+
+        header_changed = ((new_stb.column_names, new_stb.column_sizes, new_stb.row_size)
+                          != (self.stb.column_names, self.stb.column_sizes, self.stb.row_size))
+        with profiling.span('stb.reload', changed=len(merge.changed_rows), moved=merge.rows_moved):
+            if merge.rows_moved or header_changed:
+                self.stb.cells = merge.rows
+                self.stb.column_names = new_stb.column_names
+                self.stb.column_sizes = new_stb.column_sizes
+                self.stb.row_size = new_stb.row_size
+                self.row_filter = None
+                self.stats = None
+                if header_changed:
+                    self.update_filter_columns()
+                    self.filter_conditions = []
+                    self.filter_label.config(text="")
+                self.refresh_tree(merge.row_map(), header_changed)
+            else:
+                hidden_columns = set(self.hidden_columns)
+                for row in merge.changed_rows:
+                    merged = merge.rows[row]
+                    for column, value in enumerate(merged):
+                        if self.stb.get_cell(row, column) != value:
+                            self.stb.set_cell(row, column, value)  # Listeners update the filter and statistics
+                    if len(self.stb.cells[row]) > len(merged):
+                        del self.stb.cells[row][len(merged):]
+                        self.row_filter = None
+                    if self.tree.exists(str(row)):
+                        self.tree.item(str(row), values=self.tree_values(merged, hidden_columns))
+                if self.filter_conditions and merge.changed_rows:
+                    self.refresh_tree()  # Changed rows may now match the filter, or no longer match it
+        self.sql_database = None
+        self.disk_rows = snapshot_rows(new_rows)
+        self.watcher.mark_synced(signature)
+        self.restart_undo_history(merge.kept_edits)
+
+        message = f"Reloaded {file_name} from disk: {len(merge.changed_rows)} row(s) updated"
+        if merge.removed_rows:
+            message += f", {len(merge.removed_rows)} removed"
+        if merge.conflicts:
+            message += f", {len(merge.conflicts)} conflict(s) resolved"
+        self.status_bar.config(text=f"{message} | Total Rows: {len(self.stb.cells)}")
+
+    def refresh_tree(self, row_map: Optional[Dict[int, int]] = None, columns_changed: bool = False):
+        """
+        Refills the Treeview after a reload, keeping the selection, focus and
+        scroll position. `row_map` maps old rows to new ones if rows moved.
+        """
+        def moved(item: str) -> str:
+            if row_map is None:
+                return item
+            return str(row_map.get(int(item), -1))
+
+        selection = [moved(item) for item in self.tree.selection()]
+        focus = moved(self.tree.focus()) if self.tree.focus() else ''
+        top = self.tree.yview()[0]
+        self.tree.delete(*self.tree.get_children())
+        if columns_changed:
+            self.configure_tree_columns(self.stb)
+        if self.filter_conditions:
+            self.insert_tree_rows(self.stb, self.get_row_filter().matching_rows(self.filter_conditions))
+        else:
+            self.insert_tree_rows(self.stb, range(len(self.stb.cells)))
+        self.tree.selection_set([item for item in selection if self.tree.exists(item)])
+        if focus and self.tree.exists(focus):
+            self.tree.focus(focus)
+        self.tree.yview_moveto(top)
+
+    def restart_undo_history(self, kept_edits):
+        """
+        Starts the undo history over after a reload, as its row numbers and the
+        journal belong to the previous version of the file. The unsaved edits
+        kept by the merge become one undo step (and are journaled again).
+        """
+        if self.undo_stack:
+            self.undo_stack.mark_saved()  # Journal of the previous version
+        self.start_undo_history(self.watcher.file_path)
+        with self.undo_stack.batch("Unsaved Edits"):
+            for row, column, disk_value, value in kept_edits:
+                self.undo_stack.record(row, column, disk_value, value)
+
+    def export_profile(self):
+        """Saves the recorded timings and counters (profiling is on when ROSE_PROFILE is set)."""
+        if not profiling.is_enabled():
+            messagebox.showinfo("Export Profile",
+                                "Profiling is off. Start the editor with the environment variable ROSE_PROFILE=1 "
+                                "to record load, search, display and save timings.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Export Profile",
+            defaultextension=".json",
+            filetypes=[("JSON report", "*.json"), ("Chrome trace", "*.trace.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            profiling.export(file_path)  # A name ending in .trace.json gets a Chrome trace
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to write the profile:\n{e}")
+            return
+        self.status_bar.config(text=f"Profile exported to {file_path}")
+
     def on_cell_double_click(self, event):
+        if self.stb is None:
+            return  # No file, or still loading
         item_id = self.tree.focus()
         column = self.tree.identify_column(event.x)
         row = self.tree.identify_row(event.y)
@@ -442,7 +998,11 @@ class STBEditorGUI:
 
                 # Update the STB data
                 try:
+                    old_value = self.stb.get_cell(row_index, column_idx)
                     self.stb.set_cell(row_index, column_idx, new_value)
+                    self.sql_database = None
+                    if self.undo_stack:
+                        self.undo_stack.record(row_index, column_idx, old_value, new_value)
                 except IndexError as ie:
                     messagebox.showerror("Error", f"Failed to set cell: {ie}")
                     edit_window.destroy()
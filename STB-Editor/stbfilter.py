@@ -0,0 +1,208 @@
+"""
+Row filters for STB tables, backed by per-column indexes.
+
+A filter is a list of conditions on columns, all of which must hold:
+
+    contains  case-insensitive substring        ('contains', 'mask')
+    equals    exact cell value                  ('equals', '0')
+    between   numeric range, bounds inclusive   ('between', 500, None)
+
+Indexes are built per column the first time a condition uses it: a hash map
+of value -> rows (substring conditions are tested once per distinct value,
+which in game data are far fewer than the rows), and for numeric conditions
+the column's numbers sorted with their rows, so a range is two bisects.
+
+Each condition yields a bitmap of matching rows (a Python int, bit N set
+for row N), cached until its column changes, and compound filters are the
+AND of those bitmaps. The STB's set_cell listeners keep the value maps up
+to date and drop what an edit makes stale.
+"""
+import bisect
+import math
+from typing import Dict, List, Optional, Set, Tuple
+
+OPERATORS = ['contains', 'equals', 'between']
+
+Condition = Tuple[int, str, tuple]  # (column, operator, arguments)
+
+
+# Set bits of each byte value, for turning bitmaps back into rows
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def rows_to_bitmap(rows) -> int:
+    """Bitmap with the bit of every given row set."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    bits = bytearray(max(rows) // 8 + 1)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_to_rows(bitmap: int) -> List[int]:
+    """Rows whose bit is set, in ascending order."""
+    if not bitmap:
+        return []
+    rows = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index << 3
+            rows.extend([base + bit for bit in _BYTE_BITS[byte]])
+    return rows
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+class ColumnIndex:
+    """Value -> rows map of one column, and its numbers in sorted order (built on first use)."""
+
+    def __init__(self, values: List[str]):
+        self.rows_by_value: Dict[str, Set[int]] = {}
+        for row, value in enumerate(values):
+            rows = self.rows_by_value.get(value)
+            if rows is None:
+                self.rows_by_value[value] = {row}
+            else:
+                rows.add(row)
+        self.numbers: Optional[List[float]] = None  # Sorted numbers of the numeric cells...
+        self.number_rows: Optional[List[int]] = None  # ...and the row of each
+
+    def update(self, row: int, old_value: str, new_value: str):
+        rows = self.rows_by_value.get(old_value)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self.rows_by_value[old_value]
+        self.rows_by_value.setdefault(new_value, set()).add(row)
+        self.numbers = self.number_rows = None  # Re-sorted on the next range condition
+
+    def sorted_numbers(self) -> Tuple[List[float], List[int]]:
+        if self.numbers is None:
+            pairs = []
+            for value, rows in self.rows_by_value.items():
+                number = _number(value) if value else None
+                if number is not None:
+                    pairs.extend((number, row) for row in rows)
+            pairs.sort()
+            self.numbers = [number for number, _ in pairs]
+            self.number_rows = [row for _, row in pairs]
+        return self.numbers, self.number_rows
+
+    def matching_rows(self, operator: str, arguments: tuple) -> List[int]:
+        if operator == 'equals':
+            return list(self.rows_by_value.get(arguments[0], ()))
+        if operator == 'contains':
+            needle = arguments[0].casefold()
+            rows = []
+            for value, value_rows in self.rows_by_value.items():
+                if needle in value.casefold():
+                    rows.extend(value_rows)
+            return rows
+        if operator == 'between':
+            low, high = arguments
+            numbers, number_rows = self.sorted_numbers()
+            start = 0 if low is None else bisect.bisect_left(numbers, low)
+            end = len(numbers) if high is None else bisect.bisect_right(numbers, high)
+            return number_rows[start:end]
+        raise ValueError(f"Unknown operator: {operator}")
+
+
+class STBFilter:
+    """Lazily indexed, incrementally maintained row filtering of an STB."""
+
+    def __init__(self, stb):
+        self.stb = stb
+        self.indexes: Dict[int, ColumnIndex] = {}
+        self.bitmaps: Dict[Condition, int] = {}  # Cached result of each condition
+        self.row_count = len(stb.cells)
+        stb.add_listener(self.cell_changed)
+
+    def _check_rows(self):
+        if len(self.stb.cells) != self.row_count:
+            # Rows were added or removed outside set_cell, start over
+            self.indexes = {}
+            self.bitmaps = {}
+            self.row_count = len(self.stb.cells)
+
+    def index(self, column: int) -> ColumnIndex:
+        self._check_rows()
+        index = self.indexes.get(column)
+        if index is None:
+            cells = self.stb.cells
+            try:
+                values = [row[column] for row in cells]
+            except IndexError:
+                values = [row[column] if column < len(row) else '' for row in cells]
+            index = self.indexes[column] = ColumnIndex(values)
+        return index
+
+    def condition_bitmap(self, condition: Condition) -> int:
+        self._check_rows()
+        bitmap = self.bitmaps.get(condition)
+        if bitmap is None:
+            column, operator, arguments = condition
+            bitmap = self.bitmaps[condition] = rows_to_bitmap(self.index(column).matching_rows(operator, arguments))
+        return bitmap
+
+    def matching_rows(self, conditions: List[Condition]) -> List[int]:
+        """Rows matching every condition, in file order (every row if there are none)."""
+        if not conditions:
+            return list(range(len(self.stb.cells)))
+        bitmap = -1  # All bits set
+        for condition in conditions:
+            bitmap &= self.condition_bitmap(condition)
+            if not bitmap:
+                break
+        return bitmap_to_rows(bitmap)
+
+    def cell_changed(self, row: int, column: int, old_value: str, new_value: str):
+        """STB listener: patches the column's index and drops its cached bitmaps."""
+        index = self.indexes.get(column)
+        if index is not None:
+            index.update(row, old_value, new_value)
+        if self.bitmaps:
+            self.bitmaps = {condition: bitmap for condition, bitmap in self.bitmaps.items()
+                            if condition[0] != column}
+
+
+def parse_condition(column: int, operator: str, value: str, high_value: str = '') -> Condition:
+    """
+    Builds a condition from the filter bar's fields.
+
+    Raises:
+        ValueError: If the operator is unknown or a bound of 'between' is not a number.
+    """
+    if operator in ('contains', 'equals'):
+        return column, operator, (value if operator == 'equals' else value.strip(),)
+    if operator != 'between':
+        raise ValueError(f"Unknown operator: {operator}")
+    bounds = []
+    for text in (value, high_value):
+        text = text.strip()
+        if not text:
+            bounds.append(None)
+            continue
+        number = _number(text)
+        if number is None:
+            raise ValueError(f"'{text}' is not a number.")
+        bounds.append(number)
+    if bounds == [None, None]:
+        raise ValueError("Enter a lower bound, an upper bound, or both.")
+    return column, operator, tuple(bounds)
+
+
+def describe_condition(condition: Condition, column_name: str) -> str:
+    column, operator, arguments = condition
+    if operator == 'between':
+        low, high = ('' if bound is None else f'{bound:g}' for bound in arguments)
+        return f"{column_name} in {low}..{high}"
+    return f"{column_name} {operator} {arguments[0]!r}"
@@ -0,0 +1,169 @@
+"""
+Per-column statistics for STB tables: min, max, mean, histogram, distinct
+and most common values.
+
+Each column is reduced once to a Counter of its values (a single C-level
+pass), and every statistic is then computed from the distinct values and
+their counts, which for game data are far fewer than the rows. Results are
+cached per column. The STB's set_cell listeners keep the counters up to
+date, so an edit only adjusts two counts and marks that column's summary
+for recomputation.
+
+Usage:
+    python stbstats.py FILE.stb [--column 12 --column 13] [--bins 10] [--json]
+"""
+import argparse
+import json
+import math
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from stb_file import STB, load_stb
+
+DEFAULT_BINS = 10
+TOP_VALUES = 5
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+class ColumnProfile:
+    """Value counts of one column and the summary derived from them."""
+
+    def __init__(self, counts: Counter):
+        self.counts = counts
+        self.summary: Optional[dict] = None  # Cached until the column changes
+
+    def update(self, old_value: str, new_value: str):
+        counts = self.counts
+        counts[old_value] -= 1
+        if counts[old_value] <= 0:
+            del counts[old_value]
+        counts[new_value] += 1
+        self.summary = None
+
+    def summarize(self, bins: int = DEFAULT_BINS) -> dict:
+        if self.summary is not None and self.summary['bins'] == bins:
+            return self.summary
+
+        rows = sum(self.counts.values())
+        numbers = []  # (number, count) for every distinct numeric value
+        for value, count in self.counts.items():
+            if value:
+                number = _number(value)
+                if number is not None:
+                    numbers.append((number, count))
+
+        summary = {
+            'rows': rows,
+            'empty': self.counts.get('', 0),
+            'distinct': len(self.counts),
+            'numeric': sum(count for _, count in numbers),
+            'min': None, 'max': None, 'mean': None,
+            'bins': bins,
+            'histogram': [],
+            'top': [(value, count) for value, count in self.counts.most_common(TOP_VALUES)],
+        }
+        if numbers:
+            low = min(number for number, _ in numbers)
+            high = max(number for number, _ in numbers)
+            summary.update(min=low, max=high,
+                           mean=sum(number * count for number, count in numbers) / summary['numeric'])
+            width = (high - low) / bins or 1.0
+            counts = [0] * bins
+            for number, count in numbers:
+                counts[min(int((number - low) / width), bins - 1)] += count
+            summary['histogram'] = [(low + idx * width, low + (idx + 1) * width, count)
+                                    for idx, count in enumerate(counts)]
+        self.summary = summary
+        return summary
+
+
+class STBStats:
+    """Lazily computed, incrementally maintained statistics of an STB's columns."""
+
+    def __init__(self, stb: STB):
+        self.stb = stb
+        self.profiles: Dict[int, ColumnProfile] = {}
+        self.row_count = len(stb.cells)
+        stb.add_listener(self.cell_changed)
+
+    def column_name(self, column: int) -> str:
+        if column == 0:
+            return 'Row Name'
+        return self.stb.column_names[column] if column < len(self.stb.column_names) else f'col{column}'
+
+    def column_count(self) -> int:
+        return max(map(len, self.stb.cells), default=0)
+
+    def profile(self, column: int) -> ColumnProfile:
+        if len(self.stb.cells) != self.row_count:
+            # Rows were added or removed outside set_cell, start over
+            self.profiles = {}
+            self.row_count = len(self.stb.cells)
+        profile = self.profiles.get(column)
+        if profile is None:
+            cells = self.stb.cells
+            try:
+                values = [row[column] for row in cells]
+            except IndexError:
+                values = [row[column] if column < len(row) else '' for row in cells]
+            profile = self.profiles[column] = ColumnProfile(Counter(values))
+        return profile
+
+    def summarize(self, column: int, bins: int = DEFAULT_BINS) -> dict:
+        """Statistics of one column, see ColumnProfile.summarize."""
+        summary = dict(self.profile(column).summarize(bins))
+        summary.update(column=column, name=self.column_name(column))
+        return summary
+
+    def cell_changed(self, row: int, column: int, old_value: str, new_value: str):
+        """STB listener: adjusts the counts of an already profiled column."""
+        profile = self.profiles.get(column)
+        if profile is not None:
+            profile.update(old_value, new_value)
+
+
+def format_summary(summary: dict) -> str:
+    """Human-readable summary of one column, with a text histogram."""
+    lines = [f"[{summary['column']}] {summary['name']}",
+             f"  rows: {summary['rows']}  empty: {summary['empty']}  distinct: {summary['distinct']}  "
+             f"numeric: {summary['numeric']}"]
+    if summary['min'] is not None:
+        lines.append(f"  min: {summary['min']:g}  max: {summary['max']:g}  mean: {summary['mean']:.4g}")
+        largest = max(count for _, _, count in summary['histogram']) or 1
+        for low, high, count in summary['histogram']:
+            bar = '#' * round(20 * count / largest)
+            lines.append(f"  {low:>10.4g} - {high:<10.4g} {count:>7} {bar}")
+    top = ', '.join(f"{value!r} x{count}" for value, count in summary['top'])
+    lines.append(f"  most common: {top}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Show per-column statistics of an STB file.")
+    parser.add_argument('file')
+    parser.add_argument('--column', type=int, action='append', help="Only this column (0 is the row name).")
+    parser.add_argument('--bins', type=int, default=DEFAULT_BINS, help="Histogram bins.")
+    parser.add_argument('--json', action='store_true', help="Print the statistics as JSON.")
+    args = parser.parse_args(argv)
+
+    stats = STBStats(load_stb(args.file))
+    columns = args.column if args.column else range(stats.column_count())
+    summaries = [stats.summarize(column, args.bins) for column in columns]
+    if args.json:
+        json.dump(summaries, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    else:
+        print('\n\n'.join(format_summary(summary) for summary in summaries))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Entry-level diff and patch format for STL string tables.
+
+Entries are matched by `string_id` with a sorted merge over both files, and
+only the fields that changed (text/comment/quest per language, or the
+numeric id) are written to the patch.
+
+A patch is a JSON Lines file: the first line is a header, every following
+line is one operation:
+    {"format": "stl-patch", "version": 1, "stl_type": "ITST01", "languages": [...]}
+    {"op": "set", "string_id": "LBAC001", "fields": {"text_English": "..."}}
+    {"op": "add", "string_id": "LBAC900", "fields": {"id": 900, "text_English": "..."}}
+    {"op": "del", "string_id": "LBAC002"}
+Repeated string ids carry an extra "n" (0-based occurrence) member.
+
+Usage:
+    python stldiff.py diff OLD.stl NEW.stl -o CHANGES.stlpatch
+    python stldiff.py apply TARGET.stl CHANGES.stlpatch [-o OUTPUT.stl]
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from stleditor import load_stl, write_stl
+
+PATCH_FORMAT = 'stl-patch'
+PATCH_VERSION = 1
+
+DEFAULT_LANGUAGES = ['Korean', 'English', 'Japanese', 'Chinese_Simplified', 'Chinese_Traditional']
+
+
+def read_stl_all_languages(file_path: str):
+    """
+    Parses an STL file with every language it contains, so that writing it
+    back does not blank the languages that were not loaded.
+    """
+    entries, stl_type, language_names = load_stl(file_path, DEFAULT_LANGUAGES)
+    if entries is not None and any(name not in DEFAULT_LANGUAGES for name in language_names):
+        entries, stl_type, language_names = load_stl(file_path, language_names)
+    if entries is None:
+        raise ValueError(f"Failed to parse STL file: {file_path}")
+    return entries, stl_type, language_names
+
+
+def _sorted_keys(entries: List[dict]) -> List[Tuple[Tuple[str, int], int]]:
+    """Returns ((string_id, occurrence), entry index) pairs sorted by key."""
+    seen: Dict[str, int] = {}
+    keys = []
+    for idx, entry in enumerate(entries):
+        string_id = entry['string_id']
+        occurrence = seen.get(string_id, 0)
+        seen[string_id] = occurrence + 1
+        keys.append(((string_id, occurrence), idx))
+    keys.sort()
+    return keys
+
+
+def _op(op: str, key: Tuple[str, int], fields: Optional[dict] = None) -> dict:
+    record = {'op': op, 'string_id': key[0]}
+    if key[1]:
+        record['n'] = key[1]
+    if fields is not None:
+        record['fields'] = fields
+    return record
+
+
+def iter_diff(old_entries: List[dict], new_entries: List[dict]) -> Iterator[dict]:
+    """
+    Yields patch operations turning `old_entries` into `new_entries`.
+    Both entry lists are walked once in string_id order.
+    """
+    old_keys = _sorted_keys(old_entries)
+    new_keys = _sorted_keys(new_entries)
+    i = j = 0
+    while i < len(old_keys) or j < len(new_keys):
+        if j >= len(new_keys) or (i < len(old_keys) and old_keys[i][0] < new_keys[j][0]):
+            yield _op('del', old_keys[i][0])
+            i += 1
+        elif i >= len(old_keys) or new_keys[j][0] < old_keys[i][0]:
+            key, idx = new_keys[j]
+            # Empty strings are left out, write_stl defaults missing fields to ''
+            fields = {name: value for name, value in new_entries[idx].items()
+                      if name != 'string_id' and value != ''}
+            yield _op('add', key, fields)
+            j += 1
+        else:
+            key, old_idx = old_keys[i]
+            old_entry = old_entries[old_idx]
+            new_entry = new_entries[new_keys[j][1]]
+            if old_entry != new_entry:
+                fields = {name: value for name, value in new_entry.items()
+                          if name != 'string_id' and old_entry.get(name) != value}
+                if fields:
+                    yield _op('set', key, fields)
+            i += 1
+            j += 1
+
+
+def write_patch(patch_path: str, operations: Iterator[dict], stl_type: str, language_names: List[str]) -> int:
+    """Writes a patch file and returns the number of operations written."""
+    count = 0
+    with open(patch_path, 'w', encoding='utf-8') as f:
+        header = {'format': PATCH_FORMAT, 'version': PATCH_VERSION,
+                  'stl_type': stl_type, 'languages': language_names}
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for operation in operations:
+            f.write(json.dumps(operation, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def read_patch(patch_path: str) -> Tuple[dict, Iterator[dict]]:
+    """Reads the patch header and returns it with an iterator over the operations."""
+    f = open(patch_path, 'r', encoding='utf-8')
+    header = json.loads(f.readline() or '{}')
+    if header.get('format') != PATCH_FORMAT:
+        f.close()
+        raise ValueError(f"{patch_path} is not an STL patch.")
+    if header.get('version', 0) > PATCH_VERSION:
+        f.close()
+        raise ValueError(f"Unsupported STL patch version: {header.get('version')}")
+
+    def operations():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, operations()
+
+
+def apply_patch(entries: List[dict], stl_type: str, language_names: List[str], header: dict,
+                operations: Iterator[dict]) -> List[dict]:
+    """
+    Applies patch operations to parsed entries and returns the new entry list.
+    Added entries are appended at the end, in patch order.
+
+    Raises:
+        ValueError: If the patch doesn't match the STL type, has languages the
+            target lacks or refers to missing entries.
+    """
+    if header.get('stl_type') != stl_type:
+        raise ValueError(f"Patch is for STL type {header.get('stl_type')}, target is {stl_type}.")
+    missing_languages = [name for name in header.get('languages', []) if name not in language_names]
+    if missing_languages:
+        raise ValueError(f"Patch has languages the target lacks: {', '.join(missing_languages)}")
+
+    positions = {key: idx for key, idx in _sorted_keys(entries)}
+    deleted = set()
+    added = []
+    missing = []
+    for operation in operations:
+        key = (operation['string_id'], operation.get('n', 0))
+        op = operation['op']
+        if op == 'add':
+            entry = {'string_id': key[0]}
+            entry.update(operation['fields'])
+            added.append(entry)
+        elif key not in positions:
+            missing.append(key[0])
+        elif op == 'set':
+            entries[positions[key]].update(operation['fields'])
+        elif op == 'del':
+            deleted.add(positions[key])
+        else:
+            raise ValueError(f"Unknown patch operation: {op}")
+
+    if missing:
+        raise ValueError(f"Patch refers to {len(missing)} missing entries, e.g. {', '.join(missing[:5])}")
+
+    if deleted:
+        entries = [entry for idx, entry in enumerate(entries) if idx not in deleted]
+    return entries + added
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff and patch STL string tables.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    diff_parser = subparsers.add_parser('diff', help="Write a patch turning OLD into NEW.")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('-o', '--output', required=True, help="Patch file to write.")
+
+    apply_parser = subparsers.add_parser('apply', help="Apply a patch to an STL file.")
+    apply_parser.add_argument('target')
+    apply_parser.add_argument('patch')
+    apply_parser.add_argument('-o', '--output', help="Write to this file instead of patching TARGET in place.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        old_entries, old_type, _ = read_stl_all_languages(args.old)
+        new_entries, new_type, language_names = read_stl_all_languages(args.new)
+        if old_type != new_type:
+            print(f"STL types differ: {old_type} vs {new_type}", file=sys.stderr)
+            return 2
+        count = write_patch(args.output, iter_diff(old_entries, new_entries), new_type, language_names)
+        print(f"Wrote {count} operation(s) to {args.output}")
+        return 0
+
+    entries, stl_type, language_names = read_stl_all_languages(args.target)
+    header, operations = read_patch(args.patch)
+    try:
+        entries = apply_patch(entries, stl_type, language_names, header, operations)
+    except ValueError as e:
+        print(f"Failed to apply patch: {e}", file=sys.stderr)
+        return 1
+
+    # Write next to the destination first so a failure never leaves a half-written STL
+    output_path = args.output or args.target
+    temp_path = output_path + '.tmp'
+    write_stl(temp_path, entries, stl_type, language_names, language_names)
+    os.replace(temp_path, output_path)
+    print(f"Patched {output_path} ({len(entries)} entries)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
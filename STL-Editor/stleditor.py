@@ -1,28 +1,47 @@
+import logging
 import struct
-import pandas as pd
+import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 
+# The parse cache, undo journal, find/replace, SQL query, loading, file watching and
+# profiling code lives in the Data-Tools folder next to this one, which has to be present.
+DATA_TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data-Tools')
+if DATA_TOOLS_DIR not in sys.path:
+    sys.path.append(DATA_TOOLS_DIR)
+from parsecache import ParseCache
+from undo import UndoStack, has_journal, journal_path_for
+from findreplace import TREE_REBUILD_THRESHOLD, show_find_replace_dialog
+from chunkload import POLL_INTERVAL_MS, TREE_INSERT_BATCH, ChunkLoader
+from filewatch import (WATCH_POLL_MS, FileWatcher, conflict_prompt, file_signature, merge_rows, snapshot_rows,
+                       start_reload)
+import profiling
+
+logger = logging.getLogger(__name__)
+
+# Entries parsed between two progress updates while opening a file
+LOAD_CHUNK_ROWS = 2000
+
 def read_bstr(file):
     """Reads a length-prefixed string from the file."""
     current_pos = file.tell()
     lenstring_bytes = file.read(1)
     if not lenstring_bytes:
-        print(f"Failed to read 1 byte for length at position {current_pos}.")
+        logger.warning(f"Failed to read 1 byte for length at position {current_pos}.")
         return ''
     lenstring = struct.unpack('B', lenstring_bytes)[0]
     if lenstring > 127:
         extra_bytes = file.read(1)
         if not extra_bytes:
-            print(f"Failed to read extra byte for length at position {current_pos}.")
+            logger.warning(f"Failed to read extra byte for length at position {current_pos}.")
             return ''
         extra = struct.unpack('B', extra_bytes)[0]
         lenstring = (lenstring - 128) + (extra * 128)
     # Read the string data
     string_bytes = file.read(lenstring)
     if len(string_bytes) < lenstring:
-        print(f"Expected {lenstring} bytes at position {current_pos}, but got {len(string_bytes)} bytes.")
+        logger.warning(f"Expected {lenstring} bytes at position {current_pos}, but got {len(string_bytes)} bytes.")
         return ''
     return string_bytes.decode('latin-1', errors='replace')
 
@@ -39,57 +58,72 @@ def write_bstr(file, text):
         file.write(struct.pack('B', second_byte))
     file.write(text_bytes)
 
+@profiling.profiled('stl.parse')
 def parse_stl(file_path, languages_to_parse=['English']):
     """Parses the STL file and returns entries, stl_type, and language_names."""
+    try:
+        for entries, stl_type, language_names, _ in iter_parse_stl(file_path, languages_to_parse):
+            pass
+    except ValueError as e:
+        logger.error(f"Failed to parse {file_path}: {e}")
+        return None, None, None
+    return entries, stl_type, language_names
+
+def iter_parse_stl(file_path, languages_to_parse=['English'], chunk_size=LOAD_CHUNK_ROWS):
+    """
+    Same as parse_stl, as a generator yielding (entries, stl_type, language_names,
+    complete entries) once the header is read and after every chunk_size
+    entries, so the entries read so far can be shown while the rest is parsed.
+    The same entries list is yielded every time.
+
+    Raises:
+        ValueError: If the file is truncated.
+    """
     with open(file_path, 'rb') as f:
         # Read stl_type
         stl_type = read_bstr(f)
-        print(f"stl_type: {stl_type}")
+        logger.debug(f"stl_type: {stl_type}")
 
         # Read entry_count
         entry_count_bytes = f.read(4)
         if len(entry_count_bytes) < 4:
-            print("Failed to read 4 bytes for entry_count.")
-            return None, None, None
+            raise ValueError("Failed to read 4 bytes for entry_count.")
         entry_count = struct.unpack('<I', entry_count_bytes)[0]
-        print(f"entry_count: {entry_count}")
+        logger.debug(f"entry_count: {entry_count}")
 
         entries = []
         for _ in range(entry_count):
             string_id = read_bstr(f)
             entry_id_bytes = f.read(4)
             if len(entry_id_bytes) < 4:
-                print("Failed to read 4 bytes for entry_id.")
-                return None, None, None
+                raise ValueError("Failed to read 4 bytes for entry_id.")
             entry_id = struct.unpack('<I', entry_id_bytes)[0]
             entries.append({'string_id': string_id, 'id': entry_id})
 
         # Read language_count
         language_count_bytes = f.read(4)
         if len(language_count_bytes) < 4:
-            print("Failed to read 4 bytes for language_count.")
-            return None, None, None
+            raise ValueError("Failed to read 4 bytes for language_count.")
         language_count = struct.unpack('<I', language_count_bytes)[0]
-        print(f"language_count: {language_count}")
+        logger.debug(f"language_count: {language_count}")
 
-        # Map language indices to language names
-        language_names = ['Korean', 'English', 'Japanese', 'Chinese_Simplified', 'Chinese_Traditional']
+        # Map language indices to language names (files may hold fewer than the usual five)
+        language_names = ['Korean', 'English', 'Japanese', 'Chinese_Simplified', 'Chinese_Traditional'][:language_count]
         if language_count > len(language_names):
-            print("Warning: More languages in file than language names provided.")
+            logger.warning("More languages in file than language names provided.")
             # Extend the list with generic names
             language_names.extend([f'Language_{i}' for i in range(len(language_names), language_count)])
 
         # Determine indices of languages to parse
         language_indices = [idx for idx, lang in enumerate(language_names) if lang in languages_to_parse]
-        print(f"Languages to parse: {[language_names[idx] for idx in language_indices]}")
+        logger.debug(f"Languages to parse: {[language_names[idx] for idx in language_indices]}")
 
         # Read language_offsets
         language_offsets = []
         for _ in range(language_count):
             lang_offset_bytes = f.read(4)
             if len(lang_offset_bytes) < 4:
-                print("Failed to read 4 bytes for language_offset.")
-                return None, None, None
+                raise ValueError("Failed to read 4 bytes for language_offset.")
             language_offset = struct.unpack('<I', lang_offset_bytes)[0]
             language_offsets.append(language_offset)
 
@@ -101,19 +135,18 @@ def parse_stl(file_path, languages_to_parse=['English']):
             for entry_idx in range(entry_count):
                 entry_offset_bytes = f.read(4)
                 if len(entry_offset_bytes) < 4:
-                    print(f"Failed to read 4 bytes for entry_offset at language {lang_idx}, entry {entry_idx}")
-                    return None, None, None
+                    raise ValueError(f"Failed to read 4 bytes for entry_offset at language {lang_idx}, entry {entry_idx}")
                 entry_offset = struct.unpack('<I', entry_offset_bytes)[0]
                 offsets.append(entry_offset)
             entry_offsets.append(offsets)
 
-        # Read the actual text data
-        for idx, lang_idx in enumerate(language_indices):
-            lang_name = language_names[lang_idx]
-            offsets = entry_offsets[idx]
-            for entry_idx in range(entry_count):
-                entry_offset = offsets[entry_idx]
-                f.seek(entry_offset)
+        yield entries, stl_type, language_names, 0
+
+        # Read the actual text data, entry by entry so entries are complete in order
+        for entry_idx in range(entry_count):
+            for idx, lang_idx in enumerate(language_indices):
+                lang_name = language_names[lang_idx]
+                f.seek(entry_offsets[idx][entry_idx])
                 text = read_bstr(f)
                 entries[entry_idx][f'text_{lang_name}'] = text
 
@@ -126,8 +159,56 @@ def parse_stl(file_path, languages_to_parse=['English']):
                         quest2 = read_bstr(f)
                         entries[entry_idx][f'quest1_{lang_name}'] = quest1
                         entries[entry_idx][f'quest2_{lang_name}'] = quest2
-    return entries, stl_type, language_names
+            if (entry_idx + 1) % chunk_size == 0 and entry_idx + 1 < entry_count:
+                yield entries, stl_type, language_names, entry_idx + 1
+    profiling.count('stl.strings_decoded', entry_count * len(language_indices))
+    yield entries, stl_type, language_names, entry_count
+
+def load_stl(file_path, languages_to_parse=['English']):
+    """Same as parse_stl, going through the parse cache when it is enabled."""
+    cache = ParseCache.from_environment()
+    if cache is None:
+        return parse_stl(file_path, languages_to_parse)
+
+    kind = 'stl:' + ','.join(languages_to_parse)
+    cached = cache.get(file_path, kind)
+    if cached is not None:
+        return cached
+    result = parse_stl(file_path, languages_to_parse)
+    if result[0] is not None:  # Don't cache failed parses
+        cache.put(file_path, kind, result)
+    return result
+
+def load_stl_chunks(file_path, languages_to_parse=['English']):
+    """
+    Same as iter_parse_stl, going through the parse cache when it is enabled
+    (cached files are yielded in one go).
+    """
+    cache = ParseCache.from_environment()
+    kind = 'stl:' + ','.join(languages_to_parse)
+    cached = cache.get(file_path, kind) if cache is not None else None
+    if cached is not None:
+        entries, stl_type, language_names = cached
+        yield entries, stl_type, language_names, len(entries)
+        return
+    with profiling.span('stl.parse', file=file_path):
+        for result in iter_parse_stl(file_path, languages_to_parse):
+            yield result
+    if cache is not None:
+        cache.put(file_path, kind, result[:3])
+
+def read_stl_rows(file_path, columns, languages_to_parse=['English']):
+    """
+    Loads an STL file for filewatch.start_reload: returns (entries, stl_type,
+    language_names) and the values of the given columns of every entry.
+    """
+    stl_data, stl_type, language_names = load_stl(file_path, languages_to_parse)
+    if stl_data is None:
+        raise ValueError(f"Failed to parse {file_path}")
+    rows = [tuple(entry.get(column, '') for column in columns) for entry in stl_data]
+    return (stl_data, stl_type, language_names), rows
 
+@profiling.profiled('stl.save')
 def write_stl(file_path, entries, stl_type, language_names, languages_to_parse=['English']):
     """Writes the entries back to an STL file."""
     with open(file_path, 'wb') as f:
@@ -209,6 +290,8 @@ def write_stl(file_path, entries, stl_type, language_names, languages_to_parse=[
             # Return to current position
             f.seek(current_pos)
 
+        profiling.count('stl.bytes_written', f.tell())
+
         # Now, go back and write language_offsets
         f.seek(language_offsets_positions)
         for offset in language_offsets:
@@ -230,46 +313,133 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
 
     # Function to save the STL file
     def save_stl_file():
+        if still_loading():
+            return
         # Prompt the user to select a file path
+        nonlocal disk_rows
         file_path = filedialog.asksaveasfilename(defaultextension=".stl", filetypes=[("STL files", "*.stl"), ("All files", "*.*")])
         if file_path:
+            watched = watcher is not None and watcher.watches(file_path)
+            if watched and watcher.changed_on_disk() and not messagebox.askyesno(
+                    "File Changed on Disk",
+                    f"{os.path.basename(file_path)} was changed on disk by another program, and those changes "
+                    "are not in the editor.\nDo you want to overwrite them?"):
+                return
             # Prepare entries data
             entries = df.to_dict('records')
             # Call the write_stl function
             write_stl(file_path, entries, stl_type, language_names, languages_to_parse)
+            undo_stack.mark_saved(file_path)  # The crash-recovery journal is no longer needed
+            if watched:
+                stop_reload()  # Whatever it read is older than what was just saved
+                disk_rows = df_rows()
+                watcher.mark_synced()
             messagebox.showinfo("Save STL", f"STL file saved successfully at:\n{file_path}")
 
+    # Background load of a file being opened, see open_stl_file
+    loader = None
+
+    def still_loading():
+        if loader is not None:
+            messagebox.showinfo("Loading", "Please wait until the file is loaded, or cancel loading.")
+            return True
+        return False
+
     # Function to open a new STL file
     def open_stl_file():
+        nonlocal loader
         new_file_path = filedialog.askopenfilename(title="Select STL File", filetypes=[("STL files", "*.stl"), ("All files", "*.*")])
         if new_file_path:
-            # Parse the new STL file
-            new_stl_data, new_stl_type, new_language_names = parse_stl(new_file_path, languages_to_parse)
-            if new_stl_data is None:
-                messagebox.showerror("Error", "Failed to parse the selected STL file.")
-                return
-            # Update the DataFrame and other variables
-            nonlocal df, stl_type, language_names, current_file_path
-            df = pd.DataFrame(new_stl_data)
-            df.reset_index(drop=True, inplace=True)  # Reset index after loading new data
-            stl_type = new_stl_type
-            language_names = new_language_names
-            current_file_path = new_file_path
-            # Update the window title
-            file_name = os.path.basename(current_file_path)
-            root.title(f"STL Data Viewer - {file_name}")
-            # Refresh the Treeview
-            update_treeview(reset=True)
+            if loader is not None:
+                loader.cancel()
+            # Parse the new STL file on a worker thread; rows are shown as they come in
+            loader = ChunkLoader(load_stl_chunks(new_file_path, languages_to_parse))
+            loader.start()
+            tree.delete(*tree.get_children())
+            load_label.config(text=f"Loading {os.path.basename(new_file_path)}...")
+            load_progress.config(value=0, maximum=1)
+            load_frame.pack(side='bottom', fill='x', before=frame)
+            state = {'entries': None, 'loaded': 0, 'shown': 0, 'signature': file_signature(new_file_path)}
+            root.after(POLL_INTERVAL_MS, poll_loading, loader, new_file_path, state)
         else:
             messagebox.showinfo("No File Selected", "No STL file was selected.")
 
+    def poll_loading(this_loader, new_file_path, state):
+        nonlocal loader, df, stl_type, language_names, current_file_path, sql_database
+        if this_loader is not loader:
+            return  # Cancelled, or replaced by another file
+        chunks, finished = this_loader.poll()
+        for new_stl_data, new_stl_type, new_language_names, loaded in chunks:
+            state.update(entries=new_stl_data, stl_type=new_stl_type, language_names=new_language_names, loaded=loaded)
+            load_progress.config(value=loaded, maximum=max(len(new_stl_data), 1))
+
+        # Same values as update_treeview inserts for a DataFrame built from the entries
+        entries = state['entries']
+        if state['shown'] < state['loaded']:
+            end = min(state['loaded'], state['shown'] + TREE_INSERT_BATCH)
+            with profiling.span('stl.insert_rows', rows=end - state['shown']):
+                for index in range(state['shown'], end):
+                    tree.insert("", "end", iid=index, values=list(entries[index].values()))
+            state['shown'] = end
+
+        if not finished or state['shown'] < state['loaded']:
+            root.after(POLL_INTERVAL_MS, poll_loading, this_loader, new_file_path, state)
+            return
+
+        loader = None
+        load_frame.pack_forget()
+        if this_loader.error is not None or entries is None:
+            messagebox.showerror("Error", f"Failed to parse the selected STL file:\n{this_loader.error}")
+            update_treeview(reset=True)  # Back to the file that was open
+            return
+        # Update the DataFrame and other variables
+        import pandas as pd
+        df = pd.DataFrame(entries)
+        df.reset_index(drop=True, inplace=True)  # Reset index after loading new data
+        sql_database = None
+        stl_type = state['stl_type']
+        language_names = state['language_names']
+        current_file_path = new_file_path
+        # Update the window title
+        file_name = os.path.basename(current_file_path)
+        root.title(f"STL Data Viewer - {file_name}")
+        start_watching(state['signature'])  # Before recovered edits are replayed
+        start_undo_history()
+
+    def cancel_loading():
+        nonlocal loader
+        if loader is None:
+            return
+        loader.cancel()
+        loader = None
+        load_frame.pack_forget()
+        update_treeview(reset=True)  # Back to the file that was open
+
     # Function to export data to CSV
     def export_to_csv():
+        if still_loading():
+            return
         csv_file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
         if csv_file_path:
             df.to_csv(csv_file_path, index=False)
             messagebox.showinfo("Export to CSV", f"Data exported successfully to:\n{csv_file_path}")
 
+    # Function to export the recorded timings (profiling is on when ROSE_PROFILE is set)
+    def export_profile():
+        if not profiling.is_enabled():
+            messagebox.showinfo("Export Profile",
+                                "Profiling is off. Start the editor with the environment variable ROSE_PROFILE=1 "
+                                "to record load, search, display and save timings.")
+            return
+        profile_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON report", "*.json"), ("Chrome trace", "*.trace.json"), ("All files", "*.*")])
+        if profile_path:
+            try:
+                profiling.export(profile_path)  # A name ending in .trace.json gets a Chrome trace
+            except OSError as e:
+                messagebox.showerror("Export Profile", f"Failed to write the profile:\n{e}")
+                return
+            messagebox.showinfo("Export Profile", f"Profile exported to:\n{profile_path}")
+
     # Create a menu bar
     menu_bar = tk.Menu(root)
     root.config(menu=menu_bar)
@@ -279,7 +449,11 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
     menu_bar.add_cascade(label="File", menu=file_menu)
     file_menu.add_command(label="Open", command=open_stl_file)
     file_menu.add_command(label="Save STL", command=save_stl_file)
+    watch_changes = tk.BooleanVar(value=True)
+    file_menu.add_checkbutton(label="Watch for External Changes", variable=watch_changes,
+                              command=lambda: toggle_watching())
     file_menu.add_command(label="Export to CSV", command=export_to_csv)
+    file_menu.add_command(label="Export Profile...", command=export_profile)
     file_menu.add_separator()
     file_menu.add_command(label="Exit", command=root.quit)
 
@@ -291,6 +465,14 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
     frame = ttk.Frame(root)
     frame.pack(fill='both', expand=True)
 
+    # Progress of a file being opened, packed while loading
+    load_frame = ttk.Frame(root)
+    load_label = ttk.Label(load_frame)
+    load_label.pack(side='left', padx=5)
+    load_progress = ttk.Progressbar(load_frame, mode='determinate')
+    load_progress.pack(side='left', fill='x', expand=True, padx=5, pady=2)
+    ttk.Button(load_frame, text="Cancel", command=lambda: cancel_loading()).pack(side='left', padx=5, pady=2)
+
     # Search bar
     search_var = tk.StringVar()
     search_entry = ttk.Entry(top_frame, textvariable=search_var)
@@ -337,40 +519,42 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
 
     # Function to update the Treeview based on search
     def update_treeview(reset=False):
+        if loader is not None:
+            return  # The Treeview is being filled with the file being opened
         # Ensure df index is reset
         df.reset_index(drop=True, inplace=True)
 
         # Clear the current content
         tree.delete(*tree.get_children())
 
-        # Debug: Print the search input
         search_input = search_var.get()
-        print(f"Search input before condition: '{search_input}'")
 
         # Decide which data to display
         if reset or not search_input.strip():
             display_df = df
             search_var.set('')
-            print("Displaying all records.")
         else:
             search_text = search_input.lower()
-            print(f"Searching for: '{search_text}'")
             # Filter rows where any column contains the search_text
-            mask = df.apply(lambda row: row.astype(str).str.lower().str.contains(search_text).any(), axis=1)
-            display_df = df[mask]
-            print(f"Number of matching records: {display_df.shape[0]}")
+            with profiling.span('stl.search') as span:
+                mask = df.apply(lambda row: row.astype(str).str.lower().str.contains(search_text).any(), axis=1)
+                display_df = df[mask]
+                span.set('matches', len(display_df))
+            logger.debug(f"Search for '{search_text}': {len(display_df)} matching record(s)")
 
         if display_df.empty:
-            print("No matching records found.")
             messagebox.showinfo("Search Result", "No matching records found.")
             return
 
         # Insert data into the Treeview
-        for index, row in display_df.iterrows():
-            tree.insert("", "end", iid=index, values=list(row))
+        with profiling.span('stl.populate', rows=len(display_df)):
+            for index, row in display_df.iterrows():
+                tree.insert("", "end", iid=index, values=list(row))
 
     # Function to handle double-click for editing
     def on_double_click(event):
+        if loader is not None:
+            return  # Editable once loaded
         item_id = tree.focus()
         if not item_id:
             return
@@ -393,17 +577,23 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
         text_entry.insert(0, current_value)
 
         def save_edit():
+            nonlocal sql_database
             new_value = text_entry.get()
             index = int(item_id)
-            print(f"Saving edit: item_id={item_id}, index={index}, column_name={column_name}, new_value={new_value}")
+            logger.debug(f"Saving edit: item_id={item_id}, index={index}, column_name={column_name}, new_value={new_value}")
             try:
                 # Update the DataFrame
+                old_value = df.at[index, column_name]
+                if hasattr(old_value, 'item'):
+                    old_value = old_value.item()  # numpy scalar -> plain Python value for the journal
                 df.at[index, column_name] = new_value
+                sql_database = None
+                undo_stack.record(index, column_name, old_value, new_value)
                 # Update the Treeview
                 tree.set(item_id, column=column_name, value=new_value)
                 edit_window.destroy()
             except Exception as e:
-                print(f"Error occurred: {e}")
+                logger.error(f"Failed to save edit of {column_name} in row {index}: {e}")
                 messagebox.showerror("Error", f"An error occurred while saving:\n{e}")
                 edit_window.destroy()
 
@@ -412,8 +602,284 @@ def display_data_gui(df, stl_type, language_names, languages_to_parse=['English'
     # Bind the double-click event
     tree.bind("<Double-1>", on_double_click)
 
+    # Undo/redo history of the loaded file
+    undo_stack = None
+
+    def apply_undo_delta(row, column, value):
+        nonlocal sql_database
+        df.at[row, column] = value
+        sql_database = None
+        if tree.exists(str(row)):
+            tree.set(str(row), column=column, value=value)
+
+    def start_undo_history():
+        nonlocal undo_stack
+        if undo_stack:
+            undo_stack.close_journal()
+        journal_path = journal_path_for(current_file_path) if current_file_path else None
+        undo_stack = UndoStack(apply_undo_delta, journal_path=journal_path, source_path=current_file_path)
+        if not current_file_path or not has_journal(current_file_path):
+            return
+        if not messagebox.askyesno("Recover Edits",
+                                   "Unsaved edits from a previous session were found for this file.\n"
+                                   "Do you want to recover them?"):
+            undo_stack.mark_saved()  # Discard the old journal
+            return
+        try:
+            undo_stack.replay_journal()
+        except (OSError, ValueError) as e:
+            messagebox.showwarning("Recover Edits", f"Could not recover edits:\n{e}")
+
+    # Reloading the open file when another program changes it (see poll_watcher)
+    watcher = None
+    reloader = None
+    disk_rows = None  # Rows of the file as last loaded, saved or reloaded: the base of merges
+
+    def df_rows():
+        return list(df.itertuples(index=False, name=None))
+
+    def start_watching(signature=None):
+        """Watches the file just loaded; `signature` is the version of it that was parsed."""
+        nonlocal watcher, disk_rows
+        stop_watching()
+        if not current_file_path:
+            return
+        watcher = FileWatcher(current_file_path)
+        watcher.mark_synced(signature)
+        disk_rows = df_rows()
+        if watch_changes.get():
+            watcher.start()
+
+    def stop_watching():
+        nonlocal watcher, disk_rows
+        if watcher is not None:
+            watcher.stop()
+            watcher = None
+        stop_reload()
+        disk_rows = None
+
+    def stop_reload():
+        nonlocal reloader
+        if reloader is not None:
+            reloader.cancel()
+            reloader = None
+
+    def toggle_watching():
+        if watcher is None:
+            return
+        if watch_changes.get():
+            watcher.start()
+        else:
+            watcher.stop()
+            stop_reload()
+
+    def poll_watcher():
+        """
+        Runs every WATCH_POLL_MS: when another program changed the open file,
+        parses it again in the background and merges the changed rows in.
+        """
+        nonlocal reloader
+        root.after(WATCH_POLL_MS, poll_watcher)
+        if watcher is None or loader is not None or root.grab_current() is not None:
+            return  # Nothing to watch, a file being opened, or a modal dialog open
+        if reloader is None:
+            if watch_changes.get() and watcher.poll():
+                columns = list(df.columns)
+                reloader = start_reload(watcher.file_path,
+                                        lambda path: read_stl_rows(path, columns, languages_to_parse), disk_rows)
+            return
+        chunks, finished = reloader.poll()
+        if not finished:
+            return
+        this_reloader, reloader = reloader, None
+        if this_reloader.error is not None or not chunks:
+            logger.warning(f"Failed to reload {watcher.file_path}: {this_reloader.error}")
+            return
+        apply_disk_changes(*chunks[0])
+
+    def apply_disk_changes(parsed, new_rows, pairs, signature):
+        """
+        Merges the version of the file now on disk into the editor. Rows only
+        changed on disk are updated in place; cells also edited here are
+        conflicts, resolved by the user.
+        """
+        nonlocal df, stl_type, language_names, disk_rows, sql_database
+        columns = list(df.columns)
+        file_name = os.path.basename(watcher.file_path)
+        merge = merge_rows(disk_rows, df_rows(), new_rows, pairs=pairs)
+        if merge.conflicts:
+            keep = messagebox.askyesnocancel("File Changed on Disk", conflict_prompt(file_name, merge, columns))
+            if keep is None:
+                return
+            if not keep:
+                merge = merge_rows(disk_rows, df_rows(), new_rows, keep_ours=False, pairs=pairs)
+
+        with profiling.span('stl.reload', changed=len(merge.changed_rows), moved=merge.rows_moved):
+            if merge.rows_moved:
+                import pandas as pd
+                df = pd.DataFrame(merge.rows, columns=columns)
+                refresh_treeview(merge.row_map())
+            else:
+                for row in merge.changed_rows:
+                    for column, value in zip(columns, merge.rows[row]):
+                        if df.at[row, column] != value:
+                            df.at[row, column] = value
+                    if tree.exists(str(row)):
+                        tree.item(str(row), values=merge.rows[row])
+                if search_var.get().strip() and merge.changed_rows:
+                    refresh_treeview()  # Changed rows may now match the search, or no longer match it
+        _, stl_type, language_names = parsed
+        disk_rows = snapshot_rows(new_rows)
+        sql_database = None
+        watcher.mark_synced(signature)
+
+        # Row numbers of the undo history and the journal belong to the previous
+        # version of the file: start over, with the unsaved edits kept as one step
+        undo_stack.mark_saved()
+        start_undo_history()
+        with undo_stack.batch("Unsaved Edits"):
+            for row, column, disk_value, value in merge.kept_edits:
+                undo_stack.record(row, columns[column], disk_value, value)
+        logger.info(f"Reloaded {file_name} from disk: {len(merge.changed_rows)} row(s) updated, "
+                    f"{len(merge.removed_rows)} removed, {len(merge.conflicts)} conflict(s)")
+
+    def refresh_treeview(row_map=None):
+        """Refills the Treeview after a reload, keeping the selection, focus and scroll position."""
+        def moved(item):
+            return item if row_map is None else str(row_map.get(int(item), -1))
+        selection = [moved(item) for item in tree.selection()]
+        focus = moved(tree.focus()) if tree.focus() else ''
+        top = tree.yview()[0]
+        update_treeview()
+        tree.selection_set([item for item in selection if tree.exists(item)])
+        if focus and tree.exists(focus):
+            tree.focus(focus)
+        tree.yview_moveto(top)
+
+    def show_find_replace(event=None):
+        """
+        Find/replace in the chosen columns (string_id, texts and comments of each
+        parsed language). Matches are counted and replacements planned on a
+        worker thread, then applied as a single undo step.
+        """
+        if still_loading():
+            return
+        searchable_columns = [col for col in columns_to_display if col != 'id']
+
+        def get_rows(chosen):
+            # Take a row-major snapshot of the chosen columns in one go instead of iterating the DataFrame
+            rows = df[[searchable_columns[idx] for idx in chosen]].fillna('').astype(str).values.tolist()
+            return rows, list(range(len(chosen)))
+
+        def apply(deltas, label):
+            return apply_replacements([(row, searchable_columns[col], old, new) for row, col, old, new in deltas],
+                                      label)
+
+        # Search the texts by default, not the string ids
+        selected = [idx for idx, col in enumerate(searchable_columns) if col.startswith('text_')]
+        show_find_replace_dialog(root, searchable_columns, selected, get_rows, apply)
+
+    def apply_replacements(deltas, label):
+        """
+        Applies (row, column name, old, new) replacements as one undo step,
+        writing each column back to the DataFrame at once. Cells edited since
+        the scan are left alone. Returns the number of cells changed.
+        """
+        nonlocal sql_database
+        by_column = {}
+        for row, column, old_value, new_value in deltas:
+            by_column.setdefault(column, []).append((row, old_value, new_value))
+
+        changed = []
+        with undo_stack.batch(label):
+            for column, column_deltas in by_column.items():
+                values = df[column].tolist()
+                for row, old_value, new_value in column_deltas:
+                    if row >= len(values) or str(values[row]) != old_value:
+                        continue
+                    values[row] = new_value
+                    undo_stack.record(row, column, old_value, new_value)
+                    changed.append((row, column, new_value))
+                df[column] = values
+        sql_database = None
+
+        if len(changed) > TREE_REBUILD_THRESHOLD:
+            update_treeview()
+        else:
+            for row, column, new_value in changed:
+                if tree.exists(str(row)):
+                    tree.set(str(row), column=column, value=new_value)
+        return len(changed)
+
+    def undo(event=None):
+        if still_loading():
+            return
+        if not undo_stack.undo():
+            messagebox.showinfo("Undo", "Nothing to undo.")
+
+    def redo(event=None):
+        if still_loading():
+            return
+        if not undo_stack.redo():
+            messagebox.showinfo("Redo", "Nothing to redo.")
+
+    # In-memory SQL copy of the table for the query window, rebuilt after edits
+    sql_database = None
+
+    def get_sql_database():
+        nonlocal sql_database
+        from rosesql import RoseDatabase, table_name_for  # Data-Tools folder, loaded on first query
+
+        if sql_database is None:
+            sql_database = RoseDatabase()
+            sql_database.add_table(table_name_for(current_file_path or 'stl'), list(df.columns),
+                                   df.fillna('').astype(str).values.tolist(), ['string_id'], current_file_path)
+        return sql_database
+
+    def show_sql_query():
+        """
+        Opens a window to filter and sort the loaded table with SQL. Double-clicking
+        a result selects the row in the main view.
+        """
+        from rosesql import show_sql_query_dialog, table_name_for
+
+        if still_loading():
+            return
+
+        def select_row(row):
+            if tree.exists(str(row)):
+                tree.selection_set(str(row))
+                tree.focus(str(row))
+                tree.see(str(row))
+
+        table_name = table_name_for(current_file_path or 'stl')
+        text_column = next((col for col in df.columns if col.startswith('text_')), 'string_id')
+        show_sql_query_dialog(root, table_name,
+                              f"Columns are {', '.join(df.columns)} and _row (row number, starting at 0).",
+                              f"SELECT * FROM {table_name} WHERE {text_column} <> '' ORDER BY string_id LIMIT 1000",
+                              get_sql_database, select_row)
+
+    # Add edit menu
+    edit_menu = tk.Menu(menu_bar, tearoff=0)
+    menu_bar.add_cascade(label="Edit", menu=edit_menu)
+    edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=undo)
+    edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=redo)
+    edit_menu.add_separator()
+    edit_menu.add_command(label="Find and Replace...", accelerator="Ctrl+H", command=show_find_replace)
+
+    # Add tools menu
+    tools_menu = tk.Menu(menu_bar, tearoff=0)
+    menu_bar.add_cascade(label="Tools", menu=tools_menu)
+    tools_menu.add_command(label="SQL Query...", command=show_sql_query)
+    root.bind_all('<Control-z>', undo)
+    root.bind_all('<Control-y>', redo)
+    root.bind_all('<Control-h>', show_find_replace)
+
     # Initially populate the Treeview with all data
     update_treeview()
+    start_watching()  # Before recovered edits are replayed
+    start_undo_history()
+    root.after(WATCH_POLL_MS, poll_watcher)
 
 def main():
     # Create the main Tkinter window
@@ -431,19 +897,18 @@ def main():
     languages_to_parse = ['English']  # Adjust this list as needed
 
     # Parse the STL file
-    stl_data, stl_type, language_names = parse_stl(file_path, languages_to_parse)
+    stl_data, stl_type, language_names = load_stl(file_path, languages_to_parse)
 
     if stl_data is None:
         messagebox.showerror("Error", "Failed to parse the selected STL file.")
         root.destroy()
         exit()
 
-    # Create a DataFrame
+    # Create a DataFrame (pandas is imported here, after the file dialog, as it is slow to load)
+    import pandas as pd
     df = pd.DataFrame(stl_data)
 
-    # Optional: Print the first few rows for verification
-    print("Initial DataFrame:")
-    print(df.head())
+    logger.debug(f"Initial DataFrame:\n{df.head()}")
 
     # Deiconify the main window and display the GUI
     root.deiconify()
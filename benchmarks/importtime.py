@@ -0,0 +1,90 @@
+"""
+Import-time profile of the editors.
+
+Runs `python -X importtime -c "import <module>"` for each editor entry point
+in a fresh interpreter and reports the total import time along with the
+slowest individual imports, so regressions in startup time (e.g. a heavy
+SDK imported at module level again) show up in the numbers.
+
+Usage:
+    python benchmarks/importtime.py [--top 15] [--runs 3] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, folder, module imported at startup)
+TARGETS = [
+    ('LTB editor', 'LTB-Editor', 'editor'),
+    ('STB editor', 'STB-Editor', 'stbeditor'),
+    ('STL editor', 'STL-Editor', 'stleditor'),
+]
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S.*)$')
+
+
+def profile_import(folder: str, module: str) -> Dict:
+    """
+    Imports `module` from `folder` in a new interpreter with -X importtime.
+
+    Returns:
+        Dict: {'total_us': int, 'imports': [{'module', 'self_us', 'cumulative_us', 'depth'}]}
+        or {'error': str} if the import failed.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.join(ROOT_DIR, folder),
+        capture_output=True,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({'module': name.strip(), 'self_us': int(self_us),
+                            'cumulative_us': int(cumulative_us), 'depth': len(indent) // 2})
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed'}
+
+    total = sum(entry['cumulative_us'] for entry in imports if entry['depth'] == 0)
+    return {'total_us': total, 'imports': imports}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile editor import times.")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to list per editor.")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per editor, the fastest one is reported.")
+    parser.add_argument('--json', action='store_true', help="Print the full report as JSON.")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for name, folder, module in TARGETS:
+        runs = [profile_import(folder, module) for _ in range(args.runs)]
+        successful = [run for run in runs if 'error' not in run]
+        report[name] = min(successful, key=lambda run: run['total_us']) if successful else runs[0]
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+        return 0
+
+    for name, profile in report.items():
+        if 'error' in profile:
+            print(f"{name}: import failed ({profile['error']})")
+            continue
+        print(f"{name}: {profile['total_us'] / 1000:.1f} ms")
+        slowest = sorted(profile['imports'], key=lambda entry: entry['cumulative_us'], reverse=True)
+        for entry in slowest[:args.top]:
+            print(f"  {entry['cumulative_us'] / 1000:8.1f} ms  {entry['module']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())